@@ -0,0 +1,223 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+#**********************************************************************#
+#  Procedure        benchmarkPreprocessor.py                           #
+#  Comment          Generates synthetic Hybrid Fortran codebases of    #
+#                   increasing size, runs the whole preprocessor       #
+#                   pipeline on them and records the timings per stage #
+#                   and per P90 generation phase (scaling curve).      #
+#**********************************************************************#
+
+import os, sys, json, time, math, shutil, subprocess, tempfile
+from optparse import OptionParser
+from tools.commons import OrderedDict
+from tools.synthetic import SyntheticCodebaseSpecification, writeSyntheticCodebase
+
+HF_PYTHON_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_IMPLEMENTATIONS_BY_ARCHITECTURE = {
+	"CPU": "OpenMPFortranImplementation",
+	"GPU": "CUDAFortranImplementation"
+}
+
+parser = OptionParser()
+parser.add_option("--modules", dest="numberOfModules", type="int", default=4,
+									help="number of modules at scale 1 (default: 4)")
+parser.add_option("--routinesPerModule", dest="routinesPerModule", type="int", default=6,
+									help="number of routines per module (default: 6)")
+parser.add_option("--callDepth", dest="callDepth", type="int", default=3,
+									help="length of the call chains inside a module, the last routine of each chain holds the kernels (default: 3)")
+parser.add_option("--kernelsPerRoutine", dest="kernelsPerRoutine", type="int", default=2,
+									help="number of parallel regions per kernel routine (default: 2)")
+parser.add_option("--domainDependantSymbols", dest="domainDependantSymbols", type="int", default=4,
+									help="number of domainDependant arguments per routine (default: 4)")
+parser.add_option("--moduleDataImports", dest="moduleDataImports", type="int", default=2,
+									help="number of module data arrays imported by chain heads and kernel routines (default: 2)")
+parser.add_option("-s", "--scales", dest="scales", default="1,2,4,8",
+									help="comma separated factors applied to the number of modules (default: 1,2,4,8)")
+parser.add_option("-a", "--architectures", dest="architectures", default="CPU,GPU",
+									help="comma separated architectures to generate P90 code for (default: CPU,GPU)")
+parser.add_option("-m", "--implementation", dest="implementations", action="append", default=[],
+									help="ARCH:FortranImplementation classname to use instead of the default for this architecture, can be given multiple times")
+parser.add_option("-j", "--jobs", dest="jobs", type="int", default=1,
+									help="passed on to generateP90Codebase.py (default: 1)")
+parser.add_option("-w", "--workDirectory", dest="workDirectory",
+									help="generate the codebases and pipeline outputs in DIR (default: temporary directory, removed afterwards)", metavar="DIR")
+parser.add_option("-o", "--output", dest="output",
+									help="write the scaling curve as JSON to FILENAME", metavar="FILENAME")
+(options, args) = parser.parse_args()
+
+def runStage(arguments, workDirectory, outputPath=None):
+	outputFile = open(outputPath, "w") if outputPath else open(os.devnull, "w")
+	errorPath = os.path.join(workDirectory, "stderr.txt")
+	errorFile = open(errorPath, "w")
+	try:
+		startTime = time.time()
+		returnCode = subprocess.call(
+			[sys.executable] + arguments,
+			cwd=workDirectory,
+			stdout=outputFile,
+			stderr=errorFile
+		)
+		wallTime = time.time() - startTime
+	finally:
+		outputFile.close()
+		errorFile.close()
+	if returnCode != 0:
+		raise Exception("%s failed with return code %i, see %s" %(os.path.basename(arguments[0]), returnCode, errorPath))
+	return wallTime
+
+def benchmark(specification, workDirectory, implementationsByArchitecture):
+	sourceDirectory = os.path.join(workDirectory, "source")
+	result = OrderedDict()
+	result["specification"] = specification.asDict()
+	result["numberOfRoutines"] = specification.numberOfModules * specification.routinesPerModule
+	result["numberOfLines"] = writeSyntheticCodebase(specification, sourceDirectory)
+	stageTimes = OrderedDict()
+	phaseTimes = OrderedDict()
+	stageTimes["rawCG"] = runStage(
+		[os.path.join(HF_PYTHON_DIR, "annotatedCallGraphFromH90SourceDir.py"), "-i", sourceDirectory],
+		workDirectory,
+		os.path.join(workDirectory, "rawCG.xml")
+	)
+	for architecture, implementation in implementationsByArchitecture.iteritems():
+		callgraphPath = os.path.join(workDirectory, "CG_%s.xml" %(architecture))
+		stageTimes["CG_%s" %(architecture)] = runStage(
+			[os.path.join(HF_PYTHON_DIR, "loopAnalysisWithAnnotatedCallGraph.py"), "-i", "rawCG.xml", "-a", architecture],
+			workDirectory,
+			callgraphPath
+		)
+		reportPath = os.path.join(workDirectory, "profile_%s.json" %(architecture))
+		stageTimes["P90_%s" %(architecture)] = runStage(
+			[
+				os.path.join(HF_PYTHON_DIR, "generateP90Codebase.py"),
+				"-i", sourceDirectory,
+				"-o", os.path.join(workDirectory, "P90_%s" %(architecture)),
+				"-c", callgraphPath,
+				"--implementation=%s" %(implementation),
+				"--jobs=%i" %(options.jobs),
+				"--profile-report=%s" %(reportPath)
+			],
+			workDirectory
+		)
+		reportFile = open(reportPath, "r")
+		try:
+			report = json.load(reportFile, object_pairs_hook=OrderedDict)
+		finally:
+			reportFile.close()
+		phaseTimes[architecture] = OrderedDict(
+			(entry["phase"], entry["wallTime"]) for entry in report["phases"]
+		)
+		phaseTimes[architecture]["peakRSSInKiB"] = report["peakRSSInKiB"]
+	result["stageTimes"] = stageTimes
+	result["totalTime"] = sum(stageTimes.values())
+	result["phaseTimes"] = phaseTimes
+	return result
+
+def scalingExponent(previous, current, key):
+	#t ~ n^k between two measurements -> k; ~1 is linear, clearly above 1 points to a superlinear path
+	if previous[key] <= 0 or current[key] <= 0 or current["numberOfRoutines"] == previous["numberOfRoutines"]:
+		return None
+	return math.log(current[key] / previous[key]) / math.log(float(current["numberOfRoutines"]) / previous["numberOfRoutines"])
+
+def printScalingCurve(results):
+	stageNames = results[0]["stageTimes"].keys()
+	sys.stdout.write("%10s %10s %s %10s\n" %("routines", "lines", " ".join("%12s" %(name) for name in stageNames), "exponent"))
+	previous = None
+	for result in results:
+		exponent = scalingExponent(previous, result, "totalTime") if previous else None
+		sys.stdout.write("%10i %10i %s %10s\n" %(
+			result["numberOfRoutines"],
+			result["numberOfLines"],
+			" ".join("%12.3f" %(result["stageTimes"][name]) for name in stageNames),
+			"%.2f" %(exponent) if exponent != None else "-"
+		))
+		previous = result
+	for architecture in results[0]["phaseTimes"].keys():
+		sys.stdout.write("P90 phases for %s [s]:\n" %(architecture))
+		for phase in results[0]["phaseTimes"][architecture].keys():
+			if phase == "peakRSSInKiB":
+				continue
+			sys.stdout.write("  %-45s %s\n" %(
+				phase[:45],
+				" ".join("%10.3f" %(result["phaseTimes"][architecture].get(phase, 0.0)) for result in results)
+			))
+
+try:
+	scales = [int(scale) for scale in options.scales.split(",")]
+	baseSpecification = SyntheticCodebaseSpecification(
+		numberOfModules=options.numberOfModules,
+		routinesPerModule=options.routinesPerModule,
+		callDepth=options.callDepth,
+		kernelsPerRoutine=options.kernelsPerRoutine,
+		domainDependantSymbols=options.domainDependantSymbols,
+		moduleDataImports=options.moduleDataImports
+	)
+except Exception as e:
+	sys.stderr.write("Error in benchmark options: %s\n" %(str(e)))
+	sys.exit(1)
+
+implementationNamesByArchitecture = OrderedDict(
+	(architecture, DEFAULT_IMPLEMENTATIONS_BY_ARCHITECTURE.get(architecture))
+	for architecture in options.architectures.split(",")
+)
+for implementationOption in options.implementations:
+	architecture, implementationName = implementationOption.split(":", 1)
+	implementationNamesByArchitecture[architecture] = implementationName
+
+workDirectory = options.workDirectory or tempfile.mkdtemp(prefix="hf_benchmark_")
+implementationsByArchitecture = OrderedDict()
+results = []
+try:
+	if not os.path.isdir(workDirectory):
+		os.makedirs(workDirectory)
+	for architecture, implementationName in implementationNamesByArchitecture.iteritems():
+		if not implementationName:
+			raise Exception("no implementation specified for architecture %s" %(architecture))
+		implementationPath = os.path.join(os.path.abspath(workDirectory), "implementation_%s.json" %(architecture))
+		implementationFile = open(implementationPath, "w")
+		try:
+			json.dump({"default": implementationName}, implementationFile)
+		finally:
+			implementationFile.close()
+		implementationsByArchitecture[architecture] = implementationPath
+	for scale in scales:
+		specification = baseSpecification.scaled(scale)
+		scaleDirectory = os.path.join(os.path.abspath(workDirectory), "scale_%i" %(scale))
+		if os.path.isdir(scaleDirectory):
+			shutil.rmtree(scaleDirectory)
+		os.makedirs(scaleDirectory)
+		sys.stderr.write("benchmarking %i modules with %i routines each\n" %(specification.numberOfModules, specification.routinesPerModule))
+		result = benchmark(specification, scaleDirectory, implementationsByArchitecture)
+		result["scale"] = scale
+		results.append(result)
+	printScalingCurve(results)
+	if options.output:
+		outputFile = open(options.output, "w")
+		try:
+			json.dump(results, outputFile, indent=2)
+		finally:
+			outputFile.close()
+except Exception as e:
+	sys.stderr.write("Error in preprocessor benchmark: %s\n" %(str(e)))
+	sys.exit(1)
+finally:
+	if not options.workDirectory:
+		shutil.rmtree(workDirectory, ignore_errors=True)
@@ -0,0 +1,253 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+#**********************************************************************#
+#  Procedure        benchmarkTextHelpers.py                            #
+#  Comment          Micro benchmarks for the text processing helpers   #
+#                   on lines from the examples and generated long      #
+#                   lines. Reports ops/s and compares them against a   #
+#                   stored baseline.                                   #
+#**********************************************************************#
+
+import os, re, sys, json, timeit
+from optparse import OptionParser
+from tools.commons import OrderedDict, splitTextAtLeftMostOccurrence, findLeftMostOccurrenceNotInsideQuotes, BracketAnalyzer
+from tools.filesystem import dirEntries
+from tools.metadata import parseString, ImmutableDOMDocument, getDomainDependantTemplatesAndEntries
+from machinery.commons import parseSpecification, implement, FortranCodeSanitizer
+from models.region import implementSymbolAccessStringAndRemainder
+from models.module import Module
+from models.symbol import Symbol
+from implementations.fortran import FortranImplementation
+
+HF_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPLEMENTED_SYMBOL_NAMES = ["a", "b", "c", "d", "temp_array", "a_hfdev"]
+
+parser = OptionParser()
+parser.add_option("-e", "--examplesDirectory", dest="examplesDir", default=os.path.join(HF_DIR, "examples"),
+									help="read the line corpus from the h90 files in DIR (default: the examples of this installation)", metavar="DIR")
+parser.add_option("-b", "--baseline", dest="baseline",
+									help="compare the results against this JSON file", metavar="FILENAME")
+parser.add_option("-s", "--saveBaseline", dest="saveBaseline",
+									help="store the results as JSON baseline", metavar="FILENAME")
+parser.add_option("-t", "--threshold", dest="threshold", type="float", default=0.2,
+									help="relative slowdown against the baseline that counts as a regression (default: 0.2)")
+parser.add_option("-r", "--repeat", dest="repeat", type="int", default=5,
+									help="number of measurements per benchmark, the fastest one is reported (default: 5)")
+parser.add_option("--minTime", dest="minTime", type="float", default=0.2,
+									help="minimum duration of one measurement in seconds (default: 0.2)")
+parser.add_option("-f", "--filter", dest="filter",
+									help="only run the benchmarks whose name contains this string")
+(options, args) = parser.parse_args()
+
+def exampleTexts(examplesDir):
+	texts = []
+	for path in sorted(dirEntries(examplesDir, True, "h90")):
+		sourceFile = open(path, "r")
+		try:
+			texts.append(sourceFile.read())
+		finally:
+			sourceFile.close()
+	return texts
+
+def codeLines(texts):
+	lines = []
+	for text in texts:
+		for line in text.split("\n"):
+			stripped = line.strip()
+			if stripped == "" or stripped.startswith("!") or stripped.startswith("@"):
+				continue
+			lines.append(stripped)
+	return lines
+
+def generatedLongLines():
+	accesses = ["a(x, y, k)", "b(x + 1, y, k)", "c(x, y - 1, k)", "d(x, y, k + 1)", "temp_array(x, y, k)"]
+	return [
+		"a(x, y, k) = " + " + ".join(accesses[index % len(accesses)] for index in range(60)),
+		"call kernel_with_many_arguments(" + ", ".join("argument_%i(x, y, k)" %(index) for index in range(80)) + ")",
+		"real(8), dimension(nx, ny, nz), intent(in) :: " + ", ".join("field_%i" %(index) for index in range(120)),
+		"write(0, *) \"a, b and c (quoted)\", " + ", ".join("'b(%i)', b(%i, y, k)" %(index, index) for index in range(40))
+	]
+
+def dummySymbols():
+	#the same minimal callgraph setup as used by the pickling tests in unit.py, with one entry per implemented symbol
+	callGraphXML = re.sub(r"[\n\t]*", "", """
+		<callGraph>
+			<routines>
+				<routine module="foo" name="bar" source="foo">
+					<domainDependants>
+						<templateRelation id="benchmarkTemplateID">%s</templateRelation>
+					</domainDependants>
+				</routine>
+			</routines>
+			<modules>
+				<module name="foo"/>
+			</modules>
+			<domainDependantTemplates>
+				<domainDependantTemplate id="benchmarkTemplateID">
+					<attribute><entry>present</entry><entry>autoDom</entry></attribute>
+					<domName><entry>x</entry><entry>y</entry><entry>k</entry></domName>
+					<domSize><entry>nx</entry><entry>ny</entry><entry>nz</entry></domSize>
+				</domainDependantTemplate>
+			</domainDependantTemplates>
+		</callGraph>
+	""" %("".join("<entry>%s</entry>" %(name) for name in IMPLEMENTED_SYMBOL_NAMES)))
+	cgDoc = ImmutableDOMDocument(parseString(callGraphXML, immutable=False))
+	module = Module("foo", cgDoc.firstChild.childNodes[1].firstChild)
+	routine = module.createRoutine("bar", cgDoc.firstChild.firstChild.firstChild, {}, FortranImplementation())
+	symbolsByName = OrderedDict()
+	for template, entry in getDomainDependantTemplatesAndEntries(cgDoc, routine.node):
+		name = entry.firstChild.nodeValue
+		symbolsByName[name] = Symbol(
+			name,
+			template,
+			symbolEntry=entry,
+			scopeNode=routine.node,
+			analysis=None,
+			parallelRegionTemplates=[],
+			globalParallelDomainNames={}
+		)
+	routine.loadSymbolsByName(symbolsByName)
+	return symbolsByName.values()
+
+def validCases(function, cases):
+	#cases the helper rejects (e.g. parseSpecification on non declaration lines) are not part of the benchmark
+	result = []
+	for case in cases:
+		try:
+			function(case)
+		except Exception:
+			continue
+		result.append(case)
+	return result
+
+def benchmarks(texts):
+	lines = codeLines(texts)
+	longLines = generatedLongLines()
+	allLines = lines + longLines
+	identifierPattern = re.compile(r"[a-zA-Z_]\w*")
+
+	def lastIdentifier(line):
+		identifiers = identifierPattern.findall(line)
+		return identifiers[-1] if len(identifiers) > 0 else "a"
+
+	splitCases = [([lastIdentifier(line), "a", "b"], line) for line in allLines]
+	findCases = [(lastIdentifier(line), line) for line in allLines]
+	bracketCases = [line.split("(", 1)[1] for line in allLines if "(" in line]
+	specificationCases = [line for line in allLines if "::" in line]
+	symbols = dummySymbols()
+	implementCases = [
+		line for line in allLines
+		if any(identifier in IMPLEMENTED_SYMBOL_NAMES for identifier in identifierPattern.findall(line))
+	]
+	sanitizeCases = texts + ["\n".join(longLines)]
+
+	result = OrderedDict()
+	result["splitTextAtLeftMostOccurrence"] = validCases(
+		lambda (matchStrings, line): splitTextAtLeftMostOccurrence(matchStrings, line),
+		splitCases
+	), lambda (matchStrings, line): splitTextAtLeftMostOccurrence(matchStrings, line)
+	result["findLeftMostOccurrenceNotInsideQuotes"] = validCases(
+		lambda (matchString, line): findLeftMostOccurrenceNotInsideQuotes(matchString, line, filterOutEmbeddings=True),
+		findCases
+	), lambda (matchString, line): findLeftMostOccurrenceNotInsideQuotes(matchString, line, filterOutEmbeddings=True)
+	result["BracketAnalyzer.getListOfArgumentsInOpenedBracketsAndRemainder"] = validCases(
+		lambda text: BracketAnalyzer().getListOfArgumentsInOpenedBracketsAndRemainder(text),
+		bracketCases
+	), lambda text: BracketAnalyzer().getListOfArgumentsInOpenedBracketsAndRemainder(text)
+	result["parseSpecification"] = validCases(parseSpecification, specificationCases), parseSpecification
+	implementLine = lambda line: implement(line, symbols, implementSymbolAccessStringAndRemainder)
+	result["implement"] = validCases(implementLine, implementCases), implementLine
+	sanitizeText = lambda text: FortranCodeSanitizer().sanitizeLines(text)
+	result["FortranCodeSanitizer.sanitizeLines"] = validCases(sanitizeText, sanitizeCases), sanitizeText
+	return result
+
+def operationsPerSecond(function, cases):
+	def runAllCases():
+		for case in cases:
+			function(case)
+
+	#calibrate the number of passes so that one measurement takes at least minTime
+	numberOfPasses = 1
+	while True:
+		duration = timeit.Timer(runAllCases).timeit(numberOfPasses)
+		if duration >= options.minTime:
+			break
+		numberOfPasses *= 2 if duration <= 0 else max(2, int(options.minTime / duration * 1.2))
+	fastestDuration = min(
+		[duration] + timeit.Timer(runAllCases).repeat(options.repeat - 1, numberOfPasses)
+	)
+	return len(cases) * numberOfPasses / fastestDuration
+
+def loadJSON(path):
+	jsonFile = open(path, "r")
+	try:
+		return json.load(jsonFile)
+	finally:
+		jsonFile.close()
+
+try:
+	if options.repeat < 1:
+		raise Exception("--repeat needs to be at least 1")
+	results = OrderedDict()
+	for name, (cases, function) in benchmarks(exampleTexts(options.examplesDir)).iteritems():
+		if options.filter and not options.filter in name:
+			continue
+		if len(cases) == 0:
+			raise Exception("no valid cases found for %s in %s" %(name, options.examplesDir))
+		entry = OrderedDict()
+		entry["cases"] = len(cases)
+		entry["opsPerSecond"] = round(operationsPerSecond(function, cases), 1)
+		results[name] = entry
+
+	baseline = loadJSON(options.baseline) if options.baseline else {}
+	regressions = []
+	sys.stdout.write("%-65s %8s %14s %14s %8s\n" %("helper", "cases", "ops/s", "baseline", "ratio"))
+	for name, entry in results.iteritems():
+		baselineOpsPerSecond = baseline.get(name, {}).get("opsPerSecond")
+		ratio = entry["opsPerSecond"] / baselineOpsPerSecond if baselineOpsPerSecond else None
+		isRegression = ratio != None and ratio < 1.0 - options.threshold
+		if isRegression:
+			regressions.append(name)
+		sys.stdout.write("%-65s %8i %14.1f %14s %8s%s\n" %(
+			name,
+			entry["cases"],
+			entry["opsPerSecond"],
+			"%.1f" %(baselineOpsPerSecond) if baselineOpsPerSecond else "-",
+			"%.2f" %(ratio) if ratio != None else "-",
+			"  REGRESSION" if isRegression else ""
+		))
+
+	if options.saveBaseline:
+		baselineFile = open(options.saveBaseline, "w")
+		try:
+			json.dump(results, baselineFile, indent=2)
+		finally:
+			baselineFile.close()
+	if len(regressions) > 0:
+		sys.stderr.write("%i helper(s) slower than the baseline by more than %i%%: %s\n" %(
+			len(regressions),
+			int(options.threshold * 100),
+			", ".join(regressions)
+		))
+		sys.exit(2)
+except Exception as e:
+	sys.stderr.write("Error in text helper benchmark: %s\n" %(str(e)))
+	sys.exit(1)
@@ -18,10 +18,11 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
-import pstats, sys
+import pstats, sys, json
 from optparse import OptionParser
 from tools.commons import setupDeferredLogging
 from tools.filesystem import dirEntries
+from tools.profiling import collapsedStacks, hotspotTable, hotspotDifferences
 import logging
 
 parser = OptionParser()
@@ -29,15 +30,54 @@ parser.add_option("-i", "--inputDirectory", dest="inputDir",
                   help="read files from DIR", metavar="DIR")
 parser.add_option("-o", "--output", dest="output",
                   help="output combined statistics to FILENAME", metavar="FILENAME")
+parser.add_option("--collapsed", dest="collapsed",
+                  help="output collapsed stacks (input for flamegraph.pl) to FILENAME", metavar="FILENAME")
+parser.add_option("--hotspots", dest="hotspots",
+                  help="output a per function hotspot table as JSON to FILENAME", metavar="FILENAME")
+parser.add_option("--compareHotspots", dest="baselineHotspots",
+                  help="compare the hotspots with a table written by --hotspots of an earlier build", metavar="FILENAME")
+parser.add_option("-n", "--numberOfEntries", dest="numberOfEntries", type="int", default=20,
+                  help="number of functions to print for --compareHotspots (default: 20)", metavar="N")
 (options, args) = parser.parse_args()
 
 setupDeferredLogging('preprocessor.log', logging.INFO)
 
-if not options.inputDir or not options.output:
+if not options.inputDir \
+or not (options.output or options.collapsed or options.hotspots or options.baselineHotspots):
 	logging.error("please see --help on how to use this program")
 	sys.exit(1)
 
 statFiles = dirEntries(str(options.inputDir), False, 'cprof')
+if len(statFiles) == 0:
+	logging.error("no .cprof files found in %s" %(options.inputDir))
+	sys.exit(1)
 logging.debug("combining %s" %(str(statFiles)))
 statistics = pstats.Stats(*statFiles)
-statistics.dump_stats(options.output)
\ No newline at end of file
+if options.output:
+	statistics.dump_stats(options.output)
+
+if options.collapsed:
+	collapsedFile = open(options.collapsed, "w")
+	try:
+		for stack, microseconds in collapsedStacks(statistics):
+			collapsedFile.write("%s %i\n" %(stack, microseconds))
+	finally:
+		collapsedFile.close()
+
+hotspots = hotspotTable(statistics) if options.hotspots or options.baselineHotspots else None
+if options.hotspots:
+	hotspotFile = open(options.hotspots, "w")
+	try:
+		json.dump(hotspots, hotspotFile, indent=2)
+	finally:
+		hotspotFile.close()
+
+if options.baselineHotspots:
+	baselineFile = open(options.baselineHotspots, "r")
+	try:
+		baselineHotspots = json.load(baselineFile)
+	finally:
+		baselineFile.close()
+	sys.stdout.write("%12s %12s %12s  %s\n" %("baseline [s]", "current [s]", "delta [s]", "function"))
+	for function, baselineTime, currentTime, difference in hotspotDifferences(baselineHotspots, hotspots)[:options.numberOfEntries]:
+		sys.stdout.write("%12.4f %12.4f %+12.4f  %s\n" %(baselineTime, currentTime, difference, function))
@@ -26,9 +26,10 @@ from machinery.commons import conversionOptions, FortranCodeSanitizer
 from tools.commons import UsageError, openFile, getDataFromFile, setupDeferredLogging, printProgressIndicator, progressIndicatorReset
 from tools.filesystem import dirEntries
 from tools.analysis import SymbolDependencyAnalyzer
+from tools.profiling import profiler
 import implementations.fortran
-from io import FileIO
-import os, errno, sys, json, traceback, logging
+from io import FileIO, BufferedWriter
+import os, errno, sys, json, traceback, logging, itertools, atexit
 
 def setDeviceHandlingFlagsInCallGraph(routine, calleesByCallerName, calleesByCalleeName, routinesByName, alreadyHandledRoutinesByName):
 	alreadyHandledRoutines = alreadyHandledRoutinesByName.get(routine.name, [])
@@ -63,6 +64,10 @@ parser.add_option("-m", "--implementation", dest="implementation",
 									help="specify either a FortranImplementation classname or a JSON containing classnames by template name and a 'default' entry", metavar="IMP")
 parser.add_option("--optionFlags", dest="optionFlags",
 									help="can be used to switch on or off the following flags (comma separated): DO_NOT_TOUCH_GPU_CACHE_SETTINGS")
+parser.add_option("-j", "--jobs", dest="jobs", type="int", default=1,
+									help="number of worker processes used to implement the routines of a module (default: 1)")
+parser.add_option("--profile-report", dest="profileReport",
+									help="write wall time, CPU time and memory usage per phase, file and routine as JSON to this path and print a summary to standard error", metavar="JSON")
 (options, args) = parser.parse_args()
 
 setupDeferredLogging('preprocessor.log', logging.DEBUG if options.debug else logging.INFO, showDeferredLogging=not options.debug)
@@ -89,6 +94,13 @@ if (not options.implementation):
 	sys.exit(1)
 
 conversionOptions.debugPrint = options.debug
+conversionOptions.routineJobs = options.jobs
+if options.profileReport:
+	def writeProfileReport():
+		profiler.writeReport(options.profileReport)
+		sys.stderr.write(profiler.summary())
+	profiler.enable()
+	atexit.register(writeProfileReport) #also covers runs that end with sys.exit
 filesInDir = dirEntries(str(options.sourceDir), True, 'h90')
 
 try:
@@ -100,7 +112,8 @@ except OSError as e:
 	pass
 
 #   get the callgraph information
-cgDoc = parseString(getDataFromFile(options.callgraph), immutable=False)
+with profiler.measure("Reading callgraph"):
+	cgDoc = parseString(getDataFromFile(options.callgraph), immutable=False)
 
 #   build up implementationNamesByTemplateName
 implementationNamesByTemplateName = None
@@ -126,34 +139,39 @@ implementationsByTemplateName = dict(
 #   have been declared in @domainDependant directives. Since these directives come *after* the declaration,
 #   we need this pass
 # cgDoc = getClonedDocument(cgDoc)
-for fileNum, fileInDir in enumerate(filesInDir):
-	parser = H90XMLSymbolDeclarationExtractor(cgDoc, implementationsByTemplateName=implementationsByTemplateName)
-	parser.processFile(fileInDir)
-	logging.debug("Symbol declarations extracted for " + fileInDir + "")
-	printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Symbol parsing, excluding imports")
+with profiler.measure("Symbol parsing, excluding imports"):
+	for fileNum, fileInDir in enumerate(filesInDir):
+		with profiler.measure("Symbol parsing, excluding imports", fileName=fileInDir):
+			parser = H90XMLSymbolDeclarationExtractor(cgDoc, implementationsByTemplateName=implementationsByTemplateName)
+			parser.processFile(fileInDir)
+		logging.debug("Symbol declarations extracted for " + fileInDir + "")
+		printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Symbol parsing, excluding imports")
 progressIndicatorReset(sys.stderr)
 
 #   build up symbol table indexed by module name
-moduleNodesByNameWithoutImplicitImports = getModuleNodesByName(cgDoc)
-symbolAnalyzer = SymbolDependencyAnalyzer(cgDoc)
-symbolAnalysisByRoutineNameAndSymbolNameWithoutImplicitImports = symbolAnalyzer.getSymbolAnalysisByRoutine()
-symbolsByModuleNameAndSymbolNameWithoutImplicitImports = getSymbolsByModuleNameAndSymbolName(
-	ImmutableDOMDocument(cgDoc),
-	moduleNodesByNameWithoutImplicitImports,
-	symbolAnalysisByRoutineNameAndSymbolName=symbolAnalysisByRoutineNameAndSymbolNameWithoutImplicitImports
-)
+with profiler.measure("Symbol table, excluding imports"):
+	moduleNodesByNameWithoutImplicitImports = getModuleNodesByName(cgDoc)
+	symbolAnalyzer = SymbolDependencyAnalyzer(cgDoc)
+	symbolAnalysisByRoutineNameAndSymbolNameWithoutImplicitImports = symbolAnalyzer.getSymbolAnalysisByRoutine()
+	symbolsByModuleNameAndSymbolNameWithoutImplicitImports = getSymbolsByModuleNameAndSymbolName(
+		ImmutableDOMDocument(cgDoc),
+		moduleNodesByNameWithoutImplicitImports,
+		symbolAnalysisByRoutineNameAndSymbolName=symbolAnalysisByRoutineNameAndSymbolNameWithoutImplicitImports
+	)
 
 #   parse the symbols again, this time know about all informations in the sourced modules in import
 #   -> update the callgraph document with this information.
-for fileNum, fileInDir in enumerate(filesInDir):
-	parser = H90XMLSymbolDeclarationExtractor(
-		cgDoc,
-		symbolsByModuleNameAndSymbolNameWithoutImplicitImports,
-		implementationsByTemplateName=implementationsByTemplateName
-	)
-	parser.processFile(fileInDir)
-	logging.debug("Symbol imports and declarations extracted for " + fileInDir + "")
-	printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Symbol parsing, including imports")
+with profiler.measure("Symbol parsing, including imports"):
+	for fileNum, fileInDir in enumerate(filesInDir):
+		with profiler.measure("Symbol parsing, including imports", fileName=fileInDir):
+			parser = H90XMLSymbolDeclarationExtractor(
+				cgDoc,
+				symbolsByModuleNameAndSymbolNameWithoutImplicitImports,
+				implementationsByTemplateName=implementationsByTemplateName
+			)
+			parser.processFile(fileInDir)
+		logging.debug("Symbol imports and declarations extracted for " + fileInDir + "")
+		printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Symbol parsing, including imports")
 progressIndicatorReset(sys.stderr)
 
 #   build up meta informations about the whole codebase
@@ -161,52 +179,55 @@ symbolAnalysisByRoutineNameAndSymbolName = None
 symbolsByModuleNameAndSymbolName = None
 symbolsByRoutineNameAndSymbolName = None
 parallelDomainNames = None
-try:
-	sys.stderr.write('Processing informations about the whole codebase\n')
-	moduleNodesByName = getModuleNodesByName(cgDoc)
-	parallelRegionData = getParallelRegionData(cgDoc)
-	symbolAnalyzer = SymbolDependencyAnalyzer(cgDoc)
-	#next line writes some information to cgDoc as a sideeffect. $$$ clean this up, ideally make cgDoc immutable everywhere for better performance
-	symbolAnalysisByRoutineNameAndSymbolName = symbolAnalyzer.getSymbolAnalysisByRoutine()
-	symbolsByModuleNameAndSymbolName = getSymbolsByModuleNameAndSymbolName(
-		ImmutableDOMDocument(cgDoc),
-		moduleNodesByName,
-		symbolAnalysisByRoutineNameAndSymbolName=symbolAnalysisByRoutineNameAndSymbolName
-	)
-	symbolsByRoutineNameAndSymbolName = getSymbolsByRoutineNameAndSymbolName(
-		ImmutableDOMDocument(cgDoc),
-		parallelRegionData[2],
-		parallelRegionData[1],
-		symbolAnalysisByRoutineNameAndSymbolName=symbolAnalysisByRoutineNameAndSymbolName
-	)
-	parallelDomainNames = getParallelDomainNames(cgDoc)
-except UsageError as e:
-	logging.error('Error: %s' %(str(e)))
-	sys.exit(1)
-except Exception as e:
-	logging.critical('Error when processing meta information about the codebase: %s' %(str(e)))
-	logging.info(traceback.format_exc())
-	sys.exit(1)
-
-#   Prepare the content for all files based on all the information above.
-sourceModels = []
-for fileNum, fileInDir in enumerate(filesInDir):
-	printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Preparing File Content")
+with profiler.measure("Processing informations about the whole codebase"):
 	try:
-		converter = ApplicationModelGenerator(
-			ImmutableDOMDocument(cgDoc), #using our immutable version we can speed up ALL THE THINGS through caching
-			implementationsByTemplateName,
+		sys.stderr.write('Processing informations about the whole codebase\n')
+		moduleNodesByName = getModuleNodesByName(cgDoc)
+		parallelRegionData = getParallelRegionData(cgDoc)
+		symbolAnalyzer = SymbolDependencyAnalyzer(cgDoc)
+		#next line writes some information to cgDoc as a sideeffect. $$$ clean this up, ideally make cgDoc immutable everywhere for better performance
+		symbolAnalysisByRoutineNameAndSymbolName = symbolAnalyzer.getSymbolAnalysisByRoutine()
+		symbolsByModuleNameAndSymbolName = getSymbolsByModuleNameAndSymbolName(
+			ImmutableDOMDocument(cgDoc),
 			moduleNodesByName,
-			parallelRegionData,
-			symbolAnalysisByRoutineNameAndSymbolName,
-			symbolsByModuleNameAndSymbolName,
-			symbolsByRoutineNameAndSymbolName,
-			parallelDomainNames
+			symbolAnalysisByRoutineNameAndSymbolName=symbolAnalysisByRoutineNameAndSymbolName
+		)
+		symbolsByRoutineNameAndSymbolName = getSymbolsByRoutineNameAndSymbolName(
+			ImmutableDOMDocument(cgDoc),
+			parallelRegionData[2],
+			parallelRegionData[1],
+			symbolAnalysisByRoutineNameAndSymbolName=symbolAnalysisByRoutineNameAndSymbolName
 		)
-		sourceModels.append(converter.prepareFileContent(fileInDir))
+		parallelDomainNames = getParallelDomainNames(cgDoc)
 	except UsageError as e:
 		logging.error('Error: %s' %(str(e)))
 		sys.exit(1)
+	except Exception as e:
+		logging.critical('Error when processing meta information about the codebase: %s' %(str(e)))
+		logging.info(traceback.format_exc())
+		sys.exit(1)
+
+#   Prepare the content for all files based on all the information above.
+sourceModels = []
+with profiler.measure("Preparing File Content"):
+	for fileNum, fileInDir in enumerate(filesInDir):
+		printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Preparing File Content")
+		try:
+			with profiler.measure("Preparing File Content", fileName=fileInDir):
+				converter = ApplicationModelGenerator(
+					ImmutableDOMDocument(cgDoc), #using our immutable version we can speed up ALL THE THINGS through caching
+					implementationsByTemplateName,
+					moduleNodesByName,
+					parallelRegionData,
+					symbolAnalysisByRoutineNameAndSymbolName,
+					symbolsByModuleNameAndSymbolName,
+					symbolsByRoutineNameAndSymbolName,
+					parallelDomainNames
+				)
+				sourceModels.append(converter.prepareFileContent(fileInDir))
+		except UsageError as e:
+			logging.error('Error: %s' %(str(e)))
+			sys.exit(1)
 progressIndicatorReset(sys.stderr)
 
 #   Analyse Callgraph for Implementation specific behavior
@@ -214,74 +235,89 @@ modulesByName = {}
 routinesByName = {}
 calleesByCallerName = {}
 calleesByCalleeName = {}
-for fileNum, fc in enumerate(sourceModels):
-	printProgressIndicator(sys.stderr, fc['fileName'], fileNum + 1, len(sourceModels), "CG Analysis")
-	for m in fc['modules']:
-		if modulesByName.get(m.name) != None:
-			logging.error("Error: Multiple modules with name %s found" %(m.name))
-			sys.exit(1)
-		modulesByName[m.name] = m
-		for r in m.routines:
-			if routinesByName.get(r.name) != None:
-				logging.error("Error: Multiple routines with name %s found" %(r.name))
+with profiler.measure("CG Analysis"):
+	for fileNum, fc in enumerate(sourceModels):
+		printProgressIndicator(sys.stderr, fc['fileName'], fileNum + 1, len(sourceModels), "CG Analysis")
+		for m in fc['modules']:
+			if modulesByName.get(m.name) != None:
+				logging.error("Error: Multiple modules with name %s found" %(m.name))
 				sys.exit(1)
-			routinesByName[r.name] = r
-			for callee in r.callees:
-				callees = calleesByCallerName.get(r.name, [])
-				callees.append(callee)
-				calleesByCallerName[r.name] = callees
+			modulesByName[m.name] = m
+			for r in m.routines:
+				if routinesByName.get(r.name) != None:
+					logging.error("Error: Multiple routines with name %s found" %(r.name))
+					sys.exit(1)
+				routinesByName[r.name] = r
+				for callee in r.callees:
+					callees = calleesByCallerName.get(r.name, [])
+					callees.append(callee)
+					calleesByCallerName[r.name] = callees
 
-				callees = calleesByCalleeName.get(callee.name, [])
-				callees.append(callee)
-				calleesByCalleeName[callee.name] = callees
+					callees = calleesByCalleeName.get(callee.name, [])
+					callees.append(callee)
+					calleesByCalleeName[callee.name] = callees
 progressIndicatorReset(sys.stderr)
 
 #   Analyse Callgraph for device handling capabilities
 routines = routinesByName.values()
 alreadyHandledRoutinesByName = {}
-for routineNum, r in enumerate(routines):
-	printProgressIndicator(sys.stderr, r.name, routineNum + 1, len(routines), "CG Device Handling Analysis")
-	if not hasattr(r, "implementation"):
-		continue
-	if r.implementation.canHandleDeviceData and r.node.getAttribute('parallelRegionPosition') in [
-		"within",
-		"inside",
-		"outside"
-	]:
-		continue
-	setDeviceHandlingFlagsInCallGraph(r, calleesByCallerName, calleesByCalleeName, routinesByName, alreadyHandledRoutinesByName)
+with profiler.measure("CG Device Handling Analysis"):
+	for routineNum, r in enumerate(routines):
+		printProgressIndicator(sys.stderr, r.name, routineNum + 1, len(routines), "CG Device Handling Analysis")
+		if not hasattr(r, "implementation"):
+			continue
+		if r.implementation.canHandleDeviceData and r.node.getAttribute('parallelRegionPosition') in [
+			"within",
+			"inside",
+			"outside"
+		]:
+			continue
+		setDeviceHandlingFlagsInCallGraph(r, calleesByCallerName, calleesByCalleeName, routinesByName, alreadyHandledRoutinesByName)
 progressIndicatorReset(sys.stderr)
 
 #   Preprocess all modules.
 #   Routines will be split according to architecture.
 #   Symbol usage will be analysed so this info is available globally.
-for fileNum, fc in enumerate(sourceModels):
-	printProgressIndicator(sys.stderr, fc['fileName'], fileNum + 1, len(sourceModels), "Prepare Modules for Implementation")
-	try:
-		for m in fc['modules']:
-			m.prepareForImplementation()
-	except UsageError as e:
-		logging.error('Error: %s' %(str(e)))
-		sys.exit(1)
+with profiler.measure("Prepare Modules for Implementation"):
+	for fileNum, fc in enumerate(sourceModels):
+		printProgressIndicator(sys.stderr, fc['fileName'], fileNum + 1, len(sourceModels), "Prepare Modules for Implementation")
+		try:
+			with profiler.measure("Prepare Modules for Implementation", fileName=fc['fileName']):
+				for m in fc['modules']:
+					m.prepareForImplementation()
+		except UsageError as e:
+			logging.error('Error: %s' %(str(e)))
+			sys.exit(1)
 progressIndicatorReset(sys.stderr)
 
 #   Finally, do the conversion based on the prepare content
 codeSanitizer = FortranCodeSanitizer()
-for fileNum, fc in enumerate(sourceModels):
-	outputPath = os.path.join(
-		os.path.normpath(options.outputDir),
-		os.path.splitext(os.path.basename(fc['fileName']))[0] + ".P90.temp"
-	)
-	printProgressIndicator(sys.stderr, fc['fileName'], fileNum + 1, len(sourceModels), "Implementing as Standard Fortran")
-	outputStream = FileIO(outputPath, mode="wb")
-	try:
-		outputStream.write(codeSanitizer.sanitizeLines(fc['prefix'] + "\n"))
-		for m in fc['modules']:
-			outputStream.write(codeSanitizer.sanitizeLines(m.implemented(modulesByName, routinesByName) + "\n\n"))
-			outputStream.write(codeSanitizer.sanitizeLines(fc['appendixByModuleName'].get(m.name, "") + "\n"))
-	except UsageError as e:
-		logging.error('Error: %s' %(str(e)))
-		sys.exit(1)
-	finally:
-		outputStream.close()
+with profiler.measure("Implementing as Standard Fortran"):
+	for fileNum, fc in enumerate(sourceModels):
+		outputPath = os.path.join(
+			os.path.normpath(options.outputDir),
+			os.path.splitext(os.path.basename(fc['fileName']))[0] + ".P90.temp"
+		)
+		printProgressIndicator(sys.stderr, fc['fileName'], fileNum + 1, len(sourceModels), "Implementing as Standard Fortran")
+		outputStream = BufferedWriter(FileIO(outputPath, mode="wb"))
+		isOutputComplete = False
+		try:
+			with profiler.measure("Implementing as Standard Fortran", fileName=fc['fileName']):
+				#modules are streamed through the sanitizer into the file - only one region at a time is held in memory
+				outputStream.write(codeSanitizer.sanitizeLines(fc['prefix'] + "\n"))
+				for m in fc['modules']:
+					outputStream.writelines(codeSanitizer.sanitizedTexts(itertools.chain(
+						m.implementedTexts(modulesByName, routinesByName),
+						["\n\n"]
+					)))
+					outputStream.write(codeSanitizer.sanitizeLines(fc['appendixByModuleName'].get(m.name, "") + "\n"))
+			isOutputComplete = True
+		except UsageError as e:
+			logging.error('Error: %s' %(str(e)))
+			sys.exit(1)
+		finally:
+			outputStream.close()
+			if not isOutputComplete:
+				#don't leave a partially streamed module behind that looks like valid output
+				os.remove(outputPath)
 progressIndicatorReset(sys.stderr)
\ No newline at end of file
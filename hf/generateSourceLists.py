@@ -0,0 +1,123 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+#**********************************************************************#
+#  Procedure        generateSourceLists.py                             #
+#  Comment          Lists and filters all sources of a Hybrid Fortran  #
+#                   project in one run and writes them as a Make       #
+#                   include fragment. The fragment depends on every    #
+#                   scanned directory, so Make only regenerates it     #
+#                   when files are added, removed or renamed.          #
+#**********************************************************************#
+
+import os, sys, logging, traceback
+from optparse import OptionParser
+from tools.commons import setupDeferredLogging, OrderedDict
+from tools.filesystem import filesAndDirectories, filterExceptions
+
+#(make variable, file extensions) - the project sources are filtered by the exceptions, the library sources are not
+SOURCE_LISTS = [
+	("SRC_F90", ["f90", "f", "inc"]),
+	("SRC_F90PP", ["F90", "F"]),
+	("SRC_C", ["c", "cu"]),
+	("SRC_H90_WITHOUT_PP", ["h90"]),
+	("SRC_H90_WITH_PP", ["H90"])
+]
+LIBRARY_SOURCE_LISTS = [
+	("SRC_LIB_FORT", ["f90"]),
+	("SRC_LIB_FORT_PP", ["F90"]),
+	("SRC_LIB_H90", ["h90"]),
+	("SRC_LIB_H90_WITH_PP", ["H90"])
+]
+STORAGE_ORDER_FILE = "storage_order.F90"
+
+def makeEscaped(text):
+	return text.replace("$", "$$").replace("#", "\\#")
+
+def pathsWithExtensions(paths, extensions):
+	return [path for path in paths if os.path.splitext(path)[1][1:] in extensions]
+
+def sourceLists(sourceDir, libraryDir, exceptions):
+	sourceFiles, directories = filesAndDirectories(sourceDir)
+	libraryFiles, libraryDirectories = filesAndDirectories(libraryDir) if libraryDir else ([], [])
+	result = OrderedDict()
+	for name, extensions in SOURCE_LISTS:
+		result[name] = filterExceptions(exceptions, pathsWithExtensions(sourceFiles, extensions))
+	for name, extensions in LIBRARY_SOURCE_LISTS:
+		result[name] = pathsWithExtensions(libraryFiles, extensions)
+	#the storage order file is generated per architecture -> always taken from the framework, never from the sources
+	fortranSources = result["SRC_F90"] + result["SRC_F90PP"] + result["SRC_LIB_FORT"] + result["SRC_LIB_FORT_PP"]
+	result["SRC_TGT_FORT"] = filterExceptions(
+		["storage_order"],
+		[path[:-len(".F90")] + ".P90" if path.endswith(".F90") else path for path in fortranSources]
+	) + [STORAGE_ORDER_FILE]
+	return result, directories + libraryDirectories
+
+def sourceListsFragment(target, exceptions, listsByName, directories):
+	lines = [
+		"# generated by generateSourceLists.py - do not edit, it is regenerated when the source directories change",
+		"HF_SOURCE_LISTS_EXCEPTIONS=%s" %(makeEscaped(" ".join(exceptions)))
+	]
+	for name, paths in listsByName.iteritems():
+		lines.append("%s=%s" %(name, " ".join(makeEscaped(path) for path in paths)))
+	lines += [
+		"",
+		#absolute directory paths, so they can't be confused with phony targets like 'source'
+		"%s: %s" %(makeEscaped(target), " ".join(makeEscaped(os.path.abspath(directory)) for directory in directories)),
+		""
+	]
+	return "\n".join(lines)
+
+##################### MAIN ##############################
+#get all program arguments
+parser = OptionParser()
+parser.add_option("-s", "--sourceDirectory", dest="sourceDir",
+									help="read the project sources recursively from DIR", metavar="DIR")
+parser.add_option("-l", "--libraryDirectory", dest="libraryDir",
+									help="read the framework library sources recursively from DIR", metavar="DIR")
+parser.add_option("-e", "--exceptions", dest="exceptions",
+									help="exceptions to filter out from the project sources (space separated)")
+parser.add_option("-o", "--output", dest="output",
+									help="write the Make include fragment to FILENAME", metavar="FILENAME")
+parser.add_option("-d", "--debug", action="store_true", dest="debug",
+									help="show debug print in standard error output")
+(options, args) = parser.parse_args()
+
+setupDeferredLogging('preprocessor.log', logging.DEBUG if options.debug else logging.INFO)
+
+if not options.sourceDir or not options.output:
+	logging.error("please see --help on how to use this program")
+	sys.exit(1)
+
+exceptions = [exception.strip() for exception in (options.exceptions or "").split(" ") if exception.strip() != ""]
+
+try:
+	listsByName, directories = sourceLists(options.sourceDir, options.libraryDir, exceptions)
+	#write to a temporary file first - Make must never include a partially written fragment
+	temporaryPath = options.output + ".temp"
+	fragmentFile = open(temporaryPath, "w")
+	try:
+		fragmentFile.write(sourceListsFragment(options.output, exceptions, listsByName, directories))
+	finally:
+		fragmentFile.close()
+	os.rename(temporaryPath, options.output)
+except Exception as e:
+	logging.critical('Error when generating the source lists for %s: %s%s\n' %(options.sourceDir, str(e), traceback.format_exc()))
+	sys.exit(64)
@@ -982,7 +982,7 @@ class CUDAFortranImplementation(DeviceDataFortranImplementation):
 					selectiveImportMatch = regexPatterns.importPattern.match(line)
 					if not allImportMatch and not selectiveImportMatch:
 						adjustedSpecLinesAndSymbols.append((line, symbols))
-			kernelRoutine.regions[0]._linesAndSymbols = adjustedSpecLinesAndSymbols
+			kernelRoutine.regions[0].loadLinesAndSymbols(adjustedSpecLinesAndSymbols)
 			if kernelRoutine._allImports:
 				adjustedImports = {}
 				moduleNamesCompletelyImported = [
@@ -18,9 +18,9 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
-import re, logging
+import re, logging, itertools
 from tools.commons import BracketAnalyzer, UsageError, findRightMostOccurrenceNotInsideQuotes, \
-    splitIntoComponentsAndRemainder, getComponentNameAndBracketContent, enum
+    splitIntoComponentsAndRemainder, getComponentNameAndBracketContent, enum, strippedTexts, splitLines
 from tools.patterns import regexPatterns
 
 TypeParameter = enum(
@@ -180,6 +180,7 @@ def replaceEarlyExits(line, implementation, parallelRegionPosition):
 
 class ConversionOptions(object):
     debugPrint = False
+    routineJobs = 1
 
 conversionOptions = ConversionOptions()
 
@@ -212,107 +213,110 @@ class FortranCodeSanitizer(object):
         self.emptyLinesInARow = 0
 
     def sanitizeLines(self, line, toBeCommented=False, howManyCharsPerLine=132, commentChar="!"):
-        strippedRawLine = line.strip()
-        if strippedRawLine == "" and self.emptyLinesInARow > 1:
-            return ""
-        if strippedRawLine == "":
+        return "".join(self.sanitizedTexts([line], toBeCommented, howManyCharsPerLine, commentChar))
+
+    def sanitizedTexts(self, texts, toBeCommented=False, howManyCharsPerLine=132, commentChar="!"):
+        '''Streaming version of sanitizeLines for the concatenation of texts - yields the sanitized code line by line.'''
+        strippedTextStream = strippedTexts(texts)
+        for firstText in strippedTextStream:
+            break
+        else:
+            if self.emptyLinesInARow > 1:
+                return
             self.emptyLinesInARow += 1
-            return "\n"
+            yield "\n"
+            return
 
         self.emptyLinesInARow = 0
-        codeLines = strippedRawLine.split("\n")
-        sanitizedCodeLines = []
-        lineSep = " &"
+        for codeLine in splitLines(itertools.chain([firstText], strippedTextStream)):
+            for sanitizedCodeLine in self._brokenUpCodeLine(codeLine, toBeCommented, howManyCharsPerLine, commentChar):
+                yield self._tabbedCodeLine(sanitizedCodeLine) + "\n"
 
+    def _brokenUpCodeLine(self, codeLine, toBeCommented, howManyCharsPerLine, commentChar):
         # ----------- break up line to get valid Fortran lenghts ------ #
-        for codeLine in codeLines:
-            if len(codeLine) <= howManyCharsPerLine:
-                sanitizedCodeLines.append(codeLine)
-                continue
-            remainder = codeLine
-            previousLineLength = len(remainder)
-            blankPos = -1
-            remainderContainsLineContinuation = False
-            while len(remainder) > howManyCharsPerLine - len(lineSep):
-                isOpenMPDirectiveLine = self.openMPLinePattern.match(remainder) != None
-                isOpenACCDirectiveLine = self.openACCLinePattern.match(remainder) != None
-                if commentChar in remainder and not isOpenMPDirectiveLine and not isOpenACCDirectiveLine:
-                    commentPos = remainder.find(commentChar)
-                    if commentPos <= howManyCharsPerLine:
-                        break
-                #find a blank that's NOT within a quoted string
-                searchString = remainder
-                prevLineContinuation = ""
-                if remainderContainsLineContinuation and (isOpenMPDirectiveLine or isOpenACCDirectiveLine):
-                    searchString = remainder[7:]
-                    prevLineContinuation = remainder[:7]
-                elif remainderContainsLineContinuation:
-                    searchString = remainder[2:]
-                    prevLineContinuation = remainder[:2]
-                startOffset = 0
-                while len(searchString) + len(prevLineContinuation) > howManyCharsPerLine - len(lineSep) + startOffset:
-                    blankPos = findRightMostOccurrenceNotInsideQuotes(' ', searchString, rightStartAt=howManyCharsPerLine - len(lineSep) + startOffset)
-                    startOffset += 5 #if nothing is possible to break up it's better to go a little bit over the limit, often the compiler will still cope
-                    if blankPos >= 1:
-                        break
-                if blankPos < 1:
-                    currLine = remainder
-                    remainder = ""
-                else:
-                    currLine = prevLineContinuation + searchString[:blankPos] + lineSep
-                    if blankPos >= 1 and isOpenMPDirectiveLine:
-                        remainder = '!$OMP& ' + searchString[blankPos:]
-                        remainderContainsLineContinuation = True
-                    elif blankPos >= 1 and isOpenACCDirectiveLine:
-                        remainder = '!$acc& ' + searchString[blankPos:]
-                        remainderContainsLineContinuation = True
-                    elif blankPos >= 1:
-                        remainder = '& ' + searchString[blankPos:]
-                        remainderContainsLineContinuation = True
-                sanitizedCodeLines.append(currLine)
-                if blankPos < 1 or len(remainder) >= previousLineLength:
-                    #blank not found or at beginning of line
-                    #-> bail out in order to avoid infinite loop - just keep the line as it was.
-                    logging.warning(
-                        "The following line could not be broken up for Fortran compatibility - no suitable spaces found: %s (remainder: %s)\n" %(
-                            currLine,
-                            remainder
-                        ),
-                        extra={"hfLineNo":currLineNo, "hfFile":currFile}
-                    )
+        if len(codeLine) <= howManyCharsPerLine:
+            return [codeLine]
+        sanitizedCodeLines = []
+        lineSep = " &"
+        remainder = codeLine
+        previousLineLength = len(remainder)
+        blankPos = -1
+        remainderContainsLineContinuation = False
+        while len(remainder) > howManyCharsPerLine - len(lineSep):
+            isOpenMPDirectiveLine = self.openMPLinePattern.match(remainder) != None
+            isOpenACCDirectiveLine = self.openACCLinePattern.match(remainder) != None
+            if commentChar in remainder and not isOpenMPDirectiveLine and not isOpenACCDirectiveLine:
+                commentPos = remainder.find(commentChar)
+                if commentPos <= howManyCharsPerLine:
+                    break
+            #find a blank that's NOT within a quoted string
+            searchString = remainder
+            prevLineContinuation = ""
+            if remainderContainsLineContinuation and (isOpenMPDirectiveLine or isOpenACCDirectiveLine):
+                searchString = remainder[7:]
+                prevLineContinuation = remainder[:7]
+            elif remainderContainsLineContinuation:
+                searchString = remainder[2:]
+                prevLineContinuation = remainder[:2]
+            startOffset = 0
+            while len(searchString) + len(prevLineContinuation) > howManyCharsPerLine - len(lineSep) + startOffset:
+                blankPos = findRightMostOccurrenceNotInsideQuotes(' ', searchString, rightStartAt=howManyCharsPerLine - len(lineSep) + startOffset)
+                startOffset += 5 #if nothing is possible to break up it's better to go a little bit over the limit, often the compiler will still cope
+                if blankPos >= 1:
                     break
-                previousLineLength = len(remainder)
-            if toBeCommented:
-                currLine = commentChar + " " + currLine
-            if remainder != "":
-                sanitizedCodeLines.append(remainder)
+            if blankPos < 1:
+                currLine = remainder
+                remainder = ""
+            else:
+                currLine = prevLineContinuation + searchString[:blankPos] + lineSep
+                if blankPos >= 1 and isOpenMPDirectiveLine:
+                    remainder = '!$OMP& ' + searchString[blankPos:]
+                    remainderContainsLineContinuation = True
+                elif blankPos >= 1 and isOpenACCDirectiveLine:
+                    remainder = '!$acc& ' + searchString[blankPos:]
+                    remainderContainsLineContinuation = True
+                elif blankPos >= 1:
+                    remainder = '& ' + searchString[blankPos:]
+                    remainderContainsLineContinuation = True
+            sanitizedCodeLines.append(currLine)
+            if blankPos < 1 or len(remainder) >= previousLineLength:
+                #blank not found or at beginning of line
+                #-> bail out in order to avoid infinite loop - just keep the line as it was.
+                logging.warning(
+                    "The following line could not be broken up for Fortran compatibility - no suitable spaces found: %s (remainder: %s)\n" %(
+                        currLine,
+                        remainder
+                    ),
+                    extra={"hfLineNo":currLineNo, "hfFile":currFile}
+                )
+                break
+            previousLineLength = len(remainder)
+        if toBeCommented:
+            currLine = commentChar + " " + currLine
+        if remainder != "":
+            sanitizedCodeLines.append(remainder)
+        return sanitizedCodeLines
 
+    def _tabbedCodeLine(self, codeLine):
         # ----------- re indent codelines ----------------------------- #
         # ----------- and strip whitespace ---------------------------- #
-        # ----------- and remove consecutive empty lines -------------- #
-        tabbedCodeLines = []
-        for codeLine in sanitizedCodeLines:
-            strippedLine = codeLine.strip()
-            if strippedRawLine == "" and self.emptyLinesInARow > 1:
-                continue
-            if strippedLine == "":
-                self.emptyLinesInARow += 1
-                tabbedCodeLines.append("")
-                continue
-            self.emptyLinesInARow = 0
-            if self.commentedPattern.match(strippedLine):
-                tabbedCodeLines.append(strippedLine)
-            elif self.preprocessorPattern.match(strippedLine):
-                #note: ifort's preprocessor can't handle preprocessor lines with leading whitespace -.-
-                #=> catch this case and strip any whitespace.
-                tabbedCodeLines.append(strippedLine)
-            elif self.tabDecreasingPattern.match(strippedLine):
-                self.currNumOfTabs = max(0, self.currNumOfTabs - 1)
-                tabbedCodeLines.append(self.currNumOfTabs * "\t" + strippedLine)
-            elif self.tabIncreasingPattern.match(strippedLine):
-                tabbedCodeLines.append(self.currNumOfTabs * "\t" + strippedLine)
-                self.currNumOfTabs = min(5, self.currNumOfTabs + 1)
-            else:
-                tabbedCodeLines.append(self.currNumOfTabs * "\t" + strippedLine)
-
-        return "\n".join(tabbedCodeLines) + "\n"
\ No newline at end of file
+        # ----------- and count consecutive empty lines --------------- #
+        strippedLine = codeLine.strip()
+        if strippedLine == "":
+            self.emptyLinesInARow += 1
+            return ""
+        self.emptyLinesInARow = 0
+        if self.commentedPattern.match(strippedLine):
+            return strippedLine
+        if self.preprocessorPattern.match(strippedLine):
+            #note: ifort's preprocessor can't handle preprocessor lines with leading whitespace -.-
+            #=> catch this case and strip any whitespace.
+            return strippedLine
+        if self.tabDecreasingPattern.match(strippedLine):
+            self.currNumOfTabs = max(0, self.currNumOfTabs - 1)
+            return self.currNumOfTabs * "\t" + strippedLine
+        if self.tabIncreasingPattern.match(strippedLine):
+            tabbedLine = self.currNumOfTabs * "\t" + strippedLine
+            self.currNumOfTabs = min(5, self.currNumOfTabs + 1)
+            return tabbedLine
+        return self.currNumOfTabs * "\t" + strippedLine
\ No newline at end of file
@@ -1278,7 +1278,8 @@ class H90XMLSymbolDeclarationExtractor(H90CallGraphAndSymbolDeclarationsParser):
         isInModuleScope = self.currSubprocName in [None, ""]
         if symbol:
             symbol._nameInScope = symbolInScope
-            symbol._sourceModuleIdentifier = moduleName
+            symbol.invalidateNameInScope()
+            symbol.sourceModule = moduleName
             symbol.sourceSymbol = sourceSymbol
         else:
             relationNode, templateNode = setTemplateInfos(
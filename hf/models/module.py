@@ -18,7 +18,67 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import time
+import pickle
+import logging
+import itertools
+import traceback
+import multiprocessing
 from models.routine import AnalyzableRoutine
+from tools.commons import strippedTexts
+from machinery.commons import conversionOptions
+from tools.profiling import profiler, cpuTime, peakRSSInKiB
+
+#only set in the parent process right before forking the workers - they inherit the implementation state from there.
+_moduleForRoutineWorkers = None
+#log records of the job a worker is currently running, handed back to the parent together with the job's result
+_workerLogRecords = []
+
+class _WorkerLogRecordCollector(logging.Handler):
+	def emit(self, record):
+		#like QueueHandler.prepare in Python 3: merge the arguments into the message, drop what may not pickle
+		record.msg = record.getMessage()
+		record.args = None
+		if record.exc_info:
+			record.exc_text = logging.Formatter().formatException(record.exc_info)
+			record.exc_info = None
+		_workerLogRecords.append(record)
+
+def _initializeRoutineWorker():
+	#The handlers inherited from the parent don't work here: the deferred handler would never be flushed (workers
+	#don't run atexit) or flush a copy of the parent's buffer a second time -> collect the records for the parent.
+	logger = logging.getLogger()
+	for handler in list(logger.handlers):
+		logger.removeHandler(handler)
+	logger.addHandler(_WorkerLogRecordCollector())
+
+def _picklableError(error):
+	try:
+		pickle.loads(pickle.dumps(error))
+		return error
+	except Exception:
+		return Exception(str(error))
+
+def _routineWorkerJob(job):
+	#-> (implemented text or None, log records, error or None, traceback text, (wall time, cpu time, peak rss))
+	methodName, routineIndex = job
+	del _workerLogRecords[:]
+	routine = _moduleForRoutineWorkers._routinesForImplementation[routineIndex]
+	wallTimeBefore = time.time()
+	cpuTimeBefore = cpuTime()
+	text = None
+	error = None
+	tracebackText = ""
+	try:
+		if methodName == "implementedTexts":
+			text = "".join(routine.implementedTexts())
+		else:
+			getattr(routine, methodName)()
+	except Exception as e:
+		error = _picklableError(e)
+		tracebackText = traceback.format_exc()
+	return text, list(_workerLogRecords), error, tracebackText, (time.time() - wallTimeBefore, cpuTime() - cpuTimeBefore, peakRSSInKiB())
 
 class Module(object):
 	def __init__(self, name, moduleNode):
@@ -81,42 +141,122 @@ class Module(object):
 			routine._analyseSymbolUsage()
 
 	def implemented(self, modulesByName, routinesByName):
+		return "".join(self.implementedTexts(modulesByName, routinesByName))
+
+	def implementedTexts(self, modulesByName, routinesByName):
 		self.modulesByName = modulesByName
 		self.routinesByName = routinesByName
 
-		for routine in self._routinesForImplementation:
-			routine._checkParallelRegions()
-
-		for routine in self._routinesForImplementation:
+		def deduplicateAndPrepareCallRegions(routine):
 			routine._deduplicateAndFinalizeSymbols() #TODO if we don't do this, there are references that won't work. test in examples/demo without this line.
 			routine._prepareCallRegions()
 
-		for routine in self._routinesForImplementation:
-			routine._prepareAdditionalContext(self)
-
-		for routine in self._routinesForImplementation:
+		def mergeAndAnalyseSymbols(routine):
 			routine._mergeSynthesizedWithExistingSymbols()
-			routine._analyseSymbolUsage() #need to do this a second time to get additional context right
+			routine._analyseSymbolUsage() #update usage with the additional context - regions whose symbols did not change are skipped
 
-		for routine in self._routinesForImplementation:
-			routine.checkSymbols()
+		#Only these two phases don't write to state shared between routines: parallel region checks and symbol checks.
+		#Parallel region checks are run first (and in here) since they need to fail before any symbol is touched.
+		#The phases in between update symbols and callees of other routines - forked workers couldn't hand that back.
+		self._runPhase("Checking parallel regions", lambda routine: routine._checkParallelRegions())
+		self._runPhase("Finalizing symbols and call regions", deduplicateAndPrepareCallRegions)
+		self._runPhase("Preparing additional context", lambda routine: routine._prepareAdditionalContext(self))
+		self._runPhase("Merging synthesized symbols", mergeAndAnalyseSymbols)
 
 		self._footerText = self._undecidedText
 		self._undecidedText = ""
-		implementedModuleElements = \
-			[self._headerText.strip()] \
-			+ [
+
+		pool = self._createRoutineWorkerPool()
+		try:
+			self._runPhase("Checking symbols", lambda routine: routine.checkSymbols(), pool, "checkSymbols")
+
+			def routineTexts(routine, routineTextStream):
+				for text in routineTextStream:
+					yield text
+				yield "\n" + self._postTextByRoutine.get(routine.name, "").strip()
+
+			implementedModuleElements = itertools.chain(
+				[[self._headerText]],
 				(
-					routine.implemented() + "\n" + self._postTextByRoutine.get(routine.name, "").strip()
-				).strip()
+					routineTexts(routine, routineTextStream)
+					for routine, routineTextStream in itertools.izip(self._routinesForImplementation, self._implementedRoutineTextStreams(pool))
+				),
+				[[self._footerText]]
+			)
+			hasPreviousElement = False
+			for elementTexts in implementedModuleElements:
+				isElementEmpty = True
+				for text in strippedTexts(elementTexts):
+					if isElementEmpty and hasPreviousElement:
+						yield "\n"
+					isElementEmpty = False
+					yield text
+				if not isElementEmpty:
+					hasPreviousElement = True
+					yield "\n"
+			if pool != None:
+				#let the workers exit on their own
+				pool.close()
+				pool.join()
+				pool = None
+		finally:
+			if pool != None:
+				pool.terminate()
+				pool.join()
+
+	def _runPhase(self, phaseName, phase, pool=None, methodName=None):
+		#Phase barrier: every routine has completed a phase before any routine starts the next one.
+		#With a worker pool, the routine method 'methodName' runs in the workers instead - only for read only phases.
+		if pool == None or methodName == None:
+			for routine in self._routinesForImplementation:
+				with profiler.measure(phaseName, routineName=routine.name):
+					phase(routine)
+			return
+		results = pool.map(_routineWorkerJob, [(methodName, index) for index in range(len(self._routinesForImplementation))])
+		for routine, result in itertools.izip(self._routinesForImplementation, results):
+			self._processWorkerResult(phaseName, routine, result)
+
+	def _processWorkerResult(self, phaseName, routine, result):
+		#log and fail in routine order, as if the job had run in this process
+		text, logRecords, error, tracebackText, (wallTime, cpuTimeUsed, peakRSS) = result
+		for record in logRecords:
+			logging.getLogger(record.name).handle(record)
+		profiler.addMeasurement(phaseName, wallTime, cpuTimeUsed, peakRSS, routineName=routine.name)
+		if error != None:
+			logging.debug("Traceback in routine worker for %s:\n%s" %(routine.name, tracebackText))
+			raise error
+		return text
+
+	def _createRoutineWorkerPool(self):
+		if conversionOptions.routineJobs <= 1 \
+		or len(self._routinesForImplementation) <= 1 \
+		or not hasattr(os, "fork"):
+			return None
+		global _moduleForRoutineWorkers
+		_moduleForRoutineWorkers = self
+		try:
+			return multiprocessing.Pool(
+				min(conversionOptions.routineJobs, len(self._routinesForImplementation)),
+				initializer=_initializeRoutineWorker
+			)
+		finally:
+			_moduleForRoutineWorkers = None
+
+	def _implementedRoutineTextStreams(self, pool):
+		#Once all phases are through, a routine's implementation only depends on the state prepared up to here
+		#-> with a worker pool the routines are implemented by the forked workers, results are consumed in order.
+		if pool == None:
+			return (
+				profiler.measuredTexts(routine.implementedTexts(), "Implementing routines", routineName=routine.name)
 				for routine in self._routinesForImplementation
-			] \
-			+ [self._footerText.strip()]
-		purgedModuleElements = [
-			text + "\n" for text in implementedModuleElements
-			if text != ""
-		]
-		return '\n'.join([text for text in purgedModuleElements])
+			)
+		return (
+			[self._processWorkerResult("Implementing routines", routine, result)]
+			for routine, result in itertools.izip(
+				self._routinesForImplementation,
+				pool.imap(_routineWorkerJob, [("implementedTexts", index) for index in range(len(self._routinesForImplementation))])
+			)
+		)
 
 class ModuleStub(Module):
 	def __init__(self, name):
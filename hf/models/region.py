@@ -18,7 +18,7 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
-import copy, re
+import copy, re, itertools
 from tools.commons import enum, UsageError, OrderedDict
 from tools.metadata import getArguments, getIterators
 from tools.patterns import regexPatterns
@@ -68,6 +68,8 @@ def regionWithInertCode(routine, codeLines):
 class Region(object):
 	def __init__(self):
 		self._linesAndSymbols = []
+		self._symbolUsageCountsByName = {}
+		self._symbolUsageToken = object()
 
 	def __contains__(self, text):
 		for line, _ in self._linesAndSymbols:
@@ -77,7 +79,12 @@ class Region(object):
 
 	@property
 	def usedSymbolNames(self):
-		return set([symbol.name for symbol in sum([symbols for (_, symbols) in self._linesAndSymbols], [])])
+		return set(self._symbolUsageCountsByName.keys())
+
+	@property
+	def symbolUsageKey(self):
+		#objects whose identities only change together with usedSymbolNames, None if this can't be tracked
+		return (self._symbolUsageToken,)
 
 	@property
 	def linesAndSymbols(self):
@@ -97,17 +104,36 @@ class Region(object):
 
 	def clone(self):
 		region = self.__class__()
-		region._linesAndSymbols = copy.copy(self._linesAndSymbols)
+		region.loadLinesAndSymbols(copy.copy(self._linesAndSymbols))
 		return region
 
+	def _addSymbolUsage(self, symbols):
+		for symbol in symbols:
+			usageNumber = self._symbolUsageCountsByName.get(symbol.name, 0)
+			if usageNumber == 0:
+				self._symbolUsageToken = object()
+			self._symbolUsageCountsByName[symbol.name] = usageNumber + 1
+
+	def loadLinesAndSymbols(self, linesAndSymbols):
+		previousSymbolUsageCountsByName = self._symbolUsageCountsByName
+		previousSymbolUsageToken = self._symbolUsageToken
+		self._linesAndSymbols = linesAndSymbols
+		self._symbolUsageCountsByName = {}
+		for _, symbols in linesAndSymbols:
+			self._addSymbolUsage(symbols)
+		#reloading with updated references usually keeps the names - keep the key in that case
+		if self._symbolUsageCountsByName.viewkeys() == previousSymbolUsageCountsByName.viewkeys():
+			self._symbolUsageToken = previousSymbolUsageToken
+		else:
+			self._symbolUsageToken = object()
+
 	def loadLine(self, line, symbolsOnCurrentLine=None):
 		stripped = line.strip()
 		if stripped == "":
 			return
-		self._linesAndSymbols.append((
-			stripped,
-			symbolsOnCurrentLine if symbolsOnCurrentLine else []
-		))
+		symbols = symbolsOnCurrentLine if symbolsOnCurrentLine else []
+		self._linesAndSymbols.append((stripped, symbols))
+		self._addSymbolUsage(symbols)
 
 	def firstAccessTypeOfScalar(self, symbol):
 		if symbol.domains:
@@ -171,6 +197,18 @@ class CallRegion(Region):
 			| set([a.split("(")[0].strip() for a in self._callee.programmerArguments]) \
 			| set([s.name for s in compactedSymbols + additionalArgumentSymbols])
 
+	@property
+	def symbolUsageKey(self):
+		#callee arguments are always replaced, never changed in place
+		additionalArguments = getattr(self._callee, "_additionalArguments", None)
+		compactedSymbolLists = tuple(
+			s.compactedSymbols for s in additionalArguments
+			if isinstance(s, FrameworkArray)
+		) if additionalArguments else ()
+		return super(CallRegion, self).symbolUsageKey \
+			+ (self._callee, self._callee.programmerArguments, additionalArguments) \
+			+ compactedSymbolLists
+
 	def _adjustedArguments(self, arguments, parentRoutine, parentRegion=None):
 		def adjustArgument(argument, parallelRegionTemplate, iterators):
 			return implement(
@@ -310,10 +348,10 @@ class ParallelRegion(Region):
 
 	@property
 	def linesAndSymbols(self):
-		return sum([
+		return list(itertools.chain.from_iterable(
 			region.linesAndSymbols
 			for region in self._subRegions
-		], [])
+		))
 
 	@property
 	def currRegion(self):
@@ -325,10 +363,20 @@ class ParallelRegion(Region):
 
 	@property
 	def usedSymbolNames(self):
-		return set(sum([
-			list(region.usedSymbolNames)
-			for region in self._subRegions
-		], []))
+		result = set()
+		for region in self._subRegions:
+			result |= region.usedSymbolNames
+		return result
+
+	@property
+	def symbolUsageKey(self):
+		result = ()
+		for region in self._subRegions:
+			regionKey = region.symbolUsageKey
+			if regionKey == None:
+				return None
+			result += regionKey
+		return result
 
 	def switchToRegion(self, region):
 		self._currRegion = region
@@ -399,10 +447,15 @@ class RoutineSpecificationRegion(Region):
 
 	@property
 	def usedSymbolNames(self):
-		result = []
-		for symbol in sum([symbols for _, symbols in self._linesAndSymbols], []):
-			result += [tp.name for tp in symbol.usedTypeParameters if tp.isDimensionParameter]
-		return set(result)
+		result = set()
+		for _, symbols in self._linesAndSymbols:
+			for symbol in symbols:
+				result.update(tp.name for tp in symbol.usedTypeParameters if tp.isDimensionParameter)
+		return result
+
+	@property
+	def symbolUsageKey(self):
+		return None #type parameters of the specified symbols may change with the symbols' context
 
 	def clone(self):
 		clone = super(RoutineSpecificationRegion, self).clone()
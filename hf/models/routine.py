@@ -99,6 +99,9 @@ class AnalyzableRoutine(Routine):
 		self._adjustedCalleeNamesByName = None
 		self.usedSymbolNames = {}
 		self.usedSymbolNamesInKernels = {}
+		self._symbolUsageCountsByName = {}
+		self._kernelSymbolUsageCountsByName = {}
+		self._symbolUsageByRegion = {}
 		self._moduleNamesCompletelyImported = None
 
 	@property
@@ -508,7 +511,7 @@ This is not allowed for implementations using %s.\
 			updatedLinesAndSymbols = []
 			for line, symbols in region._linesAndSymbols:
 				updatedLinesAndSymbols.append((line, updateReferences(symbols)))
-			region._linesAndSymbols = updatedLinesAndSymbols
+			region.loadLinesAndSymbols(updatedLinesAndSymbols)
 
 		#update symbols in symbolsByName with additional ones
 		for symbol in self._additionalArguments \
@@ -641,19 +644,61 @@ This is not allowed for implementations using %s.\
 			isSubroutineEnd=True
 		) + "end subroutine\n"
 
+	def _updateRegionSymbolUsage(self):
+		#regions keep track of their own symbol usage - only regions whose usage key changed since the last analysis are looked at
+		def updateUsage(index, symbolNames, increment):
+			for symbolName in symbolNames:
+				usageNumber = index.get(symbolName, 0) + increment
+				if usageNumber > 0:
+					index[symbolName] = usageNumber
+				else:
+					del index[symbolName]
+
+		def updateRegionUsage(region, symbolNames, increment):
+			updateUsage(self._symbolUsageCountsByName, symbolNames, increment)
+			if isinstance(region, ParallelRegion):
+				updateUsage(self._kernelSymbolUsageCountsByName, symbolNames, increment)
+
+		def isSameKey(symbolUsageKey, previousSymbolUsageKey):
+			if symbolUsageKey == None or previousSymbolUsageKey == None \
+			or len(symbolUsageKey) != len(previousSymbolUsageKey):
+				return False
+			for keyObject, previousKeyObject in zip(symbolUsageKey, previousSymbolUsageKey):
+				if not keyObject is previousKeyObject:
+					return False
+			return True
+
+		symbolUsageByRegion = {}
+		for region in self._regions:
+			symbolUsageKey = region.symbolUsageKey
+			previousSymbolUsage = self._symbolUsageByRegion.get(region)
+			if previousSymbolUsage != None and isSameKey(symbolUsageKey, previousSymbolUsage[0]):
+				symbolUsageByRegion[region] = previousSymbolUsage
+				continue
+			symbolNames = region.usedSymbolNames
+			symbolUsageByRegion[region] = (symbolUsageKey, symbolNames)
+			if previousSymbolUsage == None:
+				updateRegionUsage(region, symbolNames, 1)
+				continue
+			previousSymbolNames = previousSymbolUsage[1]
+			if previousSymbolNames != symbolNames:
+				updateRegionUsage(region, symbolNames - previousSymbolNames, 1)
+				updateRegionUsage(region, previousSymbolNames - symbolNames, -1)
+		for region, (_, previousSymbolNames) in self._symbolUsageByRegion.iteritems():
+			if not region in symbolUsageByRegion:
+				updateRegionUsage(region, previousSymbolNames, -1)
+		self._symbolUsageByRegion = symbolUsageByRegion
+
 	def _analyseSymbolUsage(self):
 		def addUsage(index, symbolName, skipIncrementation=False):
 			usageNumber = index.get(symbolName, 1) if skipIncrementation else index.get(symbolName, 0) + 1
 			index[symbolName] = usageNumber
 
-		self.usedSymbolNames = {}
-		self.usedSymbolNamesInKernels = {}
+		self._updateRegionSymbolUsage()
+		self.usedSymbolNames = dict(self._symbolUsageCountsByName)
+		self.usedSymbolNamesInKernels = dict(self._kernelSymbolUsageCountsByName)
 
-		for region in self._regions:
-			for symbolName in region.usedSymbolNames:
-				addUsage(self.usedSymbolNames, symbolName)
-				if isinstance(region, ParallelRegion):
-					addUsage(self.usedSymbolNamesInKernels, symbolName)
+		#usage depending on the symbol context is cheap to derive from the index and may change once additional context is loaded
 		if self._additionalArguments:
 			for symbol in self._additionalArguments:
 				if not isinstance(symbol, FrameworkArray):
@@ -697,7 +742,11 @@ This is not allowed for implementations using %s.\
 			if not s.declarationPrefix:
 				raise ScopeError("invalid symbol %s added to %s" %(s.name, self.name))
 		for region in self.regions:
-			self._checkReferences(sum([las[1] for las in region.linesAndSymbols], []))
+			self._checkReferences(
+				symbol
+				for _, symbols in region.linesAndSymbols
+				for symbol in symbols
+			)
 
 	def filterOutSymbolsAlreadyAliveInCurrentScope(self, symbolList):
 		return [
@@ -808,25 +857,32 @@ This is not allowed for implementations using %s.\
 			if symbol.isUserSpecified
 		)
 
-	def implemented(self):
-		purgedRoutineElements = []
+	def _implementedElements(self):
+		yield self._implementHeader()
+		yield self._implementAdditionalImports()
+		for region in self._regions:
+			yield region.implemented(parentRoutine=self)
+		yield self._implementFooter()
+
+	def implementedTexts(self):
+		#yields the routine one region at a time, so a routine is never held as a whole
 		try:
 			self._updateSymbolState()
 			self.checkSymbols()
-			implementedRoutineElements = [self._implementHeader(), self._implementAdditionalImports()]
-			implementedRoutineElements += [region.implemented(parentRoutine=self) for region in self._regions]
-			implementedRoutineElements += [self._implementFooter()]
-			purgedRoutineElements = [
-				(index, text) for index, text in enumerate(implementedRoutineElements)
-				if text != ""
-			]
+			isFirstElement = True
+			for text in self._implementedElements():
+				if text == "":
+					continue
+				if not isFirstElement:
+					yield "\n"
+				isFirstElement = False
+				yield text
 		except UsageError as e:
 			raise UsageError("In %s: %s" %(self.name, str(e)))
 		except ScopeError as e:
 			raise ScopeError("In %s: %s;\nTraceback: %s" %(self.name, str(e), traceback.format_exc()))
 		except Exception as e:
 			raise ScopeError("In %s: %s;\nTraceback: %s" %(self.name, str(e), traceback.format_exc()))
-		return "\n".join([
-			text
-			for (index, text) in purgedRoutineElements
-		])
+
+	def implemented(self):
+		return "".join(self.implementedTexts())
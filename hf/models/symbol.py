@@ -22,7 +22,7 @@ import re, sys, copy
 import logging
 import pdb
 from tools.metadata import *
-from tools.commons import enum, BracketAnalyzer, UsageError, \
+from tools.commons import enum, BracketAnalyzer, UsageError, internedString, \
 	splitTextAtLeftMostOccurrence, splitIntoComponentsAndRemainder, getComponentNameAndBracketContent
 from tools.patterns import regexPatterns
 from tools.analysis import SymbolDependencyAnalyzer, SymbolType
@@ -242,17 +242,110 @@ MERGEABLE_DEFAULT_SYMBOL_INSTANCE_ATTRIBUTES = {
 }
 
 MERGEABLE_DEFAULT_SYMBOL_INSTANCE_DOMAIN_ATTRIBUTES = {
-	"domains": [],
-	"_kernelDomainNames": [], #!Important: The order of this list must remain insignificant when it is used
-	"_kernelInactiveDomainSizes": [], #!Important: The order of this list must remain insignificant when it is used
+	"domains": (),
+	"_kernelDomainNames": (), #!Important: The order of this list must remain insignificant when it is used
+	"_kernelInactiveDomainSizes": (), #!Important: The order of this list must remain insignificant when it is used
 	"_knownKernelDomainSizesByName": {},
 	"globalParallelDomainNames": {}
 }
 
+#The domain collections of a symbol (domains, declared dimension sizes, template domains, kernel domain names,
+#kernel inactive domain sizes and known kernel domain sizes by name) are immutable and shared between all symbols,
+#clones and routine versions holding equal ones. Loaders build new lists and store what sharedDomainCollection
+#returns for them, instead of updating a collection in place.
+_sharedDomainCollectionsByValue = {}
+def sharedDomainCollection(collection):
+	'''-> the shared tuple (or dict of tuples, for dicts) equal to the given collection'''
+	if collection == None:
+		return None
+	if isinstance(collection, dict):
+		key = (dict, tuple(sorted(
+			(name, tuple(entries)) for name, entries in collection.iteritems()
+		)))
+	else:
+		key = (tuple, tuple(collection))
+	shared = _sharedDomainCollectionsByValue.get(key)
+	if shared == None:
+		shared = dict(key[1]) if key[0] is dict else key[1]
+		_sharedDomainCollectionsByValue[key] = shared
+	return shared
+
+#Patterns that only depend on the symbol name - these are compiled lazily on first use
+#and shared between all symbols (and clones) carrying the same name.
+SYMBOL_NAME_PATTERN_TEMPLATES = {
+	"importPattern": r'^\s*use\s*(\w*)\s*,\s*only\s*.*?\W\s*%s(?:\W|$).*',
+	"importMapPattern": r'.*?\W%s\s*\=\>\s*(\w*).*',
+	"pointerOrAllocatablePattern": r'\s*(?:double\s+precision|real|integer|character|logical|complex).*?(?:pointer|allocatable).*?[\s,:]+%s',
+	"typeDependencyPattern": r'.*?(?:\W|^)%s(?:\W|$).*',
+	"scalarWriteAccessPattern": r'[^(]*?(?:[^\w(]|^)%s\s*=[^=].*'
+}
+
+_symbolNamePatternsByNameAndKey = {}
+def symbolNamePattern(patterns, patternKey, name):
+	pattern = _symbolNamePatternsByNameAndKey.get((name, patternKey))
+	if pattern == None:
+		pattern = patterns.get(SYMBOL_NAME_PATTERN_TEMPLATES[patternKey] %(re.escape(name)))
+		_symbolNamePatternsByNameAndKey[(name, patternKey)] = pattern
+	return pattern
+
+#Upper bound for the number of access strings memoized per symbol
+ACCESS_REPRESENTATION_CACHE_SIZE = 256
+
 class ScopeError(Exception):
 	pass
 
 class Symbol(object):
+	__slots__ = (
+		"name",
+		"patterns",
+		"analysis",
+		"_globalParallelDomainNames",
+		"initLevel",
+		"routineNode",
+		"declarationSuffix",
+		"_entryNode",
+		"_template",
+		"_isModuleSymbol",
+		"createdBy",
+		"intent",
+		"isConstant",
+		"attributes",
+		"_parallelRegionPosition",
+		"_isUsingDevicePostfix",
+		"isOnDevice",
+		"_isArgumentOverride",
+		"_nameOfScopeOverride",
+		"_nameInScope",
+		"_scopedNameIdentity",
+		"isUserSpecified",
+		"_isPresent",
+		"_isHostSymbol",
+		"_isToBeTransfered",
+		"_residingModule",
+		"usedTypeParameters",
+		"isDeclaredExplicitely",
+		"hasUndecidedDomainSizes",
+		"isMatched",
+		"_isTypeParameter",
+		"isDimensionParameter",
+		"_declarationPrefix",
+		"_sourceModuleIdentifier",
+		"_sourceSymbol",
+		"parallelRegionTemplates",
+		"_declaredDimensionSizes",
+		"_isAutoDom",
+		"isCompacted",
+		"domPPName",
+		"_accPPName",
+		"_declarationTypeOverride",
+		"_templateDomains",
+		"_domains",
+		"_kernelDomainNames",
+		"_kernelInactiveDomainSizes",
+		"_knownKernelDomainSizesByName",
+		"_accessRepresentationCache"
+	)
+
 	def __init__(
 		self,
 		name,
@@ -267,7 +360,7 @@ class Symbol(object):
 		if not name or name == "":
 			raise Exception("Name required for initializing symbol")
 
-		self.name = name
+		self.name = internedString(name)
 		self.loadDefaults()
 		if patterns != None:
 			self.patterns = patterns
@@ -275,11 +368,6 @@ class Symbol(object):
 			self.patterns = regexPatterns
 		self.analysis = analysis
 		self.globalParallelDomainNames = globalParallelDomainNames
-		self.importPattern = self.patterns.get(r'^\s*use\s*(\w*)\s*,\s*only\s*.*?\W\s*' + re.escape(name) + r'(?:\W|$).*')
-		self.importMapPattern = self.patterns.get(r'.*?\W' + re.escape(name) + r'\s*\=\>\s*(\w*).*')
-		self.pointerOrAllocatablePattern = self.patterns.get(r'\s*(?:double\s+precision|real|integer|character|logical|complex).*?(?:pointer|allocatable).*?[\s,:]+' + re.escape(name))
-		self.typeDependencyPattern = self.patterns.get(r'.*?(?:\W|^)' + re.escape(name) + r'(?:\W|$).*')
-		self.scalarWriteAccessPattern = self.patterns.get(r'[^(]*?(?:[^\w(]|^)' + re.escape(name) + r'\s*=[^=].*')
 		self.initLevel = Init.NOTHING_LOADED
 		self.routineNode = None
 		self.declarationSuffix = None
@@ -302,34 +390,66 @@ class Symbol(object):
 			self.createdBy = inspect.getouterframes(inspect.currentframe(), 2)[1][3]
 		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] initialized")
 
+	def __getstate__(self):
+		state = {}
+		for cls in type(self).__mro__:
+			for attribute in getattr(cls, "__slots__", ()):
+				if hasattr(self, attribute):
+					state[attribute] = getattr(self, attribute)
+		#memoized access strings are keyed by routines and DOM nodes - don't drag these along
+		state["_accessRepresentationCache"] = None
+		return state
+	def __setstate__(self, state):
+		for attribute in state:
+			setattr(self, attribute, state[attribute])
 	def __repr__(self):
 		return self.name
 	def __hash__(self):
-		return hash(self.nameInScope())
+		return hash(self.scopedNameIdentity)
 	def __eq__(self, other):
 		if other == None:
 			return False
-		return self.nameInScope() == other.nameInScope()
+		return self.scopedNameIdentity == other.scopedNameIdentity
 	def __ne__(self, other):
 		if other == None:
 			return True
-		return self.nameInScope() != other.nameInScope()
+		return self.scopedNameIdentity != other.scopedNameIdentity
 	def __lt__(self, other):
 		if other == None:
 			return False
-		return self.nameInScope() < other.nameInScope()
+		return self.scopedNameIdentity < other.scopedNameIdentity
 	def __le__(self, other):
 		if other == None:
 			return False
-		return self.nameInScope() <= other.nameInScope()
+		return self.scopedNameIdentity <= other.scopedNameIdentity
 	def __gt__(self, other):
 		if other == None:
 			return True
-		return self.nameInScope() > other.nameInScope()
+		return self.scopedNameIdentity > other.scopedNameIdentity
 	def __ge__(self, other):
 		if other == None:
 			return False
-		return self.nameInScope() >= other.nameInScope()
+		return self.scopedNameIdentity >= other.scopedNameIdentity
+
+	@property
+	def importPattern(self):
+		return symbolNamePattern(self.patterns, "importPattern", self.name)
+
+	@property
+	def importMapPattern(self):
+		return symbolNamePattern(self.patterns, "importMapPattern", self.name)
+
+	@property
+	def pointerOrAllocatablePattern(self):
+		return symbolNamePattern(self.patterns, "pointerOrAllocatablePattern", self.name)
+
+	@property
+	def typeDependencyPattern(self):
+		return symbolNamePattern(self.patterns, "typeDependencyPattern", self.name)
+
+	@property
+	def scalarWriteAccessPattern(self):
+		return symbolNamePattern(self.patterns, "scalarWriteAccessPattern", self.name)
 
 	@property
 	def requiresDeferredShaping(self):
@@ -358,7 +478,7 @@ class Symbol(object):
 
 	@sourceModule.setter
 	def sourceModule(self, _sourceModuleIdentifier):
-		self._sourceModuleIdentifier = _sourceModuleIdentifier
+		self._sourceModuleIdentifier = internedString(_sourceModuleIdentifier)
 
 	@property
 	def residingModule(self):
@@ -376,7 +496,8 @@ class Symbol(object):
 
 	@residingModule.setter
 	def residingModule(self, residingModule):
-		self._residingModule = residingModule
+		self._residingModule = internedString(residingModule)
+		self.invalidateNameInScope()
 
 	@property
 	def declarationPrefix(self):
@@ -385,6 +506,7 @@ class Symbol(object):
 	@declarationPrefix.setter
 	def declarationPrefix(self, _declarationPrefix):
 		self._declarationPrefix = _declarationPrefix
+		self.invalidateAccessRepresentations()
 
 	@property
 	def isArgument(self):
@@ -410,6 +532,7 @@ class Symbol(object):
 	@isUsingDevicePostfix.setter
 	def isUsingDevicePostfix(self, _isUsingDevicePostfix):
 		self._isUsingDevicePostfix = _isUsingDevicePostfix
+		self.invalidateNameInScope()
 
 	@property
 	def nameOfScope(self):
@@ -421,7 +544,8 @@ class Symbol(object):
 
 	@nameOfScope.setter
 	def nameOfScope(self, _nameOfScopeOverride):
-		self._nameOfScopeOverride = _nameOfScopeOverride
+		self._nameOfScopeOverride = internedString(_nameOfScopeOverride)
+		self.invalidateNameInScope()
 
 	@property
 	def isTypeParameter(self):
@@ -452,6 +576,7 @@ class Symbol(object):
 	@isHostSymbol.setter
 	def isHostSymbol(self, _isHostSymbol):
 		self._isHostSymbol = _isHostSymbol
+		self.invalidateAccessRepresentations()
 
 	@property
 	def isPresent(self):
@@ -464,6 +589,7 @@ class Symbol(object):
 	@isPresent.setter
 	def isPresent(self, _isPresent):
 		self._isPresent = _isPresent
+		self.invalidateAccessRepresentations()
 
 	@property
 	def isToBeTransfered(self):
@@ -472,6 +598,78 @@ class Symbol(object):
 	@isToBeTransfered.setter
 	def isToBeTransfered(self, _isToBeTransfered):
 		self._isToBeTransfered = _isToBeTransfered
+		self.invalidateAccessRepresentations()
+
+	@property
+	def globalParallelDomainNames(self):
+		return self._globalParallelDomainNames
+
+	@globalParallelDomainNames.setter
+	def globalParallelDomainNames(self, _globalParallelDomainNames):
+		self._globalParallelDomainNames = _globalParallelDomainNames
+		self.invalidateAccessRepresentations()
+
+	@property
+	def template(self):
+		return self._template
+
+	@template.setter
+	def template(self, _template):
+		self._template = _template
+		self.invalidateAccessRepresentations()
+
+	@property
+	def isModuleSymbol(self):
+		return self._isModuleSymbol
+
+	@isModuleSymbol.setter
+	def isModuleSymbol(self, _isModuleSymbol):
+		self._isModuleSymbol = _isModuleSymbol
+		self.invalidateAccessRepresentations()
+
+	@property
+	def parallelRegionPosition(self):
+		return self._parallelRegionPosition
+
+	@parallelRegionPosition.setter
+	def parallelRegionPosition(self, _parallelRegionPosition):
+		self._parallelRegionPosition = _parallelRegionPosition
+		self.invalidateAccessRepresentations()
+
+	@property
+	def isAutoDom(self):
+		return self._isAutoDom
+
+	@isAutoDom.setter
+	def isAutoDom(self, _isAutoDom):
+		self._isAutoDom = _isAutoDom
+		self.invalidateAccessRepresentations()
+
+	@property
+	def accPPName(self):
+		return self._accPPName
+
+	@accPPName.setter
+	def accPPName(self, _accPPName):
+		self._accPPName = _accPPName
+		self.invalidateAccessRepresentations()
+
+	@property
+	def domains(self):
+		return self._domains
+
+	@domains.setter
+	def domains(self, _domains):
+		self._domains = sharedDomainCollection(_domains)
+		self.invalidateAccessRepresentations()
+
+	@property
+	def declaredDimensionSizes(self):
+		return self._declaredDimensionSizes
+
+	@declaredDimensionSizes.setter
+	def declaredDimensionSizes(self, _declaredDimensionSizes):
+		self._declaredDimensionSizes = sharedDomainCollection(_declaredDimensionSizes)
 
 	@property
 	def isArray(self):
@@ -609,6 +807,7 @@ EXAMPLE:\n\
 			return referencingName
 
 		self._nameInScope = None
+		self.invalidateNameInScope()
 		if residingModule:
 			self.residingModule = residingModule
 		if forceAutomaticName:
@@ -617,6 +816,18 @@ EXAMPLE:\n\
 			self._nameInScope = self.name
 		else:
 			self._nameInScope = automaticName(self)
+		self.invalidateNameInScope()
+
+	def invalidateNameInScope(self):
+		#needs to be called whenever an input to nameInScope() changes - symbols are hashed and compared by this identity
+		self._scopedNameIdentity = None
+		self.invalidateAccessRepresentations()
+
+	@property
+	def scopedNameIdentity(self):
+		if self._scopedNameIdentity == None:
+			self._scopedNameIdentity = self.nameInScope()
+		return self._scopedNameIdentity
 
 	def nameInScope(self, useDeviceVersionIfAvailable=True):
 		if self._nameInScope == None:
@@ -649,6 +860,8 @@ EXAMPLE:\n\
 		self._isArgumentOverride = False
 		self._nameOfScopeOverride = None
 		self._nameInScope = None
+		self._scopedNameIdentity = None
+		self._accessRepresentationCache = None
 		self.isUserSpecified = False
 		self.isPresent = False
 		self.isHostSymbol = False
@@ -681,6 +894,7 @@ EXAMPLE:\n\
 		clone._isArgumentOverride = self._isArgumentOverride
 		clone._nameOfScopeOverride = self._nameOfScopeOverride
 		clone._nameInScope = self._nameInScope
+		clone.invalidateNameInScope()
 		clone.isUserSpecified = self.isUserSpecified
 		clone.isPresent = self.isPresent
 		clone.isHostSymbol = self.isHostSymbol
@@ -754,7 +968,7 @@ EXAMPLE:\n\
 				if len(other.keys()) > 0:
 					return other
 				return mine
-			if not isinstance(mine, list):
+			if not isinstance(mine, tuple):
 				raise Exception("unrecognized collection type for attribute %s" %(attributeName))
 			if len(mine) > 0 and len(other) > 0:
 				return mine
@@ -792,6 +1006,8 @@ EXAMPLE:\n\
 				self.domains = getMergedDomains()
 			else:
 				setattr(self, domainAttributeName, getMergedCollection(domainAttributeName))
+		#the kernel domain lists and other private attributes above are set without going through a setter
+		self.invalidateAccessRepresentations()
 
 		#reload domains for autoDom symbols when the other Symbol had explicitely set ones
 		#- generic merge doesn't work correctly in that case
@@ -879,10 +1095,11 @@ EXAMPLE:\n\
 
 		#   This symbol has an explicit domain dependant entry - make sure to store this as the name used in the scope
 		self._nameInScope = self.name
+		self.invalidateNameInScope()
 
 		self.intent = domainDependantEntryNode.getAttribute("intent") if self.intent in [None, ''] else self.intent
 		self.declarationPrefix = domainDependantEntryNode.getAttribute("declarationPrefix") if self.declarationPrefix in [None, ''] else self.declarationPrefix
-		self._sourceModuleIdentifier = domainDependantEntryNode.getAttribute("_sourceModuleIdentifier") if self._sourceModuleIdentifier in [None, ''] else self._sourceModuleIdentifier
+		self._sourceModuleIdentifier = internedString(domainDependantEntryNode.getAttribute("_sourceModuleIdentifier")) if self._sourceModuleIdentifier in [None, ''] else self._sourceModuleIdentifier
 		self.sourceSymbol = domainDependantEntryNode.getAttribute("sourceSymbol") if self.sourceSymbol in [None, ''] else self.sourceSymbol
 		if self.isModuleSymbol:
 			self._sourceModuleIdentifier = "HF90_LOCAL_MODULE" if self._sourceModuleIdentifier in [None, ''] else self._sourceModuleIdentifier
@@ -895,11 +1112,14 @@ EXAMPLE:\n\
 			and self.declaredDimensionSizes == None \
 			else self.declaredDimensionSizes
 		if self.declaredDimensionSizes and len(self.declaredDimensionSizes) > 0 and self.initLevel < Init.ROUTINENODE_ATTRIBUTES_LOADED:
-			self.domains = []
+			domains = []
+			kernelInactiveDomainSizes = list(self._kernelInactiveDomainSizes)
 			for dimSize in self.declaredDimensionSizes:
 				if dimSize.strip() != "":
-					self.domains.append(('HF_GENERIC_DIM', dimSize))
-					self._kernelInactiveDomainSizes.append(dimSize)
+					domains.append(('HF_GENERIC_DIM', dimSize))
+					kernelInactiveDomainSizes.append(dimSize)
+			self.domains = domains
+			self._kernelInactiveDomainSizes = sharedDomainCollection(kernelInactiveDomainSizes)
 			logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] dimsizes from domain dependant node: %s " %(str(self.declaredDimensionSizes)))
 		self.initLevel = max(self.initLevel, Init.DEPENDANT_ENTRYNODE_ATTRIBUTES_LOADED)
 		self.checkIntegrityOfDomains()
@@ -1005,10 +1225,10 @@ EXAMPLE:\n\
 				in templateDomains
 			)
 
-		self._kernelDomainNames = []
-		self._kernelInactiveDomainSizes = []
-		self._knownKernelDomainSizesByName = {}
-		self._templateDomains = templateDomains
+		kernelDomainNames = []
+		kernelInactiveDomainSizes = []
+		knownKernelDomainSizesByName = {}
+		self._templateDomains = sharedDomainCollection(templateDomains)
 
 		#   get tentative domains
 		tentativeDomains = None
@@ -1037,10 +1257,10 @@ EXAMPLE:\n\
 			#Add the template information to the parallel region index; this is important in case the domainDependant template information differs from the parallel region
 			for regionDomName, regionDomSize in regionDomNameAndSize:
 				#The same domain name can sometimes have different domain sizes used in different parallel regions, so we build up a list of these sizes.
-				if not regionDomName in self._knownKernelDomainSizesByName:
-					self._knownKernelDomainSizesByName[regionDomName] = [regionDomSize]
-				elif regionDomSize not in self._knownKernelDomainSizesByName[regionDomName]:
-					self._knownKernelDomainSizesByName[regionDomName].append(regionDomSize)
+				if not regionDomName in knownKernelDomainSizesByName:
+					knownKernelDomainSizesByName[regionDomName] = [regionDomSize]
+				elif regionDomSize not in knownKernelDomainSizesByName[regionDomName]:
+					knownKernelDomainSizesByName[regionDomName].append(regionDomSize)
 			for regionDomName, regionDomSize in regionDomNameAndSize:
 				addDomainToIndex(parallelRegionDomNamesBySize, regionDomName, regionDomSize)
 				addDomainToIndex(allRegionDomNamesBySize, regionDomName, regionDomSize)
@@ -1050,16 +1270,16 @@ EXAMPLE:\n\
 		for s in parallelRegionDomNamesBySize:
 			domNameIteratorsBySize[s] = 0
 		for domName, domSize in orderedDomains:
-			if domName in self._knownKernelDomainSizesByName:
-				self._kernelDomainNames.append(domName)
+			if domName in knownKernelDomainSizesByName:
+				kernelDomainNames.append(domName)
 			elif "HF_" in domName and domSize in parallelRegionDomNamesBySize:
 				if domNameIteratorsBySize[domSize] >= len(parallelRegionDomNamesBySize[domSize]):
 					continue
-				self._kernelDomainNames.append(parallelRegionDomNamesBySize[domSize][domNameIteratorsBySize[domSize]])
+				kernelDomainNames.append(parallelRegionDomNamesBySize[domSize][domNameIteratorsBySize[domSize]])
 				domNameIteratorsBySize[domSize] += 1
 
 		#   match the domain sizes to those in the index. this is important so we don't cancel them out later in the region position adjustment code
-		self.domains = []
+		domains = []
 		tentativeDomNamesBySize = {}
 		for domName, domSize in tentativeDomains:
 			addDomainToIndex(tentativeDomNamesBySize, domName, domSize)
@@ -1069,7 +1289,7 @@ EXAMPLE:\n\
 			if domSize not in tentativeDomNamesBySize
 		]
 		for domain in domainsNotInTentativeList:
-			self.domains.append(domain)
+			domains.append(domain)
 		domNameIteratorsBySize = {}
 		for _, s in tentativeDomains:
 			domNameIteratorsBySize[s] = 0
@@ -1080,24 +1300,28 @@ EXAMPLE:\n\
 			domNameAliases = allRegionDomNamesBySize.get(dependantDomSize, [dependantDomName])
 			if domNameIteratorsBySize[dependantDomSize] < len(domNameAliases):
 				finalDomName = domNameAliases[domNameIteratorsBySize[dependantDomSize]]
-			self.domains.append((
+			domains.append((
 				finalDomName,
 				dependantDomSize
 			))
 			domNameIteratorsBySize[dependantDomSize] += 1
 
 		#   put the non parallel domains in the '_kernelInactiveDomainSizes' set.
-		for (dependantDomName, dependantDomSize) in self.domains:
+		for (dependantDomName, dependantDomSize) in domains:
 			#build up parallel inactive dimensions again
-			if not dependantDomName in self._kernelDomainNames \
+			if not dependantDomName in kernelDomainNames \
 			and not dependantDomSize in parallelRegionDomNamesBySize: #$$$ can this second clause be removed?
-				self._kernelInactiveDomainSizes.append(dependantDomSize)
+				kernelInactiveDomainSizes.append(dependantDomSize)
 			#use the declared domain size (potentially overriding automatic sizes)
 			domNameAliases = allRegionDomNamesBySize.get(dependantDomSize, [])
 			for domNameAlias in domNameAliases:
-				if domNameAlias in self._knownKernelDomainSizesByName \
-				and dependantDomSize not in self._knownKernelDomainSizesByName[domNameAlias]:
-					self._knownKernelDomainSizesByName[domNameAlias].append(dependantDomSize)
+				if domNameAlias in knownKernelDomainSizesByName \
+				and dependantDomSize not in knownKernelDomainSizesByName[domNameAlias]:
+					knownKernelDomainSizesByName[domNameAlias].append(dependantDomSize)
+		self.domains = domains
+		self._kernelDomainNames = sharedDomainCollection(kernelDomainNames)
+		self._kernelInactiveDomainSizes = sharedDomainCollection(kernelInactiveDomainSizes)
+		self._knownKernelDomainSizesByName = sharedDomainCollection(knownKernelDomainSizesByName)
 		return #just so we have a place to break. should maybe put a coffee machine here.
 
 	def loadModuleNodeAttributes(self, moduleNode):
@@ -1183,7 +1407,7 @@ EXAMPLE:\n\
 		if self.parallelRegionPosition in [None, "", "outside"]:
 			#inside a parallel region or no parallel region
 			#reset the kernel inactive domain sizes to contain all domains
-			self._kernelInactiveDomainSizes = [s for (_, s) in self.domains]
+			self._kernelInactiveDomainSizes = sharedDomainCollection([s for (_, s) in self.domains])
 
 		if self.allowsDeletingDomainExtensionFor(routine):
 			#--> make _kernelDomainNames consistent by removing domains not in declaration
@@ -1194,17 +1418,17 @@ EXAMPLE:\n\
 					if ds in self.declaredDimensionSizes:
 						updatedKernelDomainNames.append(dn)
 						break
-			self._kernelDomainNames = updatedKernelDomainNames
+			self._kernelDomainNames = sharedDomainCollection(updatedKernelDomainNames)
 
 			#--> get rid of domains that are not in declaration
 			self.domains = [
 				(domName, domSize) for (domName, domSize) in self.domains
 				if domSize in self.declaredDimensionSizes
 			]
-			self._templateDomains = [
+			self._templateDomains = sharedDomainCollection([
 				(domName, domSize) for (domName, domSize) in self._templateDomains
 				if domSize in self.declaredDimensionSizes
-			]
+			])
 			return
 
 		# reset domains to kernel / kernelInactive datastructures so everything is consistent
@@ -1228,6 +1452,7 @@ EXAMPLE:\n\
 
 		#   The name used in the declaration pattern is just self.name - so store this as the scoped name for now
 		self._nameInScope = self.name
+		self.invalidateNameInScope()
 
 		#   Same with the scope itself - since the declaration line is within a certain scope, this becomes a known known (thanks Mr. Rumsfield...)
 		self.nameOfScope = currParentName
@@ -1270,11 +1495,15 @@ EXAMPLE:\n\
 		knownDimensionSizes = [d for (_, d) in self.domains]
 		if self.isAutoDom and self.hasUndecidedDomainSizes:
 			if len(self.domains) == 0:
+				domains = []
+				kernelInactiveDomainSizes = list(self._kernelInactiveDomainSizes)
 				for dimensionSize in dimensionSizes:
 					if dimensionSize in knownDimensionSizes:
 						continue
-					self.domains.append(("HF_GENERIC_UNKNOWN_DIM", dimensionSize))
-					self._kernelInactiveDomainSizes.append(dimensionSize)
+					domains.append(("HF_GENERIC_UNKNOWN_DIM", dimensionSize))
+					kernelInactiveDomainSizes.append(dimensionSize)
+				self.domains = domains
+				self._kernelInactiveDomainSizes = sharedDomainCollection(kernelInactiveDomainSizes)
 			elif len(dimensionSizes) != len(self.domains):
 				raise Exception("Symbol %s's declared shape does not match its domainDependant directive. \
 Automatic reshaping is not supported since this is a pointer type. Domains in Directive: %s || dimensions in declaration: %s \
@@ -1291,11 +1520,15 @@ Automatic reshaping is not supported since this is a pointer type. Domains in Di
 			logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] Loading dimensions for autoDom, non-pointer symbol %s. Declared dimensions: %s, Known dimension sizes used for parallel regions: %s, Parallel Active Dims: %s, Parallel Inactive Dims: %s" %(
 				str(self), str(dimensionSizes), str(self._knownKernelDomainSizesByName), str(self._kernelDomainNames), str(self._kernelInactiveDomainSizes)
 			))
+			domains = list(self.domains)
+			kernelInactiveDomainSizes = list(self._kernelInactiveDomainSizes)
 			for dimensionSize in dimensionSizes:
 				if dimensionSize in knownDimensionSizes:
 					continue
-				self.domains.append(("HF_GENERIC_PARALLEL_INACTIVE_DIM", dimensionSize))
-				self._kernelInactiveDomainSizes.append(dimensionSize)
+				domains.append(("HF_GENERIC_PARALLEL_INACTIVE_DIM", dimensionSize))
+				kernelInactiveDomainSizes.append(dimensionSize)
+			self.domains = domains
+			self._kernelInactiveDomainSizes = sharedDomainCollection(kernelInactiveDomainSizes)
 
 		if not self.hasUndecidedDomainSizes:
 			self.adjustDomainsToKernelPosition()
@@ -1337,10 +1570,11 @@ Parallel region position: %s, Current template: %s"
 				)
 			)
 		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] +++++++++ LOADING IMPORT INFORMATION ++++++++++ ")
-		self._sourceModuleIdentifier = moduleNode.getAttribute('name')
+		self._sourceModuleIdentifier = internedString(moduleNode.getAttribute('name'))
 
 		#   The name used in the import pattern is just self.name - so store this as the scoped name for now
 		self._nameInScope = self.name
+		self.invalidateNameInScope()
 		if sourceSymbolName != None:
 			self.sourceSymbol = sourceSymbolName
 		if self.sourceSymbol in [None, ""]:
@@ -1536,6 +1770,11 @@ Please specify the domains and their sizes with domName and domSize attributes i
 			and ( self.numOfParallelDomains > 0 or accPPIsExplicit ) \
 			and self.activeDomainsMatchSpecification
 
+	def invalidateAccessRepresentations(self):
+		#called by the setters of everything accessRepresentation depends on besides its arguments. The private domain
+		#lists are only changed together with the domains.
+		self._accessRepresentationCache = None
+
 	def accessRepresentation(
 		self,
 		parallelIterators,
@@ -1546,6 +1785,46 @@ Please specify the domains and their sizes with domName and domSize attributes i
 		isInsideParallelRegion=False,
 		callee=None,
 		useDeviceVersionIfAvailable=True
+	):
+		cache = self._accessRepresentationCache
+		if cache == None or len(cache) >= ACCESS_REPRESENTATION_CACHE_SIZE:
+			cache = {}
+			self._accessRepresentationCache = cache
+		cacheKey = (
+			tuple(parallelIterators) if parallelIterators else (),
+			tuple(accessors) if accessors else (),
+			parallelRegionNode,
+			useDomainReordering,
+			isPointerAssignment,
+			isInsideParallelRegion,
+			callee,
+			useDeviceVersionIfAvailable
+		)
+		result = cache.get(cacheKey)
+		if result == None:
+			result = self._uncachedAccessRepresentation(
+				parallelIterators,
+				accessors,
+				parallelRegionNode,
+				useDomainReordering,
+				isPointerAssignment,
+				isInsideParallelRegion,
+				callee,
+				useDeviceVersionIfAvailable
+			)
+			cache[cacheKey] = result
+		return result
+
+	def _uncachedAccessRepresentation(
+		self,
+		parallelIterators,
+		accessors,
+		parallelRegionNode,
+		useDomainReordering,
+		isPointerAssignment,
+		isInsideParallelRegion,
+		callee,
+		useDeviceVersionIfAvailable
 	):
 		def matchIteratorListForDomain(iteratorList, domainName):
 			adjustedIterator = None
@@ -1784,10 +2063,12 @@ Currently loaded template: %s\n" %(
 	def getTemplateEntryNodeValues(self, parentName):
 		if not self.template:
 			return None
-		parentNodes = self.template.getElementsByTagName(parentName)
-		if not parentNodes or len(parentNodes) == 0:
-			return None
-		return [entry.firstChild.nodeValue for entry in parentNodes[0].childNodes]
+		def parseEntryNodeValues(template):
+			parentNodes = template.getElementsByTagName(parentName)
+			if not parentNodes or len(parentNodes) == 0:
+				return None
+			return templateRegistry.internedStrings(entry.firstChild.nodeValue for entry in parentNodes[0].childNodes)
+		return templateRegistry.parsed(self.template, ("entryNodeValues", parentName), parseEntryNodeValues)
 
 	def getSpecificationTuple(self, line):
 		specTuple = parseSpecification(line)
@@ -1842,13 +2123,18 @@ Currently loaded template: %s\n" %(
 			return "", False
 
 class ImplicitForeignModuleSymbol(Symbol):
+	__slots__ = ()
+
 	def __init__(self, _sourceModuleIdentifier, nameInScope, sourceSymbol, template=None):
 		Symbol.__init__(self, nameInScope, template)
 		self._nameInScope = nameInScope
-		self._sourceModuleIdentifier = _sourceModuleIdentifier
+		self.invalidateNameInScope()
+		self.sourceModule = _sourceModuleIdentifier
 		self.sourceSymbol = sourceSymbol
 
 class FrameworkArray(Symbol):
+	__slots__ = ("calleeName", "compactedSymbols")
+
 	def __init__(self, calleeName, declarationPrefix, domains, isOnDevice):
 		if not calleeName or calleeName == "":
 			raise Exception("Name required for initializing framework array")
@@ -1866,6 +2152,7 @@ class FrameworkArray(Symbol):
 		self.declarationPrefix = declarationPrefix
 		self._declarationTypeOverride = DeclarationType.FRAMEWORK_ARRAY
 		self._nameInScope = identifier
+		self.invalidateNameInScope()
 		self.compactedSymbols = None
 		self.attributes = []
 
@@ -0,0 +1,398 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+#**********************************************************************#
+#  Procedure        speedupFeasibility.py                              #
+#  Comment          Performance model for the parallel regions of an   #
+#                   analysed callgraph (CG_CPU.xml / CG_GPU.xml):      #
+#                   estimates the bytes moved per point update and     #
+#                   the predicted device speedup including the host to #
+#                   device transfer (speedup feasibility formula in    #
+#                   results/), ranked by the time porting would save.  #
+#**********************************************************************#
+
+from tools.metadata import parseString, regionTemplatesByID, getDomainDependantTemplatesAndEntries, getDomNameAndSize, \
+	getAttributes, getDeclarationPrefix, getDomainsWithParallelRegionTemplate, getArguments
+from tools.commons import openFile, setupDeferredLogging, UsageError
+from optparse import OptionParser
+import logging
+import re
+import sys
+import traceback
+
+DEFAULT_BYTES_PER_ELEMENT = 8
+MAXIMUM_SUBSTITUTION_DEPTH = 20
+GIGA = 1e9
+
+definitionPatterns = [
+	re.compile(r'^\s*#\s*define\s+(\w+)\s+(.+?)\s*(?://.*)?$'),
+	re.compile(r'^\s*(?:export\s+)?(\w+)\s*:?=\s*"?([^"#]*?)"?\s*(?:#.*)?$')
+]
+blockCommentPattern = re.compile(r'/\*.*?\*/', re.DOTALL)
+preprocessorFlagPattern = re.compile(r'-D(\w+)=([^\s"\']+)')
+identifierPattern = re.compile(r'[A-Za-z_]\w*')
+arithmeticPattern = re.compile(r'^[0-9+\-*/(). ]*$')
+typePattern = re.compile(r'^\s*(real|integer|logical|complex|double\s+precision|character)\s*(?:\*\s*(\w+)|\(\s*(?:kind\s*=\s*)?([^),]+?)\s*[,)])?', re.IGNORECASE)
+
+def readDefinitions(path):
+	'''-> dict name -> value text from '#define NAME VALUE' (headers), 'NAME=VALUE' (Makesettings) and '-DNAME=VALUE' flags.
+	Commented out definitions are skipped, later definitions override earlier ones (as with cpp and make).'''
+	definitions = {}
+	settingsFile = openFile(path, 'r')
+	try:
+		text = settingsFile.read()
+	finally:
+		settingsFile.close()
+	#keep the line breaks of block comments so the remaining lines stay separate
+	lines = blockCommentPattern.sub(lambda match: "\n" * match.group(0).count("\n"), text).splitlines()
+	for line in lines:
+		for name, value in preprocessorFlagPattern.findall(line):
+			definitions[name] = value
+		for pattern in definitionPatterns:
+			match = pattern.match(line)
+			if match and match.group(2).strip() != "":
+				definitions[match.group(1)] = match.group(2).strip()
+				break
+	return definitions
+
+def evaluateSize(expression, definitions):
+	'''evaluates a domain size / bound expression such as "DIM_X-HALO_X" with the given definitions -> int'''
+	resolved = expression
+	for _ in range(MAXIMUM_SUBSTITUTION_DEPTH):
+		names = identifierPattern.findall(resolved)
+		if len(names) == 0:
+			break
+		unresolved = [name for name in names if definitions.get(name, definitions.get(name.lower(), definitions.get(name.upper()))) == None]
+		if len(unresolved) > 0:
+			raise UsageError("cannot evaluate '%s': %s undefined - please pass it with --size NAME=VALUE or a settings file" %(
+				expression, ", ".join(sorted(set(unresolved)))
+			))
+		resolved = identifierPattern.sub(
+			lambda match: "(%s)" %(definitions.get(match.group(0), definitions.get(match.group(0).lower(), definitions.get(match.group(0).upper())))),
+			resolved
+		)
+	if not arithmeticPattern.match(resolved):
+		raise UsageError("cannot evaluate '%s' (resolved to '%s')" %(expression, resolved))
+	return int(eval(resolved, {"__builtins__": {}}, {}))
+
+def bytesPerElement(declarationPrefix, definitions, defaultBytes):
+	if not declarationPrefix:
+		return defaultBytes
+	match = typePattern.match(declarationPrefix)
+	if not match:
+		return defaultBytes
+	typeName = re.sub(r'\s+', ' ', match.group(1).lower())
+	kind = match.group(2) or match.group(3)
+	if typeName == "double precision":
+		return 8
+	if typeName == "character":
+		return 1
+	if kind == None:
+		return 8 if typeName == "complex" else 4
+	kindBytes = evaluateSize(kind, definitions)
+	return kindBytes * 2 if typeName == "complex" else kindBytes
+
+class Kernel(object):
+	def __init__(self, routineName, startLine, endLine, points):
+		self.routineName = routineName
+		self.startLine = startLine
+		self.endLine = endLine
+		self.points = points
+		self.bytesPerPoint = 0
+		self.transferBytesPerPoint = 0
+		self.arrays = []
+
+	@property
+	def name(self):
+		if self.startLine:
+			return "%s:%s-%s" %(self.routineName, self.startLine, self.endLine)
+		return self.routineName
+
+def regionPoints(parallelRegionTemplate, definitions):
+	points = 1
+	for domain in getDomainsWithParallelRegionTemplate(parallelRegionTemplate):
+		if domain.startsAt != None and domain.endsAt != None:
+			extent = evaluateSize(domain.endsAt, definitions) - evaluateSize(domain.startsAt, definitions) + 1
+		else:
+			extent = evaluateSize(domain.size, definitions)
+		points *= max(extent, 0)
+	return points
+
+def analyseKernels(doc, definitions, defaultBytes):
+	'''-> a Kernel for every parallel region that is active within a routine of the analysed callgraph.
+	Every domain dependant array of the kernel routine is counted as one access per point update and
+	element, where dimensions that aren't parallel domains of the region multiply the elements per point.
+	Arguments of the kernel routine need to be transferred to the device, local arrays don't.
+	-> (kernels, list of (kernel name, reason) for kernels whose sizes can't be evaluated)'''
+	parallelRegionTemplatesByID = regionTemplatesByID(doc, "parallelRegionTemplate")
+	kernels = []
+	skippedKernels = []
+	for routine in doc.getElementsByTagName("routine"):
+		if routine.getAttribute("parallelRegionPosition") != "within":
+			continue
+		routineName = routine.getAttribute("name")
+		argumentNames = [name.lower() for name in getArguments(routine)]
+		regionsNodes = routine.getElementsByTagName("activeParallelRegions")
+		if len(regionsNodes) == 0:
+			continue
+		for templateRelation in regionsNodes[0].getElementsByTagName("templateRelation"):
+			parallelRegionTemplate = parallelRegionTemplatesByID.get(templateRelation.getAttribute("id"))
+			if parallelRegionTemplate == None:
+				raise Exception("Parallel region template id %s cannot be matched" %(templateRelation.getAttribute("id")))
+			kernel = Kernel(
+				routineName,
+				templateRelation.getAttribute("startLine"),
+				templateRelation.getAttribute("endLine"),
+				0
+			)
+			try:
+				kernel.points = regionPoints(parallelRegionTemplate, definitions)
+				parallelDomainNames = [domain.name for domain in getDomainsWithParallelRegionTemplate(parallelRegionTemplate)]
+				for template, entry in getDomainDependantTemplatesAndEntries(doc, routine):
+					domains = getDomNameAndSize(template)
+					if len(domains) == 0 and not "autoDom" in getAttributes(template):
+						continue #scalars and other data that does not scale with the domain
+					elementsPerPoint = 1
+					for domainName, domainSize in domains:
+						if domainName not in parallelDomainNames:
+							elementsPerPoint *= evaluateSize(domainSize, definitions)
+					symbolName = entry.firstChild.nodeValue.strip()
+					arrayBytesPerPoint = elementsPerPoint * bytesPerElement(getDeclarationPrefix(template), definitions, defaultBytes)
+					isTransferred = symbolName.lower() in argumentNames
+					kernel.bytesPerPoint += arrayBytesPerPoint
+					if isTransferred:
+						kernel.transferBytesPerPoint += arrayBytesPerPoint
+					kernel.arrays.append((symbolName, arrayBytesPerPoint, isTransferred))
+			except UsageError as e:
+				#e.g. sizes that are only known at runtime
+				skippedKernels.append((kernel.name, str(e)))
+				continue
+			kernels.append(kernel)
+	return kernels, skippedKernels
+
+class MachineModel(object):
+	'''bandwidths in bytes/s, performances in FLOP/s - see speedup_feasibility_formula_symbols.png in results/'''
+	def __init__(self, hostBandwidth, deviceBandwidth, transferBandwidth, hostPerformance=None, devicePerformance=None):
+		self.hostBandwidth = hostBandwidth
+		self.deviceBandwidth = deviceBandwidth
+		self.transferBandwidth = transferBandwidth
+		self.hostPerformance = hostPerformance
+		self.devicePerformance = devicePerformance
+
+	def hasComputeModel(self):
+		return self.hostPerformance != None and self.devicePerformance != None
+
+class Prediction(object):
+	def __init__(self, kernel, machine, iterations, flopsPerPoint=None):
+		self.kernel = kernel
+		self.iterations = iterations
+		self.flopsPerPoint = flopsPerPoint
+		updates = float(iterations) * kernel.points
+		#roofline on either side: the slower one of memory and floating point bound time
+		self.hostTime = updates * kernel.bytesPerPoint / machine.hostBandwidth
+		self.deviceTime = updates * kernel.bytesPerPoint / machine.deviceBandwidth
+		self.isComputeBound = False
+		if flopsPerPoint != None and machine.hasComputeModel():
+			hostComputeTime = updates * flopsPerPoint / machine.hostPerformance
+			deviceComputeTime = updates * flopsPerPoint / machine.devicePerformance
+			self.isComputeBound = hostComputeTime > self.hostTime
+			self.hostTime = max(self.hostTime, hostComputeTime)
+			self.deviceTime = max(self.deviceTime, deviceComputeTime)
+		#the data region is transferred once for all iterations
+		self.transferTime = float(kernel.points) * kernel.transferBytesPerPoint / machine.transferBandwidth
+		self.deviceTime += self.transferTime
+		self.speedup = self.hostTime / self.deviceTime if self.deviceTime > 0 else None
+		self.savedTime = self.hostTime - self.deviceTime
+		self.breakEvenIterations = self.minimumIterations(machine)
+
+	def minimumIterations(self, machine):
+		'''n_it from which on the device version is faster - left hand side of the speedup feasibility formulas'''
+		kernel = self.kernel
+		if kernel.transferBytesPerPoint == 0:
+			return 0
+		if self.isComputeBound:
+			if machine.devicePerformance <= machine.hostPerformance or self.flopsPerPoint <= 0:
+				return None
+			return float(kernel.transferBytesPerPoint) * machine.hostPerformance * machine.devicePerformance \
+				/ (self.flopsPerPoint * machine.transferBandwidth * (machine.devicePerformance - machine.hostPerformance))
+		if machine.deviceBandwidth <= machine.hostBandwidth or kernel.bytesPerPoint == 0:
+			return None
+		return float(kernel.transferBytesPerPoint) / kernel.bytesPerPoint * (machine.hostBandwidth / machine.transferBandwidth) \
+			/ (1.0 - machine.hostBandwidth / machine.deviceBandwidth)
+
+def rankedPredictions(kernels, machine, iterations, flopsPerPointByKernel, defaultFlopsPerPoint=None):
+	predictions = [
+		Prediction(
+			kernel,
+			machine,
+			iterations,
+			flopsPerPointByKernel.get(kernel.name, flopsPerPointByKernel.get(kernel.routineName, defaultFlopsPerPoint))
+		)
+		for kernel in kernels
+	]
+	return sorted(predictions, key=lambda prediction: prediction.savedTime, reverse=True)
+
+def formattedNumber(value, formatString="%.2f"):
+	if value == None:
+		return "never"
+	return formatString %(value)
+
+def report(predictions, skippedKernels, machine, iterations):
+	lines = [
+		"Speedup feasibility for %i iterations over the data region, BW_H=%.1f GB/s, BW_D=%.1f GB/s, BW_HtoD=%.1f GB/s%s" %(
+			iterations,
+			machine.hostBandwidth / GIGA,
+			machine.deviceBandwidth / GIGA,
+			machine.transferBandwidth / GIGA,
+			", P_H=%.1f GFLOP/s, P_D=%.1f GFLOP/s" %(machine.hostPerformance / GIGA, machine.devicePerformance / GIGA) \
+				if machine.hasComputeModel() else ""
+		),
+		"%4s %-40s %12s %8s %8s %8s %12s %12s %10s %10s" %(
+			"rank", "kernel", "points", "m [B]", "mHtoD[B]", "bound", "host [s]", "device [s]", "speedup", "min n_it"
+		)
+	]
+	for rank, prediction in enumerate(predictions):
+		kernel = prediction.kernel
+		lines.append("%4i %-40s %12i %8i %8i %8s %12.4e %12.4e %10s %10s" %(
+			rank + 1,
+			kernel.name,
+			kernel.points,
+			kernel.bytesPerPoint,
+			kernel.transferBytesPerPoint,
+			"compute" if prediction.isComputeBound else "memory",
+			prediction.hostTime,
+			prediction.deviceTime,
+			formattedNumber(prediction.speedup, "%.2fx"),
+			formattedNumber(prediction.breakEvenIterations)
+		))
+	lines.append("")
+	for prediction in predictions:
+		kernel = prediction.kernel
+		lines.append("%s: %s" %(kernel.name, ", ".join(
+			"%s (%iB/point%s)" %(name, arrayBytes, "" if isTransferred else ", device local")
+			for name, arrayBytes, isTransferred in kernel.arrays
+		) or "no domain dependant arrays"))
+	for kernelName, reason in skippedKernels:
+		lines.append("%s: skipped, %s" %(kernelName, reason))
+	payingOff = [prediction.kernel.name for prediction in predictions if prediction.speedup != None and prediction.speedup > 1.0]
+	lines.append("")
+	lines.append("porting pays off for %i of %i kernels%s" %(
+		len(payingOff),
+		len(predictions),
+		": " + ", ".join(payingOff) if len(payingOff) > 0 else ""
+	))
+	return "\n".join(lines) + "\n"
+
+def parseAssignments(text, valueType=str):
+	'''"NAME=VALUE,NAME2=VALUE2" -> dict'''
+	result = {}
+	if not text:
+		return result
+	for assignment in text.split(","):
+		if assignment.strip() == "":
+			continue
+		if not "=" in assignment:
+			raise UsageError("NAME=VALUE expected, got '%s'" %(assignment))
+		name, value = assignment.split("=", 1)
+		result[name.strip()] = valueType(value.strip())
+	return result
+
+##################### MAIN ##############################
+if __name__ == "__main__":
+	parser = OptionParser()
+	parser.add_option("-i", "--sourceXML", dest="source",
+	                  help="read the analysed callgraph from this XML file (CG_GPU.xml or CG_CPU.xml)", metavar="XML")
+	parser.add_option("--settings", dest="settings", action="append", default=[],
+	                  help="read domain sizes from this file, e.g. config/MakesettingsGeneral (NAME=VALUE, -DNAME=VALUE) or a header (#define NAME VALUE). Can be repeated.", metavar="FILE")
+	parser.add_option("-s", "--size", dest="sizes", action="append", default=[],
+	                  help="domain size definitions NAME=VALUE[,NAME=VALUE...], overriding the settings files")
+	parser.add_option("--hostBandwidth", dest="hostBandwidth", type="float",
+	                  help="memory bandwidth of the host in GB/s (BW_H)")
+	parser.add_option("--deviceBandwidth", dest="deviceBandwidth", type="float",
+	                  help="memory bandwidth of the device in GB/s (BW_D)")
+	parser.add_option("--transferBandwidth", dest="transferBandwidth", type="float",
+	                  help="host to device bandwidth in GB/s (BW_HtoD)")
+	parser.add_option("--hostPerformance", dest="hostPerformance", type="float",
+	                  help="floating point performance of the host in GFLOP/s (P_H), enables the compute bound model")
+	parser.add_option("--devicePerformance", dest="devicePerformance", type="float",
+	                  help="floating point performance of the device in GFLOP/s (P_D), enables the compute bound model")
+	parser.add_option("-f", "--flopsPerPoint", dest="flopsPerPoint",
+	                  help="floating point operations per point update (c): a default value and/or KERNEL=VALUE entries, comma separated. KERNEL is a routine name or routine:startLine-endLine")
+	parser.add_option("-n", "--iterations", dest="iterations", type="int", default=1,
+	                  help="number of iterations over the data region (n_it), default: 1")
+	parser.add_option("-b", "--bytesPerElement", dest="bytesPerElement", type="int", default=DEFAULT_BYTES_PER_ELEMENT,
+	                  help="element size for arrays without declaration prefix in the callgraph, default: %i" %(DEFAULT_BYTES_PER_ELEMENT))
+	parser.add_option("-d", "--debug", action="store_true", dest="debug",
+	                  help="show debug print in standard error output")
+	(options, args) = parser.parse_args()
+
+	setupDeferredLogging('preprocessor.log', logging.DEBUG if options.debug else logging.INFO)
+
+	if not options.source:
+		logging.error("sourceXML option is mandatory. Use '--help' for informations on how to use this module")
+		sys.exit(1)
+	if options.hostBandwidth == None or options.deviceBandwidth == None or options.transferBandwidth == None:
+		logging.error("hostBandwidth, deviceBandwidth and transferBandwidth are mandatory. Use '--help' for informations on how to use this module")
+		sys.exit(1)
+
+	try:
+		definitions = {}
+		for path in options.settings:
+			definitions.update(readDefinitions(path))
+		for sizes in options.sizes:
+			definitions.update(parseAssignments(sizes))
+		defaultFlopsPerPoint = None
+		flopsPerPointByKernel = {}
+		for entry in (options.flopsPerPoint or "").split(","):
+			if "=" in entry:
+				flopsPerPointByKernel.update(parseAssignments(entry, float))
+			elif entry.strip() != "":
+				defaultFlopsPerPoint = float(entry)
+		machine = MachineModel(
+			options.hostBandwidth * GIGA,
+			options.deviceBandwidth * GIGA,
+			options.transferBandwidth * GIGA,
+			options.hostPerformance * GIGA if options.hostPerformance != None else None,
+			options.devicePerformance * GIGA if options.devicePerformance != None else None
+		)
+		if options.iterations < 1 or min(machine.hostBandwidth, machine.deviceBandwidth, machine.transferBandwidth) <= 0:
+			raise UsageError("iterations and bandwidths need to be positive")
+		srcFile = openFile(str(options.source), 'r')
+		data = srcFile.read()
+		srcFile.close()
+		doc = parseString(data)
+		kernels, skippedKernels = analyseKernels(doc, definitions, options.bytesPerElement)
+		if len(kernels) == 0 and len(skippedKernels) == 0:
+			raise UsageError("no active parallel regions found in %s - is this an analysed callgraph (CG_CPU.xml / CG_GPU.xml)?" %(options.source))
+		sys.stdout.write(report(
+			rankedPredictions(kernels, machine, options.iterations, flopsPerPointByKernel, defaultFlopsPerPoint),
+			skippedKernels,
+			machine,
+			options.iterations
+		))
+		if len(kernels) == 0:
+			raise UsageError("none of the kernels could be evaluated, please define the missing sizes")
+	except UsageError as e:
+		logging.error('Error: %s' %(str(e)))
+		sys.exit(1)
+	except Exception as e:
+		logging.critical('Error when modelling the speedup feasibility for %s: %s' %(str(options.source), str(e)))
+		logging.info(traceback.format_exc())
+		sys.exit(1)
@@ -187,6 +187,46 @@ def printProgressIndicator(stream, fileName, lineNum, totalNum, description):
     stream.write("\033[K") #clear rest of current line
     stream.flush()
 
+_internedUnicodeStrings = {}
+
+def internedString(text):
+    #intern() only accepts byte strings, while minidom hands out unicode -> canonicalize those ourselves, keeping the type
+    if type(text) == str:
+        return intern(text)
+    if type(text) == unicode:
+        return _internedUnicodeStrings.setdefault(text, text)
+    return text
+
+def strippedTexts(texts):
+    '''Yields the non empty pieces of "".join(texts).strip() without building the joined text.'''
+    pendingWhitespace = None
+    for text in texts:
+        content = text.rstrip()
+        if content == "":
+            if pendingWhitespace != None:
+                pendingWhitespace += text
+            continue
+        if pendingWhitespace == None:
+            yield content.lstrip()
+        else:
+            yield pendingWhitespace + content
+        pendingWhitespace = text[len(content):]
+
+def splitLines(texts):
+    '''Yields the entries of "".join(texts).split("\\n") without building the joined text.'''
+    currLineParts = []
+    for text in texts:
+        lines = text.split("\n")
+        if len(lines) == 1:
+            currLineParts.append(text)
+            continue
+        currLineParts.append(lines[0])
+        yield "".join(currLineParts)
+        for line in lines[1:-1]:
+            yield line
+        currLineParts = [lines[-1]]
+    yield "".join(currLineParts)
+
 def stripWhitespace(inputStr):
     match = re.match(r'\s*(.*)\s*', inputStr)
     if not match:
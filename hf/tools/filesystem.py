@@ -19,6 +19,7 @@
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import re
 import logging
 
 def dirEntries(dir_name, subdir, *args):
@@ -48,3 +49,23 @@ def dirEntries(dir_name, subdir, *args):
             fileList.extend(dirEntries(dirfile, subdir, *args))
     return fileList
 
+def filesAndDirectories(dir_name):
+    '''Walks 'dir_name' once, returns (file paths, directory paths including 'dir_name') in the order 'find' lists them.'''
+    files = []
+    directories = [dir_name]
+    for entry in os.listdir(dir_name):
+        path = os.path.join(dir_name, entry)
+        if os.path.isdir(path) and not os.path.islink(path):
+            subdirFiles, subdirDirectories = filesAndDirectories(path)
+            files.extend(subdirFiles)
+            directories.extend(subdirDirectories)
+        elif os.path.isfile(path):
+            files.append(path)
+    return files, directories
+
+def filterExceptions(exceptions, paths):
+    if len(exceptions) == 0:
+        return paths
+    exceptionsPiped = '|'.join([re.escape(exception) for exception in exceptions])
+    pattern = re.compile(r'.*?(^|\W)+' + r'(' + exceptionsPiped + r')' + r'($|\W)+.*')
+    return [path for path in paths if not pattern.match(path)]
@@ -19,10 +19,11 @@
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
 from xml.dom.minidom import Document, Node, parseString as parseStringUsingMinidom
-from tools.commons import BracketAnalyzer, enum
+from tools.commons import BracketAnalyzer, enum, internedString
 import uuid
 import re
 import logging
+import weakref
 
 domainDependantAttributes = ["autoDom", "present", "transferHere"]
 
@@ -119,6 +120,44 @@ class ImmutableDOMNode(object):
 class ImmutableDOMDocument(ImmutableDOMNode):
     pass
 
+class TemplateRegistry(object):
+    '''Parses each domainDependantTemplate and parallelRegionTemplate only once.
+    The parsed domains and attributes are interned, so symbols and regions referring to equal templates share them.
+    Templates must not be modified anymore once they have been parsed through this registry.'''
+    def __init__(self):
+        self._parsedByTemplateNode = weakref.WeakKeyDictionary()
+        self._internedEntries = {}
+        self._parallelRegionDomainsByKey = {}
+
+    def internedEntry(self, entry):
+        return self._internedEntries.setdefault(entry, entry)
+
+    def internedStrings(self, strings):
+        return self.internedEntry(tuple(internedString(string) for string in strings))
+
+    def internedParallelRegionDomain(self, name, size, startsAt=None, endsAt=None):
+        key = (internedString(name), internedString(size), internedString(startsAt), internedString(endsAt))
+        domain = self._parallelRegionDomainsByKey.get(key)
+        if domain == None:
+            domain = ParallelRegionDomain(*key)
+            self._parallelRegionDomainsByKey[key] = domain
+        return domain
+
+    def parsed(self, templateNode, propertyKey, parser):
+        #immutable wrappers of the same DOM node share one entry
+        node = templateNode.node if isinstance(templateNode, ImmutableDOMNode) else templateNode
+        parsedByKey = self._parsedByTemplateNode.get(node)
+        if parsedByKey == None:
+            parsedByKey = {}
+            self._parsedByTemplateNode[node] = parsedByKey
+        if propertyKey in parsedByKey:
+            return parsedByKey[propertyKey]
+        result = parser(templateNode)
+        parsedByKey[propertyKey] = result
+        return result
+
+templateRegistry = TemplateRegistry()
+
 def getClonedDocument(doc):
     clone = doc.cloneNode(deep=True)
     if hasattr(clone, "_firstLevelElementCache"):
@@ -506,41 +545,53 @@ def getRoutineNodeInitStage(routineNode):
     return RoutineNodeInitStage.DIRECTIVES_WITH_PARALLELREGION_POSITION
 
 def getDomNameAndSize(templateNode):
+    #returns a new list each time since callers keep it as symbol state - the (name, size) entries themselves are shared
+    return list(templateRegistry.parsed(templateNode, "domNameAndSize", _parseDomNameAndSize))
+
+def _parseDomNameAndSize(templateNode):
     dimensionSizesTemplateNodes = templateNode.getElementsByTagName("domSize")
     if not dimensionSizesTemplateNodes or len(dimensionSizesTemplateNodes) == 0:
-        return []
+        return ()
     dimensionSizesInTemplate = [node.firstChild.nodeValue for node in dimensionSizesTemplateNodes[0].getElementsByTagName("entry")]
     dimensionNamesTemplateNodes = templateNode.getElementsByTagName("domName")
     if not dimensionNamesTemplateNodes or len(dimensionNamesTemplateNodes) == 0:
-        return []
+        return ()
     dimensionNamesInTemplate = [node.firstChild.nodeValue for node in dimensionNamesTemplateNodes[0].getElementsByTagName("entry")]
     if len(dimensionNamesInTemplate) != len(dimensionSizesInTemplate):
         raise Exception("Number of domain names does not match number of domain sizes specified; Domain names: %s, domain sizes: %s" %(dimensionNamesInTemplate, dimensionSizesInTemplate))
     #map the domNames to the sizes declared in the declaration
-    dimensionNameAndSize = []
-    for i in range(len(dimensionNamesInTemplate)):
-        dimensionNameAndSize.append((dimensionNamesInTemplate[i], dimensionSizesInTemplate[i]))
-    return dimensionNameAndSize
+    return templateRegistry.internedEntry(tuple(
+        templateRegistry.internedStrings((dimensionNamesInTemplate[i], dimensionSizesInTemplate[i]))
+        for i in range(len(dimensionNamesInTemplate))
+    ))
 
 def getDeclarationPrefix(templateNode):
-    declarationPrefixTemplateNodes = templateNode.getElementsByTagName("declarationPrefix")
-    if not declarationPrefixTemplateNodes or len(declarationPrefixTemplateNodes) == 0:
-        return None
-    declarationPrefixesInTemplate = [node.firstChild.nodeValue for node in declarationPrefixTemplateNodes[0].getElementsByTagName("entry")]
-    return declarationPrefixesInTemplate[0]
+    return getStringProperty(templateNode, "declarationPrefix")
 
 def getStringProperty(templateNode, propertyName):
+    return templateRegistry.parsed(
+        templateNode,
+        ("stringProperty", propertyName),
+        lambda node: _parseStringProperty(node, propertyName)
+    )
+
+def _parseStringProperty(templateNode, propertyName):
     templateNodes = templateNode.getElementsByTagName(propertyName)
     if not templateNodes or len(templateNodes) == 0:
         return None
     propertyValues = [node.firstChild.nodeValue for node in templateNodes[0].getElementsByTagName("entry")]
-    return propertyValues[0]
+    return internedString(propertyValues[0])
 
 def getAttributes(templateNode):
+    return list(templateRegistry.parsed(templateNode, "attributes", _parseAttributes))
+
+def _parseAttributes(templateNode):
     attributesTemplateNodes = templateNode.getElementsByTagName("attribute")
     if not attributesTemplateNodes or len(attributesTemplateNodes) == 0:
-        return []
-    return [node.firstChild.nodeValue for node in attributesTemplateNodes[0].getElementsByTagName("entry")]
+        return ()
+    return templateRegistry.internedStrings(
+        node.firstChild.nodeValue for node in attributesTemplateNodes[0].getElementsByTagName("entry")
+    )
 
 def getDomainDependantTemplatesAndEntries(cgDoc, routineNode):
     result = []
@@ -567,6 +618,9 @@ def getDomainDependantTemplatesAndEntries(cgDoc, routineNode):
     return result
 
 def getDomainsWithParallelRegionTemplate(parallelRegionTemplate):
+    return templateRegistry.parsed(parallelRegionTemplate, "parallelRegionDomains", _parseDomainsWithParallelRegionTemplate)
+
+def _parseDomainsWithParallelRegionTemplate(parallelRegionTemplate):
     def getAttributeEntries(attributeName, mandatory=False, expectedLength=None):
         domNodes = parallelRegionTemplate.getElementsByTagName(attributeName)
         if mandatory and (domNodes == None or len(domNodes) != 1):
@@ -584,15 +638,15 @@ def getDomainsWithParallelRegionTemplate(parallelRegionTemplate):
     domainSizes = getAttributeEntries('domSize', mandatory=True, expectedLength=len(domainNames))
     startsAtEntries = getAttributeEntries('startAt', mandatory=False, expectedLength=len(domainNames))
     endsAtEntries = getAttributeEntries('endAt', mandatory=False, expectedLength=len(domainNames))
-    domains = []
-    for index, domainName in enumerate(domainNames):
-        domains.append(ParallelRegionDomain(
+    return tuple(
+        templateRegistry.internedParallelRegionDomain(
             name=domainName,
             size=domainSizes[index],
             startsAt=startsAtEntries[index] if startsAtEntries != None else None,
             endsAt=endsAtEntries[index] if endsAtEntries != None else None
-        ))
-    return domains
+        )
+        for index, domainName in enumerate(domainNames)
+    )
 
 def getIterators(currRoutineNode, currParallelRegionTemplates, architectures):
     iteratorsByName = {}
@@ -633,6 +687,9 @@ def appliesTo(appliesToTests, parallelRegionTemplate):
     return False
 
 def getTemplate(parallelRegionTemplate):
+    return templateRegistry.parsed(parallelRegionTemplate, "template", _parseTemplate)
+
+def _parseTemplate(parallelRegionTemplate):
     templateNodes = parallelRegionTemplate.getElementsByTagName("template")
     if not templateNodes or len(templateNodes) == 0:
         return ''
@@ -643,7 +700,7 @@ def getTemplate(parallelRegionTemplate):
         raise Exception("Multiple templates are not supported.")
     if len(entries) == 0:
         raise Exception("Empty template attribute is not allowed.")
-    return entries[0].firstChild.nodeValue.strip()
+    return internedString(entries[0].firstChild.nodeValue.strip())
 
 def getReductionScalarsByOperator(parallelRegionTemplate):
     result = {}
@@ -0,0 +1,291 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+import os, time, json
+from contextlib import contextmanager
+from tools.commons import OrderedDict
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc #only available with Python >= 3.4 or a patched Python 2 with pytracemalloc
+except ImportError:
+    tracemalloc = None
+
+NUMBER_OF_TOP_ALLOCATIONS = 10
+NUMBER_OF_SUMMARY_ENTRIES = 10
+
+def cpuTime():
+    times = os.times()
+    return times[0] + times[1]
+
+def peakRSSInKiB():
+    if not resource:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss #KiB on Linux
+
+class Measurement(object):
+    def __init__(self):
+        self.count = 0
+        self.wallTime = 0.0
+        self.cpuTime = 0.0
+        self.peakRSSInKiB = None
+        self.topAllocations = None
+
+    def add(self, wallTime, cpuTime, peakRSS):
+        self.count += 1
+        self.wallTime += wallTime
+        self.cpuTime += cpuTime
+        if peakRSS != None:
+            self.peakRSSInKiB = max(self.peakRSSInKiB, peakRSS)
+
+    def asDict(self):
+        result = OrderedDict()
+        result["count"] = self.count
+        result["wallTime"] = round(self.wallTime, 6)
+        result["cpuTime"] = round(self.cpuTime, 6)
+        result["peakRSSInKiB"] = self.peakRSSInKiB
+        if self.topAllocations != None:
+            result["topAllocations"] = self.topAllocations
+        return result
+
+class PhaseProfiler(object):
+    '''Records wall time, CPU time and peak RSS per phase, per file and per routine.
+    Disabled by default - measuring is then a no-op, so the hooks can stay in the code.'''
+    def __init__(self):
+        self.isEnabled = False
+        self._measurementsByPhase = OrderedDict()
+        self._measurementsByPhaseAndFile = OrderedDict()
+        self._measurementsByPhaseAndRoutine = OrderedDict()
+        self._startTime = None
+
+    @property
+    def isTracingAllocations(self):
+        return self.isEnabled and tracemalloc != None and tracemalloc.is_tracing()
+
+    def enable(self, traceAllocations=True):
+        self.isEnabled = True
+        self._startTime = time.time()
+        if traceAllocations and tracemalloc != None and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _measurementFor(self, phase, fileName, routineName):
+        if routineName != None:
+            index, key = self._measurementsByPhaseAndRoutine, (phase, routineName)
+        elif fileName != None:
+            index, key = self._measurementsByPhaseAndFile, (phase, fileName)
+        else:
+            index, key = self._measurementsByPhase, phase
+        measurement = index.get(key)
+        if measurement == None:
+            measurement = Measurement()
+            index[key] = measurement
+        return measurement
+
+    @contextmanager
+    def measure(self, phase, fileName=None, routineName=None):
+        if not self.isEnabled:
+            yield
+            return
+        #allocations are only compared for whole phases - snapshots are too expensive for each file or routine
+        isPhaseMeasurement = fileName == None and routineName == None
+        snapshotBefore = tracemalloc.take_snapshot() if isPhaseMeasurement and self.isTracingAllocations else None
+        wallTimeBefore = time.time()
+        cpuTimeBefore = cpuTime()
+        try:
+            yield
+        finally:
+            measurement = self._measurementFor(phase, fileName, routineName)
+            measurement.add(time.time() - wallTimeBefore, cpuTime() - cpuTimeBefore, peakRSSInKiB())
+            if snapshotBefore != None:
+                measurement.topAllocations = [
+                    OrderedDict([
+                        ("location", str(statistic.traceback)),
+                        ("sizeDiffInKiB", round(statistic.size_diff / 1024.0, 1)),
+                        ("countDiff", statistic.count_diff)
+                    ])
+                    for statistic in tracemalloc.take_snapshot().compare_to(snapshotBefore, "lineno")[:NUMBER_OF_TOP_ALLOCATIONS]
+                ]
+
+    def addMeasurement(self, phase, wallTime, cpuTime, peakRSS, fileName=None, routineName=None):
+        #for work measured elsewhere, e.g. in a worker process
+        if not self.isEnabled:
+            return
+        self._measurementFor(phase, fileName, routineName).add(wallTime, cpuTime, peakRSS)
+
+    def measuredTexts(self, texts, phase, fileName=None, routineName=None):
+        #for generators: only the time spent producing the texts is accounted, not the time spent by the consumer
+        iterator = iter(texts)
+        while True:
+            with self.measure(phase, fileName, routineName):
+                try:
+                    text = next(iterator)
+                except StopIteration:
+                    return
+            yield text
+
+    def report(self):
+        def measurementsAsList(measurementsByKey, keyNames):
+            result = []
+            for key, measurement in measurementsByKey.iteritems():
+                entry = OrderedDict(zip(keyNames, key if isinstance(key, tuple) else (key,)))
+                entry.update(measurement.asDict())
+                result.append(entry)
+            return result
+
+        result = OrderedDict()
+        result["totalWallTime"] = round(time.time() - self._startTime, 6) if self._startTime != None else None
+        result["totalCPUTime"] = round(cpuTime(), 6)
+        result["peakRSSInKiB"] = peakRSSInKiB()
+        result["tracemallocAvailable"] = tracemalloc != None
+        result["phases"] = measurementsAsList(self._measurementsByPhase, ["phase"])
+        result["files"] = measurementsAsList(self._measurementsByPhaseAndFile, ["phase", "file"])
+        result["routines"] = measurementsAsList(self._measurementsByPhaseAndRoutine, ["phase", "routine"])
+        return result
+
+    def summary(self):
+        def slowestEntries(measurementsByKey):
+            return sorted(
+                measurementsByKey.iteritems(),
+                key=lambda (_, measurement): measurement.wallTime,
+                reverse=True
+            )[:NUMBER_OF_SUMMARY_ENTRIES]
+
+        report = self.report()
+        lines = ["Preprocessor profile: %.2fs wall, %.2fs CPU, peak RSS %s" %(
+            report["totalWallTime"] or 0.0,
+            report["totalCPUTime"],
+            "%.1f MiB" %(report["peakRSSInKiB"] / 1024.0) if report["peakRSSInKiB"] != None else "unknown"
+        )]
+        lines.append("%-45s %10s %10s %12s" %("phase", "wall [s]", "cpu [s]", "RSS [MiB]"))
+        for phase, measurement in self._measurementsByPhase.iteritems():
+            lines.append("%-45s %10.3f %10.3f %12s" %(
+                phase[:45],
+                measurement.wallTime,
+                measurement.cpuTime,
+                "%.1f" %(measurement.peakRSSInKiB / 1024.0) if measurement.peakRSSInKiB != None else "-"
+            ))
+        for title, measurementsByKey in [
+            ("slowest files", self._measurementsByPhaseAndFile),
+            ("slowest routines", self._measurementsByPhaseAndRoutine)
+        ]:
+            if len(measurementsByKey) == 0:
+                continue
+            lines.append("%s:" %(title))
+            for (phase, name), measurement in slowestEntries(measurementsByKey):
+                lines.append("  %10.3fs  %s (%s)" %(measurement.wallTime, name, phase))
+        return "\n".join(lines) + "\n"
+
+    def writeReport(self, path):
+        reportFile = open(path, "w")
+        try:
+            json.dump(self.report(), reportFile, indent=2)
+        finally:
+            reportFile.close()
+
+profiler = PhaseProfiler()
+
+MAXIMUM_STACK_DEPTH = 64
+
+def functionLabel(function):
+    #(filename, line, name) as used by pstats -> label that stays comparable between checkouts and builds
+    fileName, lineNumber, functionName = function
+    if fileName == "~":
+        return functionName #builtins
+    normalizedPath = fileName.replace(os.sep, "/")
+    if "/hf/" in normalizedPath:
+        normalizedPath = "hf/" + normalizedPath.rsplit("/hf/", 1)[1]
+    else:
+        normalizedPath = os.path.basename(normalizedPath)
+    return "%s:%i(%s)" %(normalizedPath, lineNumber, functionName)
+
+def collapsedStacks(stats):
+    '''Converts pstats.Stats into collapsed stacks ("root;caller;callee microseconds") as read by flamegraph.pl.
+    cProfile only records caller -> callee edges, so the time of a function called from several places
+    is distributed to its callers in proportion to the cumulative time of each call edge.'''
+    calleesByFunction = {}
+    for function, (_, _, _, _, callers) in stats.stats.iteritems():
+        for caller in callers:
+            calleesByFunction.setdefault(caller, []).append(function)
+    microsecondsByStack = {}
+
+    def addStack(stack, seconds):
+        microseconds = int(round(seconds * 1e6))
+        if microseconds <= 0:
+            return
+        key = ";".join(stack)
+        microsecondsByStack[key] = microsecondsByStack.get(key, 0) + microseconds
+
+    def walk(function, share, stack, functionsOnStack):
+        _, _, inlineTime, cumulativeTime, _ = stats.stats[function]
+        stack = stack + [functionLabel(function)]
+        addStack(stack, inlineTime * share)
+        if len(stack) >= MAXIMUM_STACK_DEPTH:
+            return
+        for callee in calleesByFunction.get(function, []):
+            if callee in functionsOnStack:
+                continue #recursion is already accounted in the cumulative time of the outermost call
+            calleeCumulativeTime = stats.stats[callee][3]
+            if calleeCumulativeTime <= 0:
+                continue
+            edgeCumulativeTime = stats.stats[callee][4][function][3]
+            calleeShare = share * edgeCumulativeTime / calleeCumulativeTime
+            if calleeShare * calleeCumulativeTime < 1e-6:
+                continue
+            walk(callee, calleeShare, stack, functionsOnStack | set([callee]))
+
+    roots = [
+        function for function, (_, _, _, _, callers) in stats.stats.iteritems()
+        if len(callers) == 0
+    ]
+    for root in roots:
+        walk(root, 1.0, [], set([root]))
+    return sorted(microsecondsByStack.iteritems())
+
+def hotspotTable(stats):
+    '''One entry per function, sorted by inline time. Labels don't contain absolute paths, so tables of different builds can be compared.'''
+    totalTime = float(stats.total_tt) if stats.total_tt > 0 else 1.0
+    entries = []
+    for function, (primitiveCalls, numberOfCalls, inlineTime, cumulativeTime, _) in stats.stats.iteritems():
+        entry = OrderedDict()
+        entry["function"] = functionLabel(function)
+        entry["calls"] = numberOfCalls
+        entry["primitiveCalls"] = primitiveCalls
+        entry["inlineTime"] = round(inlineTime, 6)
+        entry["cumulativeTime"] = round(cumulativeTime, 6)
+        entry["inlineShare"] = round(inlineTime / totalTime, 6)
+        entries.append(entry)
+    entries.sort(key=lambda entry: (-entry["inlineTime"], entry["function"]))
+    return entries
+
+def hotspotDifferences(baselineEntries, entries):
+    '''Compares two hotspot tables by function label; sorted by the absolute change in inline time.'''
+    baselineEntriesByFunction = dict((entry["function"], entry) for entry in baselineEntries)
+    entriesByFunction = dict((entry["function"], entry) for entry in entries)
+    differences = []
+    for function in set(baselineEntriesByFunction.keys()) | set(entriesByFunction.keys()):
+        baselineTime = baselineEntriesByFunction[function]["inlineTime"] if function in baselineEntriesByFunction else 0.0
+        currentTime = entriesByFunction[function]["inlineTime"] if function in entriesByFunction else 0.0
+        differences.append((function, baselineTime, currentTime, currentTime - baselineTime))
+    differences.sort(key=lambda difference: (-abs(difference[3]), difference[0]))
+    return differences
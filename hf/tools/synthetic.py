@@ -0,0 +1,216 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from tools.commons import OrderedDict
+
+DATA_MODULE_NAME = "synthetic_data"
+
+class SyntheticCodebaseSpecification(object):
+    '''Shape of a generated Hybrid Fortran codebase.
+    Every module holds chains of `callDepth` routines: the head of a chain owns the data (transferHere),
+    the routines in between pass it on and the last routine of a chain is a kernel routine with `kernelsPerRoutine` parallel regions.'''
+    def __init__(
+        self,
+        numberOfModules=4,
+        routinesPerModule=6,
+        callDepth=3,
+        kernelsPerRoutine=2,
+        domainDependantSymbols=4,
+        moduleDataImports=2
+    ):
+        if numberOfModules < 1 or routinesPerModule < 1 or callDepth < 1 or kernelsPerRoutine < 1:
+            raise Exception("modules, routines per module, call depth and kernels per routine need to be at least 1")
+        if domainDependantSymbols < 2:
+            raise Exception("at least two domainDependant symbols are needed (one input, one output)")
+        if moduleDataImports < 0:
+            raise Exception("the number of module data imports cannot be negative")
+        self.numberOfModules = numberOfModules
+        self.routinesPerModule = routinesPerModule
+        self.callDepth = callDepth
+        self.kernelsPerRoutine = kernelsPerRoutine
+        self.domainDependantSymbols = domainDependantSymbols
+        self.moduleDataImports = moduleDataImports
+
+    def scaled(self, factor):
+        return SyntheticCodebaseSpecification(
+            numberOfModules=self.numberOfModules * factor,
+            routinesPerModule=self.routinesPerModule,
+            callDepth=self.callDepth,
+            kernelsPerRoutine=self.kernelsPerRoutine,
+            domainDependantSymbols=self.domainDependantSymbols,
+            moduleDataImports=self.moduleDataImports
+        )
+
+    def asDict(self):
+        result = OrderedDict()
+        result["numberOfModules"] = self.numberOfModules
+        result["routinesPerModule"] = self.routinesPerModule
+        result["callDepth"] = self.callDepth
+        result["kernelsPerRoutine"] = self.kernelsPerRoutine
+        result["domainDependantSymbols"] = self.domainDependantSymbols
+        result["moduleDataImports"] = self.moduleDataImports
+        return result
+
+def _argumentNames(specification):
+    return ["arg%i" %(index + 1) for index in range(specification.domainDependantSymbols)]
+
+def _dataNames(specification):
+    return ["module_data%i" %(index + 1) for index in range(specification.moduleDataImports)]
+
+def _routineName(moduleIndex, routineIndex):
+    return "m%i_r%i" %(moduleIndex + 1, routineIndex + 1)
+
+def _chains(specification):
+    routineIndices = range(specification.routinesPerModule)
+    return [
+        routineIndices[start:start + specification.callDepth]
+        for start in range(0, specification.routinesPerModule, specification.callDepth)
+    ]
+
+def _dataModuleLines(specification):
+    dataNames = _dataNames(specification)
+    lines = ["module %s" %(DATA_MODULE_NAME), "  implicit none", "  private", ""]
+    if len(dataNames) > 0:
+        lines += [
+            "  real, public, dimension(:, :, :), allocatable :: %s" %(", ".join(dataNames)),
+            "",
+            "  @domainDependant{attribute(host), domName(x,y,z), domSize(NX,NY,NZ), domPP(DOM), accPP(AT)}",
+            "  %s" %(", ".join(dataNames)),
+            "  @end domainDependant"
+        ]
+    lines += ["end module %s" %(DATA_MODULE_NAME)]
+    return lines
+
+def _routineLines(specification, moduleIndex, routineIndex, positionInChain, chainLength):
+    argumentNames = _argumentNames(specification)
+    dataNames = _dataNames(specification)
+    isHead = positionInChain == 0
+    isKernelRoutine = positionInChain == chainLength - 1
+    callsKernelRoutine = positionInChain == chainLength - 2
+    name = _routineName(moduleIndex, routineIndex)
+    lines = ["  subroutine %s(%s)" %(name, ", ".join(argumentNames))]
+    importsModuleData = (isHead or isKernelRoutine) and len(dataNames) > 0
+    if importsModuleData:
+        lines.append("    use %s, only: %s" %(DATA_MODULE_NAME, ", ".join(dataNames)))
+    lines += [
+        "    implicit none",
+        "    real, dimension(NZ), intent(in) :: %s" %(", ".join(argumentNames[:-1])),
+        "    real, dimension(NZ), intent(out) :: %s" %(argumentNames[-1])
+    ]
+    if isKernelRoutine:
+        lines.append("    integer :: z")
+    lines += [
+        "",
+        "    @domainDependant{attribute(%s), domName(x,y,z), domSize(NX,NY,NZ), domPP(DOM), accPP(AT)}" %(
+            "transferHere" if isHead else "present"
+        ),
+        "    %s" %(", ".join(argumentNames)),
+        "    @end domainDependant"
+    ]
+    if importsModuleData:
+        #module data is transferred by the chain heads and used by the kernel routines
+        lines += [
+            "",
+            "    @domainDependant{attribute(autoDom, %s)}" %("transferHere" if isHead else "present"),
+            "    %s" %(", ".join(dataNames)),
+            "    @end domainDependant"
+        ]
+    lines.append("")
+    if isKernelRoutine:
+        #a kernel routine that is also the head of its chain (call depth 1) runs its kernels on every architecture
+        appliesTo = "" if isHead else "appliesTo(GPU), "
+        for kernelIndex in range(specification.kernelsPerRoutine):
+            inputName = argumentNames[kernelIndex % (len(argumentNames) - 1)]
+            summands = ["%s(z)" %(inputName)] + [
+                "%s(z)" %(dataName) for dataName in dataNames
+            ]
+            lines += [
+                "    @parallelRegion{%sdomName(x,y), domSize(NX, NY)}" %(appliesTo),
+                "    do z=1,NZ",
+                "      %s(z) = (%s) * %i.0" %(argumentNames[-1], " + ".join(summands), kernelIndex + 1),
+                "    end do",
+                "    @end parallelRegion"
+            ]
+    else:
+        call = "    call %s(%s)" %(_routineName(moduleIndex, routineIndex + 1), ", ".join(argumentNames))
+        if callsKernelRoutine:
+            lines += [
+                "    @parallelRegion{appliesTo(CPU), domName(x,y), domSize(NX, NY)}",
+                call,
+                "    @end parallelRegion"
+            ]
+        else:
+            lines.append(call)
+    lines += ["  end subroutine", ""]
+    return lines
+
+def _moduleLines(specification, moduleIndex):
+    lines = ["module synthetic_m%i" %(moduleIndex + 1), "  implicit none", "contains", ""]
+    for chain in _chains(specification):
+        for positionInChain, routineIndex in enumerate(chain):
+            lines += _routineLines(specification, moduleIndex, routineIndex, positionInChain, len(chain))
+    lines.append("end module synthetic_m%i" %(moduleIndex + 1))
+    return lines
+
+def _driverLines(specification):
+    argumentNames = _argumentNames(specification)
+    lines = ["module synthetic_driver", "  implicit none", "contains", ""]
+    lines.append("  subroutine run_synthetic(%s)" %(", ".join(argumentNames)))
+    for moduleIndex in range(specification.numberOfModules):
+        lines.append("    use synthetic_m%i, only: %s" %(
+            moduleIndex + 1,
+            ", ".join(_routineName(moduleIndex, chain[0]) for chain in _chains(specification))
+        ))
+    lines += [
+        "    implicit none",
+        "    real, dimension(NX, NY, NZ), intent(in) :: %s" %(", ".join(argumentNames[:-1])),
+        "    real, dimension(NX, NY, NZ), intent(out) :: %s" %(argumentNames[-1]),
+        ""
+    ]
+    for moduleIndex in range(specification.numberOfModules):
+        for chain in _chains(specification):
+            lines.append("    call %s(%s)" %(_routineName(moduleIndex, chain[0]), ", ".join(argumentNames)))
+    lines += ["  end subroutine", "", "end module synthetic_driver"]
+    return lines
+
+def syntheticSources(specification):
+    '''Returns an ordered dictionary of file name -> h90 source text.'''
+    result = OrderedDict()
+    result["%s.h90" %(DATA_MODULE_NAME)] = _dataModuleLines(specification)
+    for moduleIndex in range(specification.numberOfModules):
+        result["synthetic_m%i.h90" %(moduleIndex + 1)] = _moduleLines(specification, moduleIndex)
+    result["synthetic_driver.h90"] = _driverLines(specification)
+    for fileName in result:
+        result[fileName] = "\n".join(result[fileName]) + "\n"
+    return result
+
+def writeSyntheticCodebase(specification, directory):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    numberOfLines = 0
+    for fileName, text in syntheticSources(specification).iteritems():
+        sourceFile = open(os.path.join(directory, fileName), "w")
+        try:
+            sourceFile.write(text)
+        finally:
+            sourceFile.close()
+        numberOfLines += text.count("\n")
+    return numberOfLines
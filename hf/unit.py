@@ -201,6 +201,14 @@ class TestCommonTools(unittest.TestCase):
 		)
 		self.assertEqual(remainder, "::b")
 
+	def testTextStreaming(self):
+		from tools.commons import strippedTexts, splitLines
+		texts = ["  \n", "", " module a", "\n\n  ", "", "end module\n ", " \n"]
+		self.assertEqual("".join(strippedTexts(texts)), "".join(texts).strip())
+		self.assertEqual(list(splitLines(texts)), "".join(texts).split("\n"))
+		self.assertEqual(list(strippedTexts([" ", "\n"])), [])
+		self.assertEqual(list(splitLines([])), [""])
+
 class TestMachineryAlgorithms(unittest.TestCase):
 	def testSpecificationParsing(self):
 		from machinery.commons import parseSpecification
@@ -285,6 +293,13 @@ class TestMachineryAlgorithms(unittest.TestCase):
 			("double precision, attribute", (("a", None),), "= 1.0d0")
 		)
 
+	def testStreamingSanitizer(self):
+		from machinery.commons import FortranCodeSanitizer
+		texts = ["module a\n", "subroutine b()\n\n\n", "  a = 1 ! " + "x" * 140, "\nend subroutine\n", "end module"]
+		expectedText = FortranCodeSanitizer().sanitizeLines("".join(texts))
+		self.assertEqual("".join(FortranCodeSanitizer().sanitizedTexts(texts)), expectedText)
+		self.assertEqual(expectedText.split("\n")[1], "\tsubroutine b()")
+
 class TestSymbolAlgorithms(unittest.TestCase):
 	def testSymbolNamesFromDeclaration(self):
 		def symbolNamesFromDeclaration(declaration):
@@ -616,5 +631,117 @@ class TestPickling(unittest.TestCase):
 			is symbolAfterPickling.template.ownerDocument
 		)
 
+	def testSymbolIdentity(self):
+		import pickle
+
+		cgDoc = self.makeDummyCallGraphDocument()
+		module = self.makeDummyModule(cgDoc)
+		routine = self.makeDummyRoutine(cgDoc, module)
+		symbol = self.makeDummySymbol(cgDoc, module, routine)
+		self.assertEqual(hash(symbol), hash("testSymbol"))
+		self.assertEqual(symbol, pickle.loads(pickle.dumps(symbol)))
+
+		# the cached identity needs to follow changes to the scoped name
+		symbol.isUsingDevicePostfix = True
+		self.assertEqual(symbol.scopedNameIdentity, "testSymbol_hfdev")
+		self.assertEqual(hash(symbol), hash("testSymbol_hfdev"))
+		self.assertEqual(symbol.nameInScope(useDeviceVersionIfAvailable=False), "testSymbol")
+
+	def testSymbolDomainSharing(self):
+		cgDoc = self.makeDummyCallGraphDocument()
+		module = self.makeDummyModule(cgDoc)
+		routine = self.makeDummyRoutine(cgDoc, module)
+		symbol = self.makeDummySymbol(cgDoc, module, routine)
+
+		# clones hold the same immutable domain collections instead of copies
+		clone = symbol.clone()
+		self.assertTrue(clone.domains is symbol.domains)
+		self.assertTrue(clone._kernelInactiveDomainSizes is symbol._kernelInactiveDomainSizes)
+		self.assertRaises(AttributeError, getattr, symbol.domains, "append")
+
+		# writes rebind the attribute of the written symbol only
+		clone.domains = list(symbol.domains[:2])
+		self.assertEqual(len(clone.domains), 2)
+		self.assertEqual(len(symbol.domains), 3)
+		clone.domains = [("x", "nx"), ("y", "ny"), ("k", "nz")]
+		self.assertTrue(clone.domains is symbol.domains)
+
+	def testSymbolAccessRepresentationCache(self):
+		from tools.metadata import parseString
+
+		cgDoc = self.makeDummyCallGraphDocument()
+		module = self.makeDummyModule(cgDoc)
+		routine = self.makeDummyRoutine(cgDoc, module)
+		symbol = self.makeDummySymbol(cgDoc, module, routine)
+
+		def assertAccessRepresentation(expected):
+			accessRepresentation = symbol.accessRepresentation(["i", "j"], ["i", "j", "k"], None, isInsideParallelRegion=True)
+			self.assertEqual(accessRepresentation, expected)
+			self.assertEqual(accessRepresentation, symbol._uncachedAccessRepresentation(
+				["i", "j"], ["i", "j", "k"], None, True, False, True, None, True
+			))
+
+		# the memoized access strings need to follow every change of the symbol's state
+		assertAccessRepresentation("testSymbol( i,j,k )")
+		templateDocument = parseString(
+			"<domainDependantTemplate id=\"otherTemplateID\"><accPP><entry>TEST_ACC</entry></accPP></domainDependantTemplate>"
+		)
+		symbol.template = templateDocument.firstChild
+		assertAccessRepresentation("testSymbol( TEST_ACC(i,j,k) )")
+		symbol.domains = [("x", "nx"), ("y", "ny")]
+		assertAccessRepresentation("testSymbol( j,k )")
+		symbol.parallelRegionPosition = "outside"
+		assertAccessRepresentation("testSymbol( i,j,k )")
+
+class TestPerformanceModel(unittest.TestCase):
+	def testSpeedupFeasibility(self):
+		from speedupFeasibility import evaluateSize, bytesPerElement, Kernel, MachineModel, Prediction
+		definitions = {"DIM_X": "(DIM_X_INNER + 2 * HALO_X)", "DIM_X_INNER": "64", "HALO_X": "1", "FLOAT_BYTE_LENGTH": "8"}
+		self.assertEqual(evaluateSize("DIM_X-HALO_X", definitions), 65)
+		self.assertEqual(evaluateSize("dim_x_inner", definitions), 64)
+		self.assertEqual(bytesPerElement("real(FLOAT_BYTE_LENGTH), intent(in)", definitions, 4), 8)
+		self.assertEqual(bytesPerElement("integer, intent(out)", definitions, 8), 4)
+		self.assertEqual(bytesPerElement("double precision", definitions, 4), 8)
+		self.assertEqual(bytesPerElement(None, definitions, 8), 8)
+		kernel = Kernel("stencil", "1", "5", 1000)
+		kernel.bytesPerPoint = 16
+		kernel.transferBytesPerPoint = 8
+		machine = MachineModel(20.0, 200.0, 5.0, 100.0, 1000.0)
+		#bandwidth bound: n_it * m / m_HtoD > (BW_H / BW_HtoD) / (1 - BW_H / BW_D)
+		prediction = Prediction(kernel, machine, 10)
+		self.assertFalse(prediction.isComputeBound)
+		self.assertAlmostEqual(prediction.breakEvenIterations, 0.5 * 4.0 / 0.9)
+		self.assertAlmostEqual(prediction.speedup, (10 * 16 / 20.0) / (10 * 16 / 200.0 + 8 / 5.0))
+		#compute bound: n_it * c / m_HtoD > P_H * P_D / (BW_HtoD * (P_D - P_H))
+		prediction = Prediction(kernel, machine, 10, flopsPerPoint=400.0)
+		self.assertTrue(prediction.isComputeBound)
+		self.assertAlmostEqual(prediction.breakEvenIterations, 8 * 100.0 * 1000.0 / (400.0 * 5.0 * 900.0))
+
+	def testReadDefinitions(self):
+		import os
+		import tempfile
+		from speedupFeasibility import readDefinitions
+		fileDescriptor, path = tempfile.mkstemp(suffix=".h")
+		try:
+			os.write(fileDescriptor, "\n".join([
+				"/*",
+				"#define DIM_X_INNER 256",
+				"#define DIM_Z_INNER 256",
+				"*/",
+				"#define DIM_X_INNER 64 // the active resolution",
+				"#define DIM_Z_INNER 50 /* quick to compute */",
+				"// #define HALO_X 2",
+				"#define HALO_X 1",
+				"#define HALO_X 3",
+				""
+			]))
+			os.close(fileDescriptor)
+			definitions = readDefinitions(path)
+		finally:
+			os.remove(path)
+		self.assertEqual(definitions["DIM_X_INNER"], "64")
+		self.assertEqual(definitions["DIM_Z_INNER"], "50")
+		self.assertEqual(definitions["HALO_X"], "3")
+
 if __name__ == '__main__':
 	unittest.main()
\ No newline at end of file
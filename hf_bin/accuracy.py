@@ -18,216 +18,81 @@
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
 from optparse import OptionParser
-import struct
 import sys, pdb
 import math
 import traceback
+import itertools
+import numpy
+from unformattedRecords import UnformattedRecordFile, LayoutIndex, LAYOUT_INDEX_SUFFIX, unpackNextRecord, layoutKey, detectEndianFormat
+from referenceStore import referenceBytes
 
-def unpackNextArray(f, readEndianFormat, numOfBytesPerValue, typeSpecifier):
-	recordByteLength = unpackNextInteger(f, readEndianFormat)
-	if recordByteLength == None:
-		return None
-	if (recordByteLength % numOfBytesPerValue != 0):
-		raise Exception, "Odd record length: %i, modulo %i == 0 expected. Is the file endian correct?" %(recordByteLength, numOfBytesPerValue)
-		return None
-	recordLength = recordByteLength / numOfBytesPerValue
-
-	data = f.read(recordByteLength)
-	if (len(data) != recordByteLength):
-		raise Exception, "Could not read %i bytes as expected. Only %i bytes read." %(recordByteLength, len(data))
-		return None
-
-	redundantRecordLength = unpackNextInteger(f, readEndianFormat)
-	if redundantRecordLength == None:
-		raise Exception, "Could not read trailer."
-	if (recordByteLength != redundantRecordLength):
-		raise Exception, "Header and trailer do not match."
-		return None
-
-	dataFormat = '%s%i%s' %(readEndianFormat, recordLength, typeSpecifier)
-	try:
-		unpacked = struct.unpack(dataFormat, data)
-	except Exception as e:
-		raise Exception("Error when trying to unpack array using %s format: %s" %(dataFormat, str(e)))
-	return unpacked
-
-def unpackNextInteger(f, readEndianFormat):
-	data = f.read(4)
-	if (len(data) != 4):
-		#we have reached the end of the file
-		return None
-
-	format = '%si' %(readEndianFormat)
-	try:
-		unpacked = struct.unpack(format, data)
-	except Exception as e:
-		raise Exception("Error when trying to unpack integer using %s format: %s" %(format, str(e)))
-	return unpacked[0]
-
-def unpackNextFloat(f, readEndianFormat, numOfBytesPerValue, typeSpecifier):
-	data = f.read(numOfBytesPerValue)
-	if (len(data) != numOfBytesPerValue):
-		#we have reached the end of the file
-		return None
-
-	format = '%s%s' %(readEndianFormat, typeSpecifier)
-	try:
-		unpacked = struct.unpack(format, data)
-	except Exception as e:
-		raise Exception("Error when trying to unpack float using %s format: %s" %(format, str(e)))
-	return unpacked[0]
-
-def unpackNextRecord(f, readEndianFormat, numOfBytesPerValue, verbose=False):
-	def tentativeUnpack(f, readEndianFormat, numOfBytesPerValue, typeSpecifier, verbose=False):
-		currentPosition = f.tell()
-		content = None
-		eof = False
-		try:
-			content = unpackNextArray(f, readEndianFormat, numOfBytesPerValue, typeSpecifier)
-			eof = content == None
-		except Exception as e:
-			if verbose:
-				sys.stderr.write("Could not unpack record as array (%s) - trying integer\n" %(str(e)))
-		if eof:
-			return None
-		if content != None:
-			if verbose:
-				sys.stderr.write("This record seems to be an array of length %i\n" %(len(content)))
-			return content
-
-		try:
-			f.seek(currentPosition)
-			content = unpackNextInteger(f, readEndianFormat)
-			eof = content == None
-		except Exception as e:
-			if verbose:
-				sys.stderr.write("Could not unpack record as integer (%s) - trying float as last option\n" %(str(e)))
-		if eof:
-			return None
-		if content != None:
-			if verbose:
-				sys.stderr.write("This record seems to be an integer with value %i\n" %(content))
-			return [content]
-
-		f.seek(currentPosition)
-		content = unpackNextFloat(f, readEndianFormat, numOfBytesPerValue, typeSpecifier)
-		if content == None:
-			return None
-		if verbose:
-			sys.stderr.write("This record seems to be a float with value %s\n" %(str(content)))
-		return [content]
-
-	def valuesAreReasonable(unpacked):
-		return all([v > 1E-15 and v < 1E10 for v in unpacked])
-
-	if numOfBytesPerValue != None:
-		return tentativeUnpack(
-			f,
-			readEndianFormat,
-			numOfBytesPerValue,
-			'd' if numOfBytesPerValue == 8 else 'f',
-			verbose
-		)
-
-	# at this point we need to guess number of bytes.
-	# Let's find out whether the number of records is 0 or 1 with 8 bytes (usually that indicates that it is unlikely to be 8 bytes)
-	currentPosition = f.tell()
-	unpacked8 = tentativeUnpack(f, readEndianFormat, 8, 'd', verbose)
-	if unpacked8 != None and len(unpacked8) > 1:
-		return unpacked8
-	f.seek(currentPosition)
-	unpacked4 = tentativeUnpack(f, readEndianFormat, 4, 'f', verbose)
-	reasonable4 = valuesAreReasonable(unpacked4) if unpacked4 else False
-	if unpacked8 == None and unpacked4 == None:
-		return None
-	if unpacked4 != None and len(unpacked4) > 1 and reasonable4:
-		return unpacked4
-	if unpacked4 == None and unpacked8 != None:
-		return unpacked8
-	if unpacked8 == None and unpacked4 != None:
-		return unpacked4
-	if len(unpacked4) == len(unpacked8):
-		return unpacked4 #at this point an 4 byte integer is most likely
-	if len(unpacked4) == 1 and reasonable4:
-		return unpacked4
-	return unpacked8
+def recordString(record):
+	return str(tuple(record.tolist())) if record is not None else str(record)
 
 def rootMeanSquareDeviation(tup, tupRef, epsSingle):
-	err = 0.0
-	newErr = 0.0
-	newErrSquare = 0.0
-	i = 0
-	firstErr = -1
-	firstErrVal = 0.0
-	firstErrExpected = 0.0
-	absoluteErrors = []
-
-	for val in tup:
-		expectedVal = tupRef[i]
-		newErr = val - expectedVal
-		normErr = abs(newErr) / abs(val) if abs(val) > epsSingle else abs(newErr)
-		i = i + 1
-		absoluteErrors.append(abs(newErr))
-		try:
-			newErrSquare = newErr**2
-		except(OverflowError), e:
-			firstErr = i
-			newErrSquare = sys.float_info.max
-			firstErrVal = val
-			firstErrExpected = expectedVal
-		if math.isnan(newErr) and firstErr == -1:
-			firstErr = i
-			newErr = 0.0
-			newErrSquare = 0.0
-			firstErrVal = val
-			firstErrExpected = expectedVal
-		elif normErr > epsSingle and firstErr == -1:
-			firstErr = i
-			firstErrVal = val
-			firstErrExpected = expectedVal
-		err = err + newErrSquare
-	maxErrorIndex = 1 + max(enumerate(absoluteErrors), key=lambda x:x[1])[0] if len(absoluteErrors) > 0 else -1
-	mean_or_one = sum(tup) / len(tup) if len(tup) > 0 else 1.0
+	values = numpy.asarray(tup, dtype=numpy.float64)
+	referenceValues = numpy.asarray(tupRef, dtype=numpy.float64)
+	with numpy.errstate(over='ignore', invalid='ignore', divide='ignore'):
+		errors = values - referenceValues
+		absoluteErrors = numpy.abs(errors)
+		absoluteValues = numpy.abs(values)
+		normErrors = numpy.where(absoluteValues > epsSingle, absoluteErrors / absoluteValues, absoluteErrors)
+		errorSquares = errors ** 2
+	overflows = numpy.isfinite(errors) & ~numpy.isfinite(errorSquares)
+	errorFound = numpy.isnan(errors) | (normErrors > epsSingle)
+	errorSquares[overflows] = sys.float_info.max
+	#a NaN is left out of the sum if it is the first error found, an overflow always becomes the reported error
+	firstEvents = numpy.flatnonzero(errorFound | overflows)
+	if len(firstEvents) > 0 and numpy.isnan(errors[firstEvents[0]]):
+		errorSquares[firstEvents[0]] = 0.0
+	overflowIndices = numpy.flatnonzero(overflows)
+	firstErrIndex = -1
+	if len(overflowIndices) > 0:
+		firstErrIndex = overflowIndices[-1]
+	elif len(firstEvents) > 0:
+		firstErrIndex = firstEvents[0]
+	err = float(numpy.sum(errorSquares))
+	maxErrorIndex = 1 + int(numpy.argmax(absoluteErrors)) if len(absoluteErrors) > 0 else -1
+	mean_or_one = numpy.sum(values) / len(values) if len(values) > 0 else 1.0
 	return (
 		math.sqrt(err) / abs(mean_or_one) if mean_or_one > epsSingle else math.sqrt(err),
-		firstErr,
-		firstErrVal,
-		firstErrExpected,
+		firstErrIndex + 1 if firstErrIndex >= 0 else -1,
+		tup[firstErrIndex].item() if firstErrIndex >= 0 else 0.0,
+		tupRef[firstErrIndex].item() if firstErrIndex >= 0 else 0.0,
 		maxErrorIndex,
-		tup[maxErrorIndex] if maxErrorIndex >= 0 and maxErrorIndex < len(tup) else 0.0,
-		tupRef[maxErrorIndex] if maxErrorIndex >= 0 and maxErrorIndex < len(tupRef) else 0.0
+		tup[maxErrorIndex].item() if maxErrorIndex >= 0 and maxErrorIndex < len(tup) else 0.0,
+		tupRef[maxErrorIndex].item() if maxErrorIndex >= 0 and maxErrorIndex < len(tupRef) else 0.0
 	)
 
 def checkIntegrity(tup):
-	for index, val in enumerate(tup):
-		if math.isnan(val):
-			return index, val
-		if math.isinf(val):
-			return index, val
-	mean_or_one = sum(tup) / len(tup) if len(tup) > 0 else 1.0
+	invalid = ~numpy.isfinite(tup)
+	if numpy.any(invalid):
+		index = int(numpy.argmax(invalid))
+		return index, tup[index].item()
+	mean_or_one = numpy.sum(tup, dtype=numpy.float64) / len(tup) if len(tup) > 0 else 1.0
 	print "mean: %e" %(mean_or_one)
 	return -1, -1
 
-def getEndianFormatString(options, numOfBytesPerValue, fileUsedForAutomaticDetection):
-	def getTrialRecordsWithEndianFormat(endianFormat):
-		detectionRecords = []
-		for recordNum in range(100):
-			nextRecord = unpackNextRecord(fileUsedForAutomaticDetection, endianFormat, numOfBytesPerValue, False)
-			if nextRecord == None:
-				break
-			detectionRecords.append(nextRecord)
-		return detectionRecords
-
+def getEndianFormatString(options, numOfBytesPerValue, fileUsedForAutomaticDetection, layoutIndex=None):
 	if (options.readEndian == "little"):
 		return '<'
 	if (options.readEndian == "big"):
 		return '>'
-	fileUsedForAutomaticDetection.seek(0)
-	records = getTrialRecordsWithEndianFormat('<')
-	fileUsedForAutomaticDetection.seek(0)
-	if len(records) == 100 and all([len(r) in [0, 1] for r in records]):
-		return '>'
-	return '<'
+	if layoutIndex != None:
+		return layoutIndex.endianFormat(fileUsedForAutomaticDetection, numOfBytesPerValue)
+	return detectEndianFormat(fileUsedForAutomaticDetection, numOfBytesPerValue)
+
+def useLayoutIndex(options, refFile, layoutIndex, readEndianFormat, numOfBytesPerValue):
+	refFile.useLayout(
+		layoutKey(readEndianFormat, numOfBytesPerValue),
+		layoutIndex.layout(refFile, readEndianFormat, numOfBytesPerValue)
+	)
+	try:
+		layoutIndex.save()
+	except (IOError, OSError) as e:
+		#read only reference directories are fine, the layout is just not cached then
+		if options.verbose:
+			sys.stderr.write("Could not store the layout index for %s: %s\n" %(refFile.path, str(e)))
 
 def run_accuracy_test_for_datfile(options, eps, epsSingle):
 	numOfBytesPerValue = int(options.bytes) if options.bytes != None else None
@@ -238,12 +103,18 @@ def run_accuracy_test_for_datfile(options, eps, epsSingle):
 	refFile = None
 	try:
 		#prepare files
-		inFile = open(str(options.inFile),'r')
+		inFile = UnformattedRecordFile(str(options.inFile))
+		archivedReference = None
 		if options.refFile != None:
-			refFile = open(str(options.refFile),'r')
+			archivedReference = referenceBytes(str(options.refFile))
+			refFile = UnformattedRecordFile(str(options.refFile), archivedReference)
 		else:
 			sys.stderr.write("WARNING: No reference file specified - doing some basic checks on the input only\n")
-		readEndianFormat = getEndianFormatString(options, numOfBytesPerValue, refFile)
+		#members of reference archives have no place for a layout index beside them
+		layoutIndex = LayoutIndex(refFile.path) if refFile != None and archivedReference is None and not options.noLayoutIndex else None
+		readEndianFormat = getEndianFormatString(options, numOfBytesPerValue, refFile, layoutIndex)
+		if layoutIndex != None:
+			useLayoutIndex(options, refFile, layoutIndex, readEndianFormat, numOfBytesPerValue)
 		sys.stderr.write("performing accuracy test with .DAT file, %s bytes per value, %s endian, float\n" %(
 			str(numOfBytesPerValue) if numOfBytesPerValue != None else "automatic",
 			readEndianFormat
@@ -256,7 +127,7 @@ def run_accuracy_test_for_datfile(options, eps, epsSingle):
 			unpackedRef = None
 			if refFile != None:
 				unpackedRef = unpackNextRecord(refFile, readEndianFormat, numOfBytesPerValue, options.verbose)
-				if unpackedRef == None:
+				if unpackedRef is None:
 					break
 				if len(unpackedRef) == 0:
 					continue
@@ -266,29 +137,29 @@ def run_accuracy_test_for_datfile(options, eps, epsSingle):
 			except(Exception), e:
 				sys.stderr.write("Error reading record %i from %s: %s\n" %(i, str(options.inFile), e))
 				sys.exit(1)
-			if not unpackedRef and not unpacked:
+			if (unpackedRef is None or len(unpackedRef) == 0) and (unpacked is None or len(unpacked) == 0):
 				break
 
-			if options.verbose and unpacked != None and unpackedRef != None:
+			if options.verbose and unpacked is not None and unpackedRef is not None:
 				sys.stderr.write("Processing record %i: %i values unpacked for record, %i values unpacked for reference.\n" %(i, len(unpacked), len(unpackedRef)))
 
-			if unpackedRef != None and (unpacked == None or len(unpacked) == 0):
-				sys.stderr.write("Error in %s: Record with length %i expected, %s found\n" %(str(options.inFile), len(unpackedRef), str(unpacked)))
+			if unpackedRef is not None and (unpacked is None or len(unpacked) == 0):
+				sys.stderr.write("Error in %s: Record with length %i expected, %s found\n" %(str(options.inFile), len(unpackedRef), recordString(unpacked)))
 				if len(unpackedRef) < 100:
-					sys.stderr.write("Expected record: %s\n" %(str(unpackedRef)))
+					sys.stderr.write("Expected record: %s\n" %(recordString(unpackedRef)))
 				sys.exit(1)
 
 			if int(options.printNum) > 0:
-				print unpacked[0:int(options.printNum)]
+				print recordString(unpacked[0:int(options.printNum)])
 			if options.verbose:
 				sys.stderr.write("Record %i unpacked, contains %i elements.\n" %(i, len(unpacked)))
 
-			if unpackedRef != None and len(unpacked) != len(unpackedRef):
+			if unpackedRef is not None and len(unpacked) != len(unpackedRef):
 				sys.stderr.write("Error in %s: Record %i does not have same length as reference. Length: %i, expected: %i\n" \
 					%(str(options.inFile), i, len(unpacked), len(unpackedRef)))
 				sys.exit(1)
 			#analyse unpacked data
-			if unpackedRef != None:
+			if unpackedRef is not None:
 				firstInvalidIndex, firstInvalidValue = checkIntegrity(unpackedRef)
 				if firstInvalidIndex != -1:
 					sys.stderr.write("%s, record %i: WARNING: Invalid Value %s in Reference at %i - cannot analyze\n" %(options.inFile, i, str(firstInvalidValue), firstInvalidIndex))
@@ -304,7 +175,7 @@ def run_accuracy_test_for_datfile(options, eps, epsSingle):
 				expectedVal = 0
 				maxErrVal = 0
 				maxErrExpectedVal = 0
-			elif unpackedRef != None:
+			elif unpackedRef is not None:
 				err, firstErr, firstErrVal, expectedVal, maxErr, maxErrVal, maxErrExpectedVal = rootMeanSquareDeviation(unpacked, unpackedRef, epsSingle)
 				if firstErr != -1 or err > eps:
 					errorState=True
@@ -333,6 +204,70 @@ def run_accuracy_test_for_datfile(options, eps, epsSingle):
 	if errorState:
 		sys.exit(1)
 
+def hyperslabs(shape, item_size, chunk_bytes):
+	'''Yields (flat offset, index tuple) of contiguous hyperslabs in C order, each holding at most chunk_bytes (but at least one element).
+	The outermost dimension is split first, inner dimensions only where a single slice along it is larger than chunk_bytes.'''
+	if len(shape) == 0:
+		yield 0, ()
+		return
+	strides = [1] * len(shape)
+	for axis in range(len(shape) - 2, -1, -1):
+		strides[axis] = strides[axis + 1] * shape[axis + 1]
+	split_axis = 0
+	while split_axis < len(shape) - 1 and strides[split_axis] * item_size > chunk_bytes:
+		split_axis += 1
+	step = max(1, chunk_bytes // (strides[split_axis] * item_size))
+	for leading in itertools.product(*[xrange(length) for length in shape[:split_axis]]):
+		leading_offset = sum(index * stride for index, stride in zip(leading, strides))
+		for start in xrange(0, shape[split_axis], step):
+			yield leading_offset + start * strides[split_axis], leading + (slice(start, min(start + step, shape[split_axis])),)
+
+def read_hyperslab(netcdf_variable, index):
+	return numpy.ma.asarray(netcdf_variable[index if len(index) > 0 else Ellipsis])
+
+def new_error_statistics():
+	return {
+		"input_sum": 0.0,
+		"input_count": 0,
+		"squared_error_sum": 0.0,
+		"squared_error_count": 0,
+		"first_nan_input": None,
+		"max_error": None,
+		"min_error": None,
+		"nonzero_reference": 0
+	}
+
+def accumulate_error_statistics(statistics, offset, in_array, ref_array):
+	#numpy.ma semantics of the whole array comparison: masked and non finite squares / errors don't count, NaN input does count for the mean
+	in_values = numpy.ma.getdata(in_array).ravel()
+	in_valid = ~numpy.ma.getmaskarray(in_array).ravel()
+	statistics["input_sum"] += float(numpy.sum(in_values[in_valid], dtype=numpy.float64))
+	statistics["input_count"] += int(numpy.count_nonzero(in_valid))
+	if statistics["first_nan_input"] == None:
+		nan_indices = numpy.flatnonzero(numpy.isnan(in_values))
+		if len(nan_indices) > 0:
+			statistics["first_nan_input"] = offset + int(nan_indices[0])
+	difference = in_array - ref_array
+	difference_values = numpy.ma.getdata(difference).ravel()
+	difference_valid = ~numpy.ma.getmaskarray(difference).ravel()
+	with numpy.errstate(over='ignore', invalid='ignore'):
+		squares = numpy.square(difference_values)
+		absolute_difference = numpy.abs(difference_values)
+	squares_valid = difference_valid & numpy.isfinite(squares)
+	statistics["squared_error_sum"] += float(numpy.sum(squares[squares_valid], dtype=numpy.float64))
+	statistics["squared_error_count"] += int(numpy.count_nonzero(squares_valid))
+	errors_valid = numpy.flatnonzero(difference_valid & numpy.isfinite(absolute_difference))
+	if len(errors_valid) > 0:
+		valid_errors = absolute_difference[errors_valid]
+		#strictly greater / smaller, so the first occurrence in C order wins like with argmax
+		local_max = int(numpy.argmax(valid_errors))
+		if statistics["max_error"] == None or valid_errors[local_max] > statistics["max_error"][0]:
+			statistics["max_error"] = (valid_errors[local_max], offset + int(errors_valid[local_max]))
+		local_min = int(numpy.argmin(valid_errors))
+		if statistics["min_error"] == None or valid_errors[local_min] < statistics["min_error"][0]:
+			statistics["min_error"] = (valid_errors[local_min], offset + int(errors_valid[local_min]))
+	statistics["nonzero_reference"] += int(numpy.count_nonzero(ref_array))
+
 def run_accuracy_test_for_netcdf(options, eps, epsSingle):
 	def pad_to(text, total_length):
 		return "%s%s" %(
@@ -340,21 +275,11 @@ def run_accuracy_test_for_netcdf(options, eps, epsSingle):
 			" " * (total_length - len(str(text))) if len(str(text)) < total_length else ""
 		)
 
-	def get_array_from_netcdf_variable(netcdf_variable):
-		num_of_dimensions = len(netcdf_variable.dimensions)
-		if num_of_dimensions == 1:
-			return netcdf_variable[:]
-		if num_of_dimensions == 2:
-			return netcdf_variable[:, :]
-		if num_of_dimensions == 3:
-			return netcdf_variable[:, :, :]
-		if num_of_dimensions == 4:
-			return netcdf_variable[:, :, :, :]
-		if num_of_dimensions == 5:
-			return netcdf_variable[:, :, :, :, :]
-
 	from netCDF4 import Dataset
-	import numpy
+	chunk_bytes = int(float(options.chunkMegabytes) * 1024 * 1024)
+	if chunk_bytes <= 0:
+		sys.stderr.write("Error: the chunk size needs to be positive\n")
+		sys.exit(1)
 	inFile = None
 	try:
 		inFile = Dataset(options.inFile)
@@ -363,7 +288,11 @@ def run_accuracy_test_for_netcdf(options, eps, epsSingle):
 		sys.exit(1)
 	refFile = None
 	try:
-		refFile = Dataset(options.refFile)
+		archived_reference = referenceBytes(options.refFile)
+		if archived_reference is not None:
+			refFile = Dataset(options.refFile, memory=archived_reference)
+		else:
+			refFile = Dataset(options.refFile)
 	except Exception as e:
 		sys.stderr.write("Error: could not read %s. Error message: %s\n" %(options.refFile, str(e)))
 		sys.exit(1)
@@ -396,18 +325,29 @@ def run_accuracy_test_for_netcdf(options, eps, epsSingle):
 				error_found = True
 				continue
 
-			#analyse NetCDF variable
-			ref_array = get_array_from_netcdf_variable(ref_variable)
-			if numpy.any(numpy.isnan(ref_array)):
-				raise Exception("NaN values present in reference array")
-			in_array = get_array_from_netcdf_variable(in_variable)
-			if options.slice:
+			#analyse NetCDF variable - streamed in hyperslabs, so the memory use is bounded by the chunk size
+			shape = tuple(in_variable.shape)
+			selection = ()
+			if options.slice and len(shape) > 1:
 				try:
-					in_array = in_array[int(options.slice)] if isinstance(in_array[0], numpy.ndarray) else in_array
-					ref_array = ref_array[int(options.slice)] if isinstance(ref_array[0], numpy.ndarray) else ref_array
-				except:
+					slice_index = int(options.slice)
+					if slice_index >= -shape[0] and slice_index < shape[0]:
+						selection = (slice_index % shape[0],)
+						shape = shape[1:]
+				except ValueError:
 					pass
-			mean_or_one = numpy.mean(in_array)
+			statistics = new_error_statistics()
+			for offset, index in hyperslabs(shape, in_variable.dtype.itemsize, chunk_bytes):
+				ref_array = read_hyperslab(ref_variable, selection + index)
+				in_array = read_hyperslab(in_variable, selection + index)
+				if numpy.any(numpy.isnan(ref_array)):
+					raise Exception("NaN values present in reference array")
+				accumulate_error_statistics(statistics, offset, in_array, ref_array)
+			in_array = None
+			ref_array = None
+
+			mean_type = in_variable.dtype.type if in_variable.dtype.kind == 'f' else numpy.float64
+			mean_or_one = mean_type(statistics["input_sum"] / statistics["input_count"]) if statistics["input_count"] > 0 else numpy.NAN
 			if abs(mean_or_one) < 1E-15:
 				mean_or_one = 1.0
 
@@ -416,50 +356,69 @@ def run_accuracy_test_for_netcdf(options, eps, epsSingle):
 			max_error_index_tuple = None
 			max_error = None
 
-			absolute_difference = numpy.abs(in_array - ref_array)
-			normalized_error = absolute_difference / mean_or_one
-			greater_than_epsilon = normalized_error > epsSingle
+			def unravel(flat_index):
+				return tuple(numpy.unravel_index(flat_index, shape)) if len(shape) > 0 else ()
+
+			def normalized_error_at(index_tuple):
+				#one element hyperslabs rather than scalars, numpy.ma masks and signs the division of 0-d arrays differently
+				element_index = tuple([slice(index, index + 1) for index in index_tuple])
+				in_value = numpy.ma.ravel(read_hyperslab(in_variable, selection + element_index))
+				ref_value = numpy.ma.ravel(read_hyperslab(ref_variable, selection + element_index))
+				return in_value[0], ref_value[0], (numpy.abs(in_value - ref_value) / mean_or_one)[0]
 
 			if int(options.index) > -1:
-				max_error_index_tuple = tuple([min(int(options.index), in_array.shape[dim] - 1) for dim in range(len(in_array.shape))])
-				max_error = normalized_error[max_error_index_tuple]
+				max_error_index_tuple = tuple([min(int(options.index), shape[dim] - 1) for dim in range(len(shape))])
+				_, _, max_error = normalized_error_at(max_error_index_tuple)
+			elif statistics["first_nan_input"] != None:
+				max_error = numpy.NAN
+				max_error_index_tuple = unravel(statistics["first_nan_input"])
 			else:
-				nan_values = numpy.isnan(in_array)
-				if numpy.any(nan_values):
-					max_error = numpy.NAN
-					max_error_index_tuple = numpy.unravel_index(numpy.argmax(numpy.isnan(in_array)), in_array.shape)
-				else:
-					max_error = numpy.argmax(normalized_error)
-					max_error_index_tuple = numpy.unravel_index(max_error, in_array.shape)
-
-			root_mean_square_deviation = numpy.sqrt(numpy.mean((in_array - ref_array)**2))
+				#errors normalized by a negative mean are largest where the absolute error is smallest
+				extreme_error = statistics["max_error"] if mean_or_one > 0 else statistics["min_error"]
+				max_error = extreme_error[1] if extreme_error != None and not math.isnan(mean_or_one) else 0
+				max_error_index_tuple = unravel(max_error)
+			greater_than_epsilon = statistics["max_error"] != None \
+				and mean_or_one > 0 \
+				and statistics["max_error"][0] / mean_or_one > epsSingle
+
+			root_mean_square_deviation = numpy.sqrt(statistics["squared_error_sum"] / statistics["squared_error_count"]) \
+				if statistics["squared_error_count"] > 0 else numpy.NAN
 			root_mean_square_deviation = root_mean_square_deviation / abs(mean_or_one)
 
 			#error found?
 			if math.isnan(root_mean_square_deviation):
 				result = "FAIL"
 				error_found = True
-			elif math.isnan(max_error) or numpy.any(greater_than_epsilon) or root_mean_square_deviation > eps:
+			elif math.isnan(max_error) or greater_than_epsilon or root_mean_square_deviation > eps:
 				result = "FAIL"
 				error_found = True
 			else:
 				result = "pass"
 
 			#print output
-			number_of_elements = numpy.prod(in_array.shape)
+			number_of_elements = numpy.prod(shape)
 			if number_of_elements <= 8 and result != "pass":
-				passed_string = "input: \n%s\nexpected:\n%s\nerrors found at:%s\n%s" %(in_array, ref_array, greater_than_epsilon, result)
+				full_index = tuple([slice(None)] * len(shape))
+				in_array = read_hyperslab(in_variable, selection + full_index)
+				ref_array = read_hyperslab(ref_variable, selection + full_index)
+				passed_string = "input: \n%s\nexpected:\n%s\nerrors found at:%s\n%s" %(
+					in_array,
+					ref_array,
+					numpy.abs(in_array - ref_array) / mean_or_one > epsSingle,
+					result
+				)
 			else:
+				in_value, ref_value, normalized_error = normalized_error_at(max_error_index_tuple)
 				passed_string = "%s: %s at: %s of: %s; val: %s; ref: %s; %s" %(
 					"Index" if int(options.index) > -1 else "MaxErr",
-					pad_to(normalized_error[max_error_index_tuple],17),
+					pad_to(normalized_error,17),
 					pad_to(max_error_index_tuple,18),
-					pad_to(in_array.shape,18),
-					pad_to(in_array[max_error_index_tuple],20),
-					pad_to(ref_array[max_error_index_tuple],20),
+					pad_to(shape,18),
+					pad_to(in_value,20),
+					pad_to(ref_value,20),
 					result
 				)
-			if numpy.count_nonzero(ref_array) == 0:
+			if statistics["nonzero_reference"] == 0:
 				passed_string += "; (WARNING:Reference is Zero Matrix!)"
 			sys.stderr.write("%s, %s-> nRMSE: %e; %s\n" %(
 				options.inFile,
@@ -474,27 +433,35 @@ def run_accuracy_test_for_netcdf(options, eps, epsSingle):
 	if error_found:
 		sys.exit(1)
 
+def run(arguments):
+	#exits with 1 if the comparison fails - callers validating several files in one interpreter catch SystemExit
+	parser = OptionParser()
+	parser.add_option("-f", "--file", dest="inFile",
+	                  help="read from FILE", metavar="FILE", default="in.dat")
+	parser.add_option("--reference", dest="refFile",
+	                  help="reference FILE, can be a member of a reference archive (e.g. ./ref.zip/ref_nx2/out.dat)", metavar="FILE", default=None)
+	parser.add_option("-b", "--bytesPerValue", dest="bytes")
+	parser.add_option("-p", "--printFirstValues", dest="printNum", default="0")
+	parser.add_option("-r", "--readEndian", dest="readEndian", default="little")
+	parser.add_option("--netcdf", action="store_true", dest="netcdf")
+	parser.add_option("--index", dest="index", default="-1")
+	parser.add_option("--slice", dest="slice", default=None)
+	parser.add_option("--chunkMegabytes", dest="chunkMegabytes", default="64",
+	                  help="NetCDF variables are compared in hyperslabs of at most this size per file (default: 64)")
+	parser.add_option("-v", action="store_true", dest="verbose")
+	parser.add_option("--noLayoutIndex", action="store_true", dest="noLayoutIndex",
+	                  help="do not read or store the record layout index of the reference file (FILE%s)" %(LAYOUT_INDEX_SUFFIX))
+	parser.add_option("-e", "--epsilon", metavar="EPS", dest="epsilon", help="Throw an error if at any point the normalized root mean square error becomes higher than EPS. Defaults to 1E-10.")
+	(options, args) = parser.parse_args(arguments)
+	eps = 1E-6
+	epsSingle = 1E-6
+	if (options.epsilon):
+		eps = float(options.epsilon)
+	if options.netcdf:
+		run_accuracy_test_for_netcdf(options, eps, epsSingle)
+	else:
+		run_accuracy_test_for_datfile(options, eps, epsSingle)
+
 ##################### MAIN ##############################
-#get all program arguments
-parser = OptionParser()
-parser.add_option("-f", "--file", dest="inFile",
-                  help="read from FILE", metavar="FILE", default="in.dat")
-parser.add_option("--reference", dest="refFile",
-                  help="reference FILE", metavar="FILE", default=None)
-parser.add_option("-b", "--bytesPerValue", dest="bytes")
-parser.add_option("-p", "--printFirstValues", dest="printNum", default="0")
-parser.add_option("-r", "--readEndian", dest="readEndian", default="little")
-parser.add_option("--netcdf", action="store_true", dest="netcdf")
-parser.add_option("--index", dest="index", default="-1")
-parser.add_option("--slice", dest="slice", default=None)
-parser.add_option("-v", action="store_true", dest="verbose")
-parser.add_option("-e", "--epsilon", metavar="EPS", dest="epsilon", help="Throw an error if at any point the normalized root mean square error becomes higher than EPS. Defaults to 1E-10.")
-(options, args) = parser.parse_args()
-eps = 1E-6
-epsSingle = 1E-6
-if (options.epsilon):
-	eps = float(options.epsilon)
-if options.netcdf:
-	run_accuracy_test_for_netcdf(options, eps, epsSingle)
-else:
-	run_accuracy_test_for_datfile(options, eps, epsSingle)
+if __name__ == "__main__":
+	run(sys.argv[1:])
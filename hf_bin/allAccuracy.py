@@ -0,0 +1,128 @@
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+# Compares all output files matching a pattern against the reference directory with accuracy.py,
+# using a pool of worker processes within one interpreter launch. Called by allAccuracy.sh,
+# which sources the pre- and postscripts around it.
+
+from optparse import OptionParser
+from StringIO import StringIO
+import os, sys, glob, shlex, traceback, multiprocessing
+import accuracy
+from referenceStore import isReferenceFile
+
+ACCURACY_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "accuracy.py")
+
+def outputPaths(outputFilePattern):
+	#like the shell: every word is a glob, a word without matches is kept as is
+	paths = []
+	for word in outputFilePattern.split():
+		matches = sorted(glob.glob(word))
+		paths += matches if len(matches) > 0 else [word]
+	return paths
+
+def validateFile(job):
+	outputPath, referencePath, accuracyArguments = job
+	capturedOutput = StringIO()
+	originalStdout, originalStderr = sys.stdout, sys.stderr
+	sys.stdout = sys.stderr = capturedOutput
+	returnCode = 0
+	try:
+		accuracy.run(["-f", outputPath, "--reference", referencePath] + accuracyArguments)
+	except SystemExit as e:
+		returnCode = e.code if isinstance(e.code, int) else (0 if e.code == None else 1)
+	except Exception:
+		capturedOutput.write(traceback.format_exc())
+		returnCode = 1
+	finally:
+		sys.stdout, sys.stderr = originalStdout, originalStderr
+	return capturedOutput.getvalue(), returnCode
+
+def validateAll(referencePath, outputFilePattern, formatArguments, numberOfJobs):
+	'''-> exit code: 1 if no output files are found, 2 if any comparison fails, otherwise 0'''
+	entries = []
+	for outputPath in outputPaths(outputFilePattern):
+		fileName = os.path.basename(outputPath)
+		refPath = "%s%s" %(referencePath, fileName)
+		if not isReferenceFile(refPath):
+			entries.append(("skipping %s (doesn't exist)\n" %(refPath), None, False))
+			continue
+		if not os.path.isfile(outputPath):
+			entries.append(("output file %s expected but not found from %s\n" %(outputPath, os.getcwd()), None, True))
+			continue
+		accuracyArguments = list(formatArguments)
+		message = ""
+		if os.path.splitext(fileName)[1] == ".nc":
+			message = "Using NetCDF module for accuracy test\n"
+			accuracyArguments.append("--netcdf")
+		entries.append((message, (outputPath, refPath, accuracyArguments), False))
+
+	jobs = [job for _, job, _ in entries if job != None]
+	pool = None
+	if numberOfJobs > 1 and len(jobs) > 1:
+		pool = multiprocessing.Pool(min(numberOfJobs, len(jobs)))
+		results = pool.imap(validateFile, jobs)
+	else:
+		results = (validateFile(job) for job in jobs)
+	errorVal = 0
+	outputFileFound = False
+	errorFound = False
+	try:
+		#results are printed in the order of the output files, each one as soon as it and its predecessors are done
+		for message, job, isError in entries:
+			sys.stderr.write(message)
+			errorFound = errorFound or isError
+			if job == None:
+				continue
+			outputPath, refPath, accuracyArguments = job
+			outputFileFound = True
+			sys.stdout.write("%s -f %s --reference \"%s\" %s\n" %(ACCURACY_SCRIPT_PATH, outputPath, refPath, " ".join(accuracyArguments)))
+			sys.stdout.flush()
+			output, returnCode = results.next()
+			sys.stderr.write(output)
+			sys.stderr.flush()
+			if errorVal == 0:
+				errorVal = returnCode
+			if returnCode != 0:
+				errorFound = True
+	finally:
+		if pool != None:
+			pool.terminate()
+	if not outputFileFound:
+		sys.stderr.write("error in allAccuracy.sh: no output files found. The program to be tested probably could not complete its run.\n")
+		return 1
+	if errorFound:
+		sys.stderr.write("an error was found when running allAccuracy.sh\n")
+		return 2
+	return errorVal
+
+##################### MAIN ##############################
+if __name__ == "__main__":
+	parser = OptionParser(usage="usage: %prog [options] REFERENCE_PATH [OUTPUT_FILE_PATTERN] [ACCURACY_OPTIONS]")
+	parser.add_option("-j", "--jobs", dest="jobs", type="int", default=multiprocessing.cpu_count(),
+	                  help="number of files compared concurrently (default: number of cores)")
+	#the accuracy options (e.g. "-b 8") follow the positional arguments
+	parser.disable_interspersed_args()
+	(options, args) = parser.parse_args()
+	if len(args) < 1:
+		parser.error("reference path expected")
+	referencePath = args[0]
+	outputFilePattern = args[1] if len(args) > 1 and args[1] != "" else "./out/*.dat"
+	formatArguments = shlex.split(args[2]) if len(args) > 2 else []
+	sys.exit(validateAll(referencePath, outputFilePattern, formatArguments, options.jobs))
@@ -18,9 +18,109 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
+# Converts Fortran unformatted sequential files between big and little endian. Records are streamed in blocks
+# from a memory map through NumPy byteswap - either into a new file or, with --inPlace, back into the input file.
+
 from optparse import OptionParser
-import struct
+import os
 import sys
+import numpy
+
+MARKER_BYTES = 4
+BLOCK_BYTES = 16 * 1024 * 1024
+
+def mappedBytes(path, mode):
+	if os.path.getsize(path) == 0:
+		#an empty file cannot be mapped
+		return numpy.zeros(0, dtype=numpy.uint8)
+	return numpy.memmap(path, dtype=numpy.uint8, mode=mode)
+
+def records(data, readEndianFormat, numOfBytesPerValue):
+	'''Yields (record number, offset of the header, record byte length) after checking header and trailer'''
+	markerType = numpy.dtype('%si4' %(readEndianFormat))
+	offset = 0
+	recordNumber = 0
+	while offset + MARKER_BYTES <= len(data):
+		recordNumber += 1
+		recordByteLength = int(data[offset:offset + MARKER_BYTES].view(markerType)[0])
+		if recordByteLength < 0 or recordByteLength % numOfBytesPerValue != 0:
+			raise Exception("Odd record length at record %i. Abort." %(recordNumber))
+		trailerOffset = offset + MARKER_BYTES + recordByteLength
+		if trailerOffset > len(data):
+			raise Exception("Could not read %i bytes at record %i. Abort." %(recordByteLength, recordNumber))
+		if trailerOffset + MARKER_BYTES > len(data):
+			raise Exception("Could not read trailer at record %i. Abort." %(recordNumber))
+		if int(data[trailerOffset:trailerOffset + MARKER_BYTES].view(markerType)[0]) != recordByteLength:
+			raise Exception("Header and trailer do not match at record %i. Abort." %(recordNumber))
+		yield recordNumber, offset, recordByteLength
+		offset = trailerOffset + MARKER_BYTES
+
+def blocks(offset, recordByteLength, numOfBytesPerValue):
+	'''Byte ranges of at most BLOCK_BYTES covering the data of one record, aligned to whole values'''
+	blockBytes = max(numOfBytesPerValue, BLOCK_BYTES - BLOCK_BYTES % numOfBytesPerValue)
+	dataOffset = offset + MARKER_BYTES
+	for start in xrange(dataOffset, dataOffset + recordByteLength, blockBytes):
+		yield start, min(start + blockBytes, dataOffset + recordByteLength)
+
+def checkRecord(data, recordNumber, offset, recordByteLength, valueType, minimum, maximum):
+	valueNumber = 0
+	for start, stop in blocks(offset, recordByteLength, valueType.itemsize):
+		values = data[start:stop].view(valueType)
+		outOfBounds = numpy.flatnonzero(~((values > minimum) & (values < maximum)))
+		if len(outOfBounds) > 0:
+			raise Exception("value %i in record %i is out of the specified bounds: %s" %(
+				valueNumber + outOfBounds[0] + 1,
+				recordNumber,
+				str(values[outOfBounds[0]])
+			))
+		valueNumber += len(values)
+
+def recordValues(data, offset, recordByteLength, valueType):
+	return data[offset + MARKER_BYTES:offset + MARKER_BYTES + recordByteLength].view(valueType)
+
+def convertToFile(data, outFile, readType, writeType, minimum, maximum, numOfRecordsToPrint, verbose):
+	markerType = numpy.dtype('%si4' %(writeType.str[0]))
+	numberOfRecords = 0
+	for recordNumber, offset, recordByteLength in records(data, readType.str[0], readType.itemsize):
+		#the whole record is checked before any of it is written, so the output only ever contains complete records
+		checkRecord(data, recordNumber, offset, recordByteLength, readType, minimum, maximum)
+		if recordNumber <= numOfRecordsToPrint:
+			print "record %i: %s" %(recordNumber, str(tuple(recordValues(data, offset, recordByteLength, readType).tolist())))
+		marker = numpy.array([recordByteLength], dtype=markerType).tostring()
+		outFile.write(marker)
+		for start, stop in blocks(offset, recordByteLength, readType.itemsize):
+			values = data[start:stop].view(readType)
+			if readType != writeType:
+				values = values.byteswap().view(writeType)
+			outFile.write(values.tostring())
+		outFile.write(marker)
+		numberOfRecords = recordNumber
+		if verbose:
+			print "record %i written, containing %i bytes" %(recordNumber, recordByteLength)
+	return numberOfRecords
+
+def convertInPlace(data, readType, writeType, minimum, maximum, numOfRecordsToPrint, verbose):
+	#everything is checked before the first byte is swapped - a failed check leaves the file untouched
+	recordList = []
+	for recordNumber, offset, recordByteLength in records(data, readType.str[0], readType.itemsize):
+		checkRecord(data, recordNumber, offset, recordByteLength, readType, minimum, maximum)
+		if recordNumber <= numOfRecordsToPrint:
+			print "record %i: %s" %(recordNumber, str(tuple(recordValues(data, offset, recordByteLength, readType).tolist())))
+		recordList.append((offset, recordByteLength))
+	if readType == writeType:
+		return len(recordList)
+	markerType = numpy.dtype('%si4' %(readType.str[0]))
+	for recordNumber, (offset, recordByteLength) in enumerate(recordList):
+		trailerOffset = offset + MARKER_BYTES + recordByteLength
+		data[offset:offset + MARKER_BYTES].view(markerType).byteswap(True)
+		for start, stop in blocks(offset, recordByteLength, readType.itemsize):
+			data[start:stop].view(readType).byteswap(True)
+		data[trailerOffset:trailerOffset + MARKER_BYTES].view(markerType).byteswap(True)
+		if verbose:
+			print "record %i converted, containing %i bytes" %(recordNumber + 1, recordByteLength)
+	if isinstance(data, numpy.memmap):
+		data.flush()
+	return len(recordList)
 
 ##################### MAIN ##############################
 #get all program arguments
@@ -37,94 +137,58 @@ parser.add_option("-b", "--bytesPerValue", dest="bytes", default="4")
 parser.add_option("-p", "--numberOfRecordsToPrint", dest="printRecords", default="0")
 parser.add_option("-r", "--readEndian", dest="readEndian", default="big")
 parser.add_option("-w", "--writeEndian", dest="writeEndian", default="little")
+parser.add_option("-i", "--inPlace", action="store_true", dest="inPlace",
+                  help="convert the input file itself instead of writing to --out")
+parser.add_option("-v", "--verbose", action="store_true", dest="verbose",
+                  help="print a line per converted record")
 (options, args) = parser.parse_args()
 
 #initialise according to input parameters
-min = eval(options.min)
-max = eval(options.max)
+minimum = eval(options.min)
+maximum = eval(options.max)
 numOfBytesPerValue = int(options.bytes)
 if (numOfBytesPerValue != 4 and numOfBytesPerValue != 8):
 	print "Unsupported number of bytes per value specified."
-	sys.exit()
+	sys.exit(1)
 readEndianFormat = '>'
 writeEndianFormat = '<'
 if (options.readEndian == "little"):
 	readEndianFormat = '<'
 if (options.writeEndian == "big"):
-	readEndianFormat = '>'
-
-typeSpecifier = 'f'
-if (numOfBytesPerValue == 8):
-	typeSpecifier = 'd'
-
+	writeEndianFormat = '>'
+typeSpecifier = 'f8' if numOfBytesPerValue == 8 else 'f4'
+readType = numpy.dtype('%s%s' %(readEndianFormat, typeSpecifier))
+writeType = numpy.dtype('%s%s' %(writeEndianFormat, typeSpecifier))
 numOfRecordsToPrint = int(options.printRecords)
 
-i = 0
+numberOfRecords = 0
 try:
-	#prepare files
-	inFile = open(str(options.inFile),'r')
-	outFile = open(str(options.outFile),'w')
-
-	printedRecords = 0
-	while True:
-		header = inFile.read(4)
-		if (len(header) != 4):
-			#we have reached the end of the file
-			break
-		i = i + 1
-		print "preparing record %i" %(i)
-		headerFormat = '%si' %(readEndianFormat)
-		headerUnpacked = struct.unpack(headerFormat, header)
-		recordByteLength = headerUnpacked[0]
-		if (recordByteLength % numOfBytesPerValue != 0):
-			print "Odd record length at record %i. Abort." %(i)
-			sys.exit()
-		print "record byte length: %i" %(recordByteLength)
-		recordLength = recordByteLength / numOfBytesPerValue
-		print "record length: %i" %(recordLength)
-
-		data = inFile.read(recordByteLength)
-		if (len(data) != recordByteLength):
-			print "Could not read %i bytes at record %i. Abort." %(recordByteLength, i)
-			sys.exit()
-
-		dataFormat = '%s%i%s' %(readEndianFormat, recordLength, typeSpecifier)
-		unpacked = struct.unpack(dataFormat, data)
-
-		#analyse unpacked data (to make sure we have read something useful). Print some values if specified.
-		if (printedRecords < numOfRecordsToPrint):
-			print "record %i: %s" %(i, unpacked)
-		j = 0
-		for val in unpacked:
-			j = j + 1
-			if (val > min and val < max):
-				continue
-			else:
-				print "value %i in record %i is out of the specified bounds: %d" %(j, i, val)
-				sys.exit()
-
-		trailer = inFile.read(4)
-		if (len(trailer) != 4):
-			print "Could not read trailer at record %i. Abort." %(i)
-			sys.exit()
-		trailerUnpacked = struct.unpack(headerFormat, trailer)
-		redundantRecordLength = trailerUnpacked[0]
-		if (recordByteLength != redundantRecordLength):
-			print "Header and trailer do not match at record %i. Abort." %(i)
-			sys.exit()
-
-		repackedRecordFormat = '%si%i%si' %(writeEndianFormat, recordLength, typeSpecifier)
-		print "write format: %s" %(repackedRecordFormat)
-		unpackedWithHeaderAndTrailer = (recordByteLength,) + unpacked + (recordByteLength,)
-		repacked = struct.pack(repackedRecordFormat, *unpackedWithHeaderAndTrailer)
-		outFile.write(repacked)
-		print "record %i written, containing %i bytes" %(i, redundantRecordLength)
-
-finally:
-	print "number of records read: %i" %(i)
-	#cleanup
-	inFile.close()
-	outFile.close()
-
-
-
+	if options.inPlace:
+		numberOfRecords = convertInPlace(
+			mappedBytes(str(options.inFile), 'r+'),
+			readType,
+			writeType,
+			minimum,
+			maximum,
+			numOfRecordsToPrint,
+			options.verbose
+		)
+	else:
+		outFile = open(str(options.outFile), 'wb', BLOCK_BYTES)
+		try:
+			numberOfRecords = convertToFile(
+				mappedBytes(str(options.inFile), 'r'),
+				outFile,
+				readType,
+				writeType,
+				minimum,
+				maximum,
+				numOfRecordsToPrint,
+				options.verbose
+			)
+		finally:
+			outFile.close()
+except Exception as e:
+	print str(e)
+	sys.exit(1)
+print "number of records converted: %i" %(numberOfRecords)
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+# Generates one Make rule per object file from the 'use' and 'module' statements of the given sources,
+# such that 'make -j' can compile independent modules concurrently. Can be used as AUTO_DEPENDENCY_GENERATOR_SCRIPT:
+#   AUTO_DEPENDENCY_GENERATOR_SCRIPT=python ${HF_DIR}/hf_bin/fortran_dependencies.py
+#   AUTO_DEPENDENCY_GENERATOR_OUTPUT_PATH=dependencies.mk
+
+import os
+import sys
+from object_files_ordered import create_file_objs, file_objs_to_mod_dict, get_depends
+
+def object_name(file_name, build=''):
+    return os.path.join(build, os.path.splitext(os.path.basename(file_name))[0] + ".o")
+
+def dependency_graph(files, macros={}):
+    "Return {file name: set of file names it depends on}, without self dependencies"
+    file_objs = create_file_objs(files, macros)
+    depends = get_depends(fob=file_objs, m2f=file_objs_to_mod_dict(file_objs=file_objs))
+    return dict(
+        (file_name, set(dependency for dependency in dependencies if dependency != file_name))
+        for file_name, dependencies in depends.items()
+    )
+
+def make_rules(graph, build=''):
+    lines = ["# generated by fortran_dependencies.py - one rule per object file, derived from use / module statements"]
+    for file_name in sorted(graph.keys(), key=lambda f: object_name(f)):
+        dependencies = sorted(object_name(dependency, build) for dependency in graph[file_name])
+        if len(dependencies) == 0:
+            continue
+        lines.append("%s: %s" %(object_name(file_name, build), " ".join(dependencies)))
+    return "\n".join(lines) + "\n"
+
+def levels_and_critical_path(graph, cost_by_file):
+    "Longest path through the DAG (weighted by cost_by_file) and the level of each file (files of one level can be compiled concurrently)"
+    dependants = dict((file_name, set()) for file_name in graph)
+    for file_name, dependencies in graph.items():
+        for dependency in dependencies:
+            dependants[dependency].add(file_name)
+    remaining_dependencies = dict((file_name, len(dependencies)) for file_name, dependencies in graph.items())
+    ready = [file_name for file_name, count in remaining_dependencies.items() if count == 0]
+    finish_time_by_file = {}
+    predecessor_by_file = {}
+    level_by_file = {}
+    processed = 0
+    while ready:
+        file_name = ready.pop()
+        processed += 1
+        start_time = 0
+        level = 0
+        for dependency in graph[file_name]:
+            if finish_time_by_file[dependency] > start_time:
+                start_time = finish_time_by_file[dependency]
+                predecessor_by_file[file_name] = dependency
+            level = max(level, level_by_file[dependency] + 1)
+        finish_time_by_file[file_name] = start_time + cost_by_file[file_name]
+        level_by_file[file_name] = level
+        for dependant in dependants[file_name]:
+            remaining_dependencies[dependant] -= 1
+            if remaining_dependencies[dependant] == 0:
+                ready.append(dependant)
+    if processed < len(graph):
+        cyclic = sorted(file_name for file_name, count in remaining_dependencies.items() if count > 0)
+        raise Exception("circular module dependencies between %s" %(", ".join(cyclic)))
+    if len(finish_time_by_file) == 0:
+        return {}, [], 0
+    last_file = max(finish_time_by_file.keys(), key=lambda f: (finish_time_by_file[f], f))
+    critical_path = [last_file]
+    while critical_path[-1] in predecessor_by_file:
+        critical_path.append(predecessor_by_file[critical_path[-1]])
+    critical_path.reverse()
+    return level_by_file, critical_path, finish_time_by_file[last_file]
+
+def report(graph, cost_by_file, unit):
+    level_by_file, critical_path, critical_path_cost = levels_and_critical_path(graph, cost_by_file)
+    files_by_level = {}
+    for file_name, level in level_by_file.items():
+        files_by_level.setdefault(level, []).append(file_name)
+    width = max(len(files) for files in files_by_level.values()) if files_by_level else 0
+    total_cost = sum(cost_by_file.values())
+    lines = [
+        "objects: %i, levels: %i, maximum width: %i" %(len(graph), len(files_by_level), width),
+        "critical path (%i objects, %s %s of %s %s in total): %s" %(
+            len(critical_path),
+            critical_path_cost,
+            unit,
+            total_cost,
+            unit,
+            " -> ".join(object_name(file_name) for file_name in critical_path)
+        ),
+        "best achievable parallel speedup: %.2f" %(float(total_cost) / critical_path_cost if critical_path_cost > 0 else 1.0)
+    ]
+    for level in sorted(files_by_level.keys()):
+        lines.append("level %i: %s" %(level, " ".join(sorted(object_name(file_name) for file_name in files_by_level[level]))))
+    return "\n".join(lines) + "\n"
+
+def line_count(file_name):
+    with open(file_name, 'r') as f:
+        return sum(1 for _ in f)
+
+#Script
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate per object Make dependencies for Fortran sources')
+    parser.add_argument('files', nargs='*', help='sources to analyse (default: all Fortran sources in the current directory)')
+    parser.add_argument('-b','--build',nargs=1,help='Build Directory (prepended to all files in output',
+                        default='')
+    parser.add_argument('-r','--report',action='store_true',
+                        help='print the critical path and the width of the module DAG to standard error')
+    parser.add_argument('-l','--weight-by-lines',action='store_true',
+                        help='use the line count of each source as compile cost for the report instead of one unit per object')
+    args = parser.parse_args()
+    build = args.build[0] if args.build else ''
+
+    try:
+        graph = dependency_graph(args.files if args.files else None)
+        sys.stdout.write(make_rules(graph, build))
+        if args.report:
+            if args.weight_by_lines:
+                cost_by_file, unit = dict((file_name, line_count(file_name)) for file_name in graph), "lines"
+            else:
+                cost_by_file, unit = dict((file_name, 1) for file_name in graph), "objects"
+            sys.stderr.write(report(graph, cost_by_file, unit))
+    except Exception as e:
+        sys.stderr.write("Error when generating Fortran dependencies: %s\n" %(str(e)))
+        sys.exit(1)
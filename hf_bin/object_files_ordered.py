@@ -27,8 +27,13 @@
 
 import os
 import re
+import json
 import collections
 
+USE_PATTERN = re.compile("^\s*use\s*(?P<moduse>\w*)\s*(,)?\s*(only)?\s*(:)?.*?$",re.IGNORECASE)
+MODULE_PATTERN = re.compile("^\s*module\s*(?P<modname>\w*)",re.IGNORECASE)
+DEFAULT_CACHE_PATH = ".fortran_dependencies_cache.json"
+
 class OrderedSet(collections.MutableSet):
 
     def __init__(self, iterable=None):
@@ -87,62 +92,44 @@ class OrderedSet(collections.MutableSet):
             return len(self) == len(other) and list(self) == list(other)
         return set(self) == set(other)
 
-def makeTree(deps_as_dict_of_lists):
-    def getDeps(cur_file):
-        return deps_as_dict_of_lists.get(cur_file, [])
-
-    deps = {}
-    cur_files = [(fname,deps) for fname in deps_as_dict_of_lists.keys()]
-    all_deps = {}
-    while cur_files:
-        cur_file, cur_deps = cur_files.pop()
-        if cur_file in all_deps:
-            cur_deps[cur_file] = all_deps[cur_file]
+def topologically_sorted(deps_as_dict_of_lists):
+    """Return all files such that every file comes after the files it depends on.
+    Iterative depth first search with sets - circular dependencies are broken at the first file seen twice on the current path."""
+    ordered = []
+    done = set()
+    for root in sorted(deps_as_dict_of_lists.keys()):
+        if root in done:
             continue
-        new_deps = {}
-        # getDeps returns the dependencies needed by cur_file.
-        for dep in getDeps(cur_file):
-            cur_files.append((dep,new_deps))
-        cur_deps[cur_file] = new_deps
-        all_deps[cur_file] = new_deps
-    return deps
-
-def _walkTree(tree,cur_files,walked_files):
-    def iterate(node):
-        if isinstance(node, dict):
-            return node.items()
-        else:
-            return
-
-    #inspired by http://code.activestate.com/lists/python-list/407341/
-    for cur_file, cur_deps in tree.items():
-        if cur_file in walked_files:
-            continue
-        elif cur_file in cur_files:
-            # Deal with circular deps here. You might just do:
-            raise StopIteration
-            # raise ValueError, "Circular tree structure: %s" %(cur_file)
-        if cur_deps:
-            for sub_file in _walkTree(cur_deps,cur_files+(cur_file,),walked_files):
-                yield sub_file
-        walked_files.append(cur_file)
-        yield cur_file
-
-def walkTree(tree):
-    """Walk a tree as generated by makeTree."""
-    for f in _walkTree(tree,(),[]):
-        yield f
+        on_path = set([root])
+        stack = [(root, iter(sorted(deps_as_dict_of_lists.get(root, []))))]
+        while stack:
+            cur_file, remaining_deps = stack[-1]
+            for dep in remaining_deps:
+                if dep in done or dep in on_path:
+                    continue
+                on_path.add(dep)
+                stack.append((dep, iter(sorted(deps_as_dict_of_lists.get(dep, [])))))
+                break
+            else:
+                stack.pop()
+                on_path.discard(cur_file)
+                done.add(cur_file)
+                ordered.append(cur_file)
+    return ordered
 
 def change_extension(file, build='', ext=".o"):
     return os.path.join(build, file.split(".")[0]) +ext
 
 #Definitions
-def run(verbose=True, build=''):
-    l=create_file_objs()
+def run(verbose=True, build='', cache_path=DEFAULT_CACHE_PATH):
+    cache = ScanCache(cache_path) if cache_path else None
+    l=create_file_objs(cache=cache)
+    if cache:
+        cache.save()
     mod2fil=file_objs_to_mod_dict(file_objs=l)
     depends=get_depends(fob=l,m2f=mod2fil)
 
-    objFilesOrdered = OrderedSet([change_extension(f, build) for f in walkTree(makeTree(depends))])
+    objFilesOrdered = OrderedSet([change_extension(f, build) for f in topologically_sorted(depends)])
     print " ".join(objFilesOrdered)
 
 def get_source(ext=[".f90",".F90",".h90",".H90",".P90"]):
@@ -153,7 +140,64 @@ def get_source(ext=[".f90",".F90",".h90",".H90",".P90"]):
         fil.extend(filter(lambda x: x.endswith(i),tmp))
     return fil
 
-def create_file_objs(files=None, macros={}):
+class ScanCache(object):
+    "Scan results by path, valid as long as mtime and size of the file are unchanged. Stored as JSON between invocations."
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.is_modified = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                self.entries = {} #corrupt cache -> rescan everything
+
+    def scanned(self, infile):
+        status = os.stat(infile)
+        key = os.path.abspath(infile)
+        entry = self.entries.get(key)
+        if entry and entry[0] == status.st_mtime and entry[1] == status.st_size:
+            return entry[2], entry[3]
+        uses, contains = scan_file(infile)
+        self.entries[key] = [status.st_mtime, status.st_size, uses, contains]
+        self.is_modified = True
+        return uses, contains
+
+    def save(self):
+        if not self.is_modified:
+            return
+        temporary_path = self.path + ".temp"
+        with open(temporary_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.rename(temporary_path, self.path)
+        self.is_modified = False
+
+def scan_file(infile):
+    "Read infile once, return (used modules, contained modules) without duplicates"
+    uses=set()
+    contains=set()
+    with open(infile,'r') as f:
+        for line in f:
+            tmp=USE_PATTERN.match(line)
+            if tmp:
+                uses.add(tmp.group('moduse').strip())
+                continue
+            tmp=MODULE_PATTERN.match(line)
+            if tmp:
+                contains.add(tmp.group('modname').strip())
+    return sorted(uses), sorted(contains)
+
+def expand_macros(mods, macros={}):
+    uniq_mods = list(mods)
+    for i, mod in enumerate(uniq_mods):
+        for k, v in macros.items():
+            if re.match(k, mod, re.IGNORECASE):
+                uniq_mods[i] = mod.replace(k,v)
+    return uniq_mods
+
+def create_file_objs(files=None, macros={}, cache=None):
     l=[]
 
     if files is None:
@@ -162,9 +206,10 @@ def create_file_objs(files=None, macros={}):
     for i in files:
         source_file = file_obj()
 
+        uses, contains = cache.scanned(i) if cache else scan_file(i)
         source_file.file_name = i
-        source_file.uses = get_uses(i,macros)
-        source_file.contains = get_contains(i)
+        source_file.uses = expand_macros(uses, macros)
+        source_file.contains = contains
 
         l.append(source_file)
 
@@ -172,44 +217,11 @@ def create_file_objs(files=None, macros={}):
 
 def get_uses(infile=None, macros={}):
     "Return which modules are used in infile after expanding macros"
-    p=re.compile("^\s*use\s*(?P<moduse>\w*)\s*(,)?\s*(only)?\s*(:)?.*?$",re.IGNORECASE).match
-
-    uses=[]
-
-    with open(infile,'r') as f:
-        t=f.readlines()
-
-    for i in t:
-        tmp=p(i)
-        if tmp:
-            uses.append(tmp.group('moduse').strip())
-
-    # Remove duplicates
-    uniq_mods = list(set(uses))
-
-    for i, mod in enumerate(uniq_mods):
-        for k, v in macros.items():
-            if re.match(k, mod, re.IGNORECASE):
-                uniq_mods[i] = mod.replace(k,v)
-
-    return uniq_mods
+    return expand_macros(scan_file(infile)[0], macros)
 
 def get_contains(infile=None):
     "Return all the modules that are in infile"
-    p=re.compile("^\s*module\s*(?P<modname>\w*)",re.IGNORECASE).match
-
-    contains=[]
-
-    with open(infile,'r') as f:
-        t=f.readlines()
-
-    for i in t:
-        tmp=p(i)
-        if tmp:
-            contains.append(tmp.group('modname').strip())
-
-    # Remove duplicates before returning
-    return list(set(contains))
+    return scan_file(infile)[1]
 
 def file_objs_to_mod_dict(file_objs=[]):
     "Turn a list of file_objs in a dictionary, containing which modules depend on which files"
@@ -251,9 +263,12 @@ if __name__ == "__main__":
     parser.add_argument('-b','--build',nargs=1,help='Build Directory (prepended to all files in output',
                         default='')
     parser.add_argument('-v','--verbose',action='store_true',help='explain what is done')
+    parser.add_argument('-c','--cache',nargs=1,help='file to cache the scan results in (default: %s)' %(DEFAULT_CACHE_PATH),
+                        default=[DEFAULT_CACHE_PATH])
+    parser.add_argument('--no-cache',action='store_true',help='rescan every file')
 
     # Parse the command line arguments
     args = parser.parse_args()
     build = args.build[0] if args.build else ''
 
-    run(verbose=args.verbose, build=build)
+    run(verbose=args.verbose, build=build, cache_path=None if args.no_cache else args.cache[0])
@@ -0,0 +1,381 @@
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+# Performance database: stores the timing output of test runs together with host, thread count, architecture
+# and configuration in SQLite. The test runners record into it if HF_PERFORMANCE_DATABASE is set, runs are
+# grouped by HF_PERFORMANCE_LABEL (e.g. a revision).
+#
+# usage: performanceDatabase.py record -d DB -x EXECUTABLE -a ARCH [...] < timing output
+#        performanceDatabase.py list -d DB
+#        performanceDatabase.py compare -d DB --baseline LABEL [--candidate LABEL]
+#           (exit code 2 if a group is significantly slower than in the baseline)
+#        performanceDatabase.py table -d DB [--label LABEL]
+#           (speedup table in the format of results/Overview.md)
+
+from optparse import OptionParser
+import os, re, sys, math, time, socket, sqlite3, platform, multiprocessing
+
+SCHEMA = [
+	"""create table if not exists runs (
+		id integer primary key autoincrement,
+		timestamp real not null,
+		label text not null,
+		example text not null,
+		executable text not null,
+		architecture text not null,
+		configuration text not null,
+		parameters text not null,
+		threads integer,
+		host text,
+		processor text,
+		cpuCount integer,
+		platform text,
+		passed integer,
+		timingOutput text not null
+	)""",
+	"""create table if not exists timings (
+		runId integer not null references runs(id),
+		metricIndex integer not null,
+		value real not null,
+		primary key (runId, metricIndex)
+	)""",
+	"create index if not exists runsByLabel on runs (label, example, architecture)"
+]
+GROUP_COLUMNS = ["example", "executable", "architecture", "configuration", "parameters", "threads"]
+NUMBER_PATTERN = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+DATABASE_TIMEOUT_SECONDS = 60
+
+def openDatabase(path):
+	#concurrent test runs record into the same file -> wait for the lock instead of failing
+	connection = sqlite3.connect(path, timeout=DATABASE_TIMEOUT_SECONDS)
+	for statement in SCHEMA:
+		connection.execute(statement)
+	connection.commit()
+	return connection
+
+def parseTimings(timingOutput):
+	'''-> all numbers in the timing output, in order (e.g. the comma separated counters of the examples)'''
+	return [float(match) for match in NUMBER_PATTERN.findall(timingOutput)]
+
+def processorName():
+	try:
+		cpuInfo = open("/proc/cpuinfo", "r")
+		try:
+			for line in cpuInfo:
+				if line.startswith("model name"):
+					return line.split(":", 1)[1].strip()
+		finally:
+			cpuInfo.close()
+	except IOError:
+		pass
+	return platform.processor()
+
+def hostInfo():
+	return {
+		"host": socket.gethostname(),
+		"processor": processorName(),
+		"cpuCount": multiprocessing.cpu_count(),
+		"platform": platform.platform()
+	}
+
+def recordRun(connection, run):
+	'''run: dict with the columns of the runs table (except id), host info and timestamp are filled in if missing'''
+	entry = dict(hostInfo())
+	entry["timestamp"] = time.time()
+	entry["label"] = ""
+	entry["configuration"] = ""
+	entry["parameters"] = ""
+	entry.update(run)
+	entry["example"] = entry.get("example") or entry["executable"]
+	columns = sorted(entry.keys())
+	cursor = connection.execute(
+		"insert into runs (%s) values (%s)" %(", ".join(columns), ", ".join("?" for _ in columns)),
+		[entry[column] for column in columns]
+	)
+	runId = cursor.lastrowid
+	connection.executemany(
+		"insert into timings (runId, metricIndex, value) values (?, ?, ?)",
+		[(runId, index, value) for index, value in enumerate(parseTimings(entry["timingOutput"]))]
+	)
+	connection.commit()
+	return runId
+
+def recordRunIn(databasePath, run):
+	connection = openDatabase(databasePath)
+	try:
+		return recordRun(connection, run)
+	finally:
+		connection.close()
+
+def samplesByGroup(connection, label, metricIndex):
+	'''-> {(example, executable, architecture, configuration, parameters, threads): [metric values of passed runs]}'''
+	result = {}
+	rows = connection.execute(
+		"select %s, timings.value from runs join timings on timings.runId = runs.id "
+		"where runs.label = ? and timings.metricIndex = ? and (runs.passed is null or runs.passed != 0) "
+		"order by runs.id" %(", ".join("runs.%s" %(column) for column in GROUP_COLUMNS)),
+		(label, metricIndex)
+	)
+	for row in rows:
+		result.setdefault(tuple(row[:-1]), []).append(row[-1])
+	return result
+
+def latestLabel(connection, excludedLabel=None):
+	if excludedLabel != None:
+		row = connection.execute("select label from runs where label != ? order by id desc limit 1", (excludedLabel,)).fetchone()
+	else:
+		row = connection.execute("select label from runs order by id desc limit 1").fetchone()
+	return row[0] if row != None else None
+
+def meanAndVariance(samples):
+	mean = sum(samples) / float(len(samples))
+	variance = sum((sample - mean) ** 2 for sample in samples) / float(len(samples) - 1) if len(samples) > 1 else 0.0
+	return mean, variance
+
+def continuedFractionForIncompleteBeta(a, b, x):
+	#modified Lentz's method, see Numerical Recipes 6.4
+	tiny = 1E-300
+	c = 1.0
+	d = 1.0 - (a + b) * x / (a + 1.0)
+	d = 1.0 / (d if abs(d) > tiny else tiny)
+	result = d
+	for m in range(1, 300):
+		m2 = 2 * m
+		for numerator in [
+			m * (b - m) * x / ((a + m2 - 1.0) * (a + m2)),
+			-(a + m) * (a + b + m) * x / ((a + m2) * (a + m2 + 1.0))
+		]:
+			d = 1.0 + numerator * d
+			d = 1.0 / (d if abs(d) > tiny else tiny)
+			c = 1.0 + numerator / c
+			c = c if abs(c) > tiny else tiny
+			result *= d * c
+		if abs(d * c - 1.0) < 1E-12:
+			break
+	return result
+
+def regularizedIncompleteBeta(a, b, x):
+	if x <= 0.0:
+		return 0.0
+	if x >= 1.0:
+		return 1.0
+	logFront = math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x)
+	if x < (a + 1.0) / (a + b + 2.0):
+		return math.exp(logFront) * continuedFractionForIncompleteBeta(a, b, x) / a
+	return 1.0 - math.exp(logFront) * continuedFractionForIncompleteBeta(b, a, 1.0 - x) / b
+
+def slowdownPValue(baselineSamples, candidateSamples):
+	'''One sided Welch t-test -> probability to see this slowdown (or a larger one) if the means were equal.
+	None if there are not enough samples.'''
+	if len(baselineSamples) < 2 or len(candidateSamples) < 2:
+		return None
+	baselineMean, baselineVariance = meanAndVariance(baselineSamples)
+	candidateMean, candidateVariance = meanAndVariance(candidateSamples)
+	baselineError = baselineVariance / len(baselineSamples)
+	candidateError = candidateVariance / len(candidateSamples)
+	standardError = math.sqrt(baselineError + candidateError)
+	if standardError == 0.0:
+		return 0.0 if candidateMean > baselineMean else 1.0
+	t = (candidateMean - baselineMean) / standardError
+	degreesOfFreedom = (baselineError + candidateError) ** 2 / (
+		baselineError ** 2 / (len(baselineSamples) - 1) + candidateError ** 2 / (len(candidateSamples) - 1)
+	)
+	tail = 0.5 * regularizedIncompleteBeta(degreesOfFreedom / 2.0, 0.5, degreesOfFreedom / (degreesOfFreedom + t * t))
+	return tail if t > 0 else 1.0 - tail
+
+def groupName(group):
+	example, executable, architecture, configuration, parameters, threads = group
+	return "%s/%s %s %s%s threads=%s" %(
+		example, executable, architecture, configuration, " (%s)" %(parameters.strip()) if parameters.strip() else "", threads
+	)
+
+def compare(connection, baselineLabel, candidateLabel, metricIndex, threshold, alpha, output):
+	'''-> list of regressed groups'''
+	baseline = samplesByGroup(connection, baselineLabel, metricIndex)
+	candidate = samplesByGroup(connection, candidateLabel, metricIndex)
+	regressions = []
+	output.write("%-70s %12s %12s %8s %10s\n" %("group", "baseline", "candidate", "ratio", "p"))
+	for group in sorted(set(baseline.keys()) & set(candidate.keys())):
+		baselineMean = meanAndVariance(baseline[group])[0]
+		candidateMean = meanAndVariance(candidate[group])[0]
+		ratio = candidateMean / baselineMean if baselineMean > 0 else None
+		pValue = slowdownPValue(baseline[group], candidate[group])
+		isRegression = ratio != None and ratio > 1.0 + threshold and pValue != None and pValue < alpha
+		if isRegression:
+			regressions.append(group)
+		output.write("%-70s %12.5e %12.5e %8s %10s%s\n" %(
+			groupName(group),
+			baselineMean,
+			candidateMean,
+			"%.3f" %(ratio) if ratio != None else "-",
+			"%.4f" %(pValue) if pValue != None else "n/a",
+			"  REGRESSION" if isRegression else ""
+		))
+	for group in sorted(set(baseline.keys()) - set(candidate.keys())):
+		output.write("%-70s only in baseline\n" %(groupName(group)))
+	for group in sorted(set(candidate.keys()) - set(baseline.keys())):
+		output.write("%-70s only in candidate\n" %(groupName(group)))
+	return regressions
+
+def speedupTable(connection, label, metricIndex):
+	'''Speedups per example and parameter set in the format of results/Overview.md:
+	multi threaded CPU vs. single threaded CPU, GPU vs. multi threaded CPU and GPU vs. single threaded CPU'''
+	meansByRow = {}
+	for group, samples in samplesByGroup(connection, label, metricIndex).items():
+		example, _, architecture, _, parameters, threads = group
+		rowName = "%s (%s)" %(example, parameters.strip()) if parameters.strip() else example
+		meansByRow.setdefault(rowName, {}).setdefault((architecture, threads), []).append(meanAndVariance(samples)[0])
+	maximumThreads = max([
+		threads for means in meansByRow.values() for (architecture, threads) in means.keys()
+		if architecture == "cpu" and threads != None
+	] or [1])
+
+	def timeOf(means, architecture, threads=None):
+		values = [
+			value for (entryArchitecture, entryThreads), entryValues in means.items() for value in entryValues
+			if entryArchitecture == architecture and (threads == None or entryThreads == threads)
+		]
+		return sum(values) / len(values) if len(values) > 0 else None
+
+	def speedup(slowerTime, fasterTime):
+		if slowerTime == None or fasterTime == None or fasterTime <= 0:
+			return "-"
+		return "%.2fx" %(slowerTime / fasterTime)
+
+	lines = [
+		"<table>",
+		"    <tr>",
+		"        <th>Name</th>",
+		"        <th>Speedup HF on %i Core vs. 1 Core</th>" %(maximumThreads),
+		"        <th>Speedup HF on GPU vs %i Core</th>" %(maximumThreads),
+		"        <th>Speedup HF on GPU vs 1 Core</th>",
+		"    </tr>"
+	]
+	for rowName in sorted(meansByRow.keys()):
+		means = meansByRow[rowName]
+		singleCoreTime = timeOf(means, "cpu", 1)
+		multiCoreTime = timeOf(means, "cpu", maximumThreads)
+		gpuTime = timeOf(means, "gpu")
+		lines += [
+			"    <tr>",
+			"        <td>%s</td>" %(rowName),
+			"        <td>%s</td>" %(speedup(singleCoreTime, multiCoreTime)),
+			"        <td>%s</td>" %(speedup(multiCoreTime, gpuTime)),
+			"        <td>%s</td>" %(speedup(singleCoreTime, gpuTime)),
+			"    </tr>"
+		]
+	lines.append("</table>")
+	hosts = connection.execute(
+		"select distinct architecture, host, processor from runs where label = ? order by architecture, host", (label,)
+	).fetchall()
+	lines += [
+		"",
+		"Label '%s', metric %i of the timing output, mean over all passed runs. Hosts: %s" %(
+			label,
+			metricIndex,
+			"; ".join("%s on %s (%s)" %(architecture, host, processor) for architecture, host, processor in hosts)
+		)
+	]
+	return "\n".join(lines) + "\n"
+
+##################### MAIN ##############################
+if __name__ == "__main__":
+	parser = OptionParser(usage="usage: %prog record|list|compare|table [options]")
+	parser.add_option("-d", "--database", dest="database", default=os.environ.get("HF_PERFORMANCE_DATABASE"),
+	                  help="SQLite database FILE (default: $HF_PERFORMANCE_DATABASE)", metavar="FILE")
+	parser.add_option("-l", "--label", dest="label", default=os.environ.get("HF_PERFORMANCE_LABEL", ""),
+	                  help="record: label of the run (default: $HF_PERFORMANCE_LABEL); table: label to tabulate (default: the latest)")
+	parser.add_option("-x", "--executable", dest="executable", help="record: name of the executable")
+	parser.add_option("-e", "--example", dest="example", help="record: name of the example / test (default: the executable)")
+	parser.add_option("-a", "--architecture", dest="architecture", help="record: architecture (implementation) that has been run, e.g. cpu or gpu")
+	parser.add_option("-c", "--configuration", dest="configuration", default="", help="record: test configuration, e.g. validation")
+	parser.add_option("-p", "--parameters", dest="parameters", default="", help="record: command line parameters of the run")
+	parser.add_option("-t", "--threads", dest="threads", type="int",
+	                  help="record: number of threads (default: $OMP_NUM_THREADS if set)")
+	parser.add_option("--passed", dest="passed", type="int", help="record: 1 if the validation has passed, 0 if it has failed")
+	parser.add_option("--timing", dest="timing", help="record: timing output of the run (default: read from standard input)")
+	parser.add_option("-b", "--baseline", dest="baseline", help="compare: label of the baseline runs")
+	parser.add_option("--candidate", dest="candidate", help="compare: label of the runs to check (default: the latest other label)")
+	parser.add_option("-m", "--metricIndex", dest="metricIndex", type="int", default=0,
+	                  help="which number of the timing output to compare, counting from 0 (default: 0)")
+	parser.add_option("--threshold", dest="threshold", type="float", default=0.05,
+	                  help="compare: relative slowdown that needs to be exceeded to count as regression (default: 0.05)")
+	parser.add_option("--alpha", dest="alpha", type="float", default=0.05,
+	                  help="compare: significance level of the one sided Welch t-test (default: 0.05)")
+	(options, args) = parser.parse_args()
+	if len(args) != 1 or args[0] not in ["record", "list", "compare", "table"]:
+		parser.error("one of the commands record, list, compare or table expected")
+	if not options.database:
+		parser.error("please specify the database with -d or HF_PERFORMANCE_DATABASE")
+	command = args[0]
+	try:
+		connection = openDatabase(options.database)
+		try:
+			if command == "record":
+				if not options.executable or not options.architecture:
+					parser.error("record needs the executable and the architecture")
+				threads = options.threads
+				if threads == None and os.environ.get("OMP_NUM_THREADS", "").isdigit():
+					threads = int(os.environ["OMP_NUM_THREADS"])
+				recordRun(connection, {
+					"label": options.label,
+					"example": options.example,
+					"executable": options.executable,
+					"architecture": options.architecture,
+					"configuration": options.configuration,
+					"parameters": options.parameters.strip(),
+					"threads": threads,
+					"passed": options.passed,
+					"timingOutput": options.timing if options.timing != None else sys.stdin.read()
+				})
+			elif command == "list":
+				rows = connection.execute(
+					"select label, count(*), min(timestamp), max(timestamp) from runs group by label order by min(id)"
+				).fetchall()
+				for label, count, firstTimestamp, lastTimestamp in rows:
+					sys.stdout.write("%-30s %6i runs  %s - %s\n" %(
+						"'%s'" %(label),
+						count,
+						time.strftime("%Y-%m-%d %H:%M", time.localtime(firstTimestamp)),
+						time.strftime("%Y-%m-%d %H:%M", time.localtime(lastTimestamp))
+					))
+			elif command == "compare":
+				if options.baseline == None:
+					parser.error("compare needs the baseline label")
+				candidate = options.candidate if options.candidate != None else latestLabel(connection, options.baseline)
+				if candidate == None:
+					raise Exception("no runs found to compare against the baseline '%s'" %(options.baseline))
+				sys.stdout.write("comparing '%s' against baseline '%s', metric %i\n" %(candidate, options.baseline, options.metricIndex))
+				regressions = compare(connection, options.baseline, candidate, options.metricIndex, options.threshold, options.alpha, sys.stdout)
+				if len(regressions) > 0:
+					sys.stderr.write("%i group(s) significantly slower than the baseline by more than %i%%\n" %(
+						len(regressions),
+						int(options.threshold * 100)
+					))
+					sys.exit(2)
+			elif command == "table":
+				label = options.label if options.label else latestLabel(connection)
+				if label == None:
+					raise Exception("the database is empty")
+				sys.stdout.write(speedupTable(connection, label, options.metricIndex))
+		finally:
+			connection.close()
+	except Exception as e:
+		sys.stderr.write("Error in performance database: %s\n" %(str(e)))
+		sys.exit(1)
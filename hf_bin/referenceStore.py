@@ -0,0 +1,247 @@
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+# Reference data store: a zip archive (ref.zip) holding the ref_<parameters>/ directories of a test.
+# The central directory indexes every member and each member is compressed on its own, so the accuracy
+# tests read single reference files straight from the archive - there is no extraction step.
+# Members are addressed as ARCHIVE/MEMBER, e.g. ./ref.zip/ref_nx2/out.dat. Only small members are
+# compressed and inflated into memory. NetCDF files and large members are stored uncompressed and
+# memory mapped from the archive, so the comparisons only page in what they read.
+#
+# usage: referenceStore.py --create ref.zip ref.tar.gz     (or reference directories instead of the tar.gz)
+#        referenceStore.py --list ref.zip
+#        referenceStore.py --contains ref.zip ref_nx2/    (exit code 0 if the directory is part of the archive)
+
+from optparse import OptionParser
+import os, sys, zlib, struct, shutil, tarfile, zipfile, tempfile
+import numpy
+from unformattedRecords import LAYOUT_INDEX_SUFFIX
+
+ARCHIVE_SUFFIX = ".zip"
+#larger members are always stored uncompressed
+MAXIMUM_COMPRESSED_MEMBER_BYTES = 4 * 1024 * 1024
+#members that do not shrink below this ratio are stored uncompressed as well
+MAXIMUM_COMPRESSION_RATIO = 0.9
+#NetCDF classic, 64 bit offset, CDF-5 and HDF5 based NetCDF-4; these are opened as a whole from memory
+NETCDF_MAGIC_NUMBERS = ["CDF\x01", "CDF\x02", "CDF\x05", "\x89HDF"]
+COPY_BUFFER_BYTES = 16 * 1024 * 1024
+
+def splitArchivePath(path):
+	'''-> (archive path, member name) if the path points into a reference archive, otherwise (None, path)'''
+	if os.path.exists(path):
+		return None, path
+	parts = path.split("/")
+	for index in range(len(parts) - 1):
+		candidate = "/".join(parts[:index + 1])
+		if candidate.endswith(ARCHIVE_SUFFIX) and os.path.isfile(candidate):
+			return candidate, "/".join(part for part in parts[index + 1:] if part not in ["", "."])
+	return None, path
+
+class ReferenceStore(object):
+	def __init__(self, archivePath):
+		self.archivePath = archivePath
+		self.archive = zipfile.ZipFile(archivePath, "r")
+		self.infoByName = dict((info.filename, info) for info in self.archive.infolist())
+		self.directories = set()
+		for name in self.infoByName:
+			parts = name.split("/")
+			for index in range(1, len(parts)):
+				self.directories.add("/".join(parts[:index]) + "/")
+
+	def close(self):
+		self.archive.close()
+
+	def hasMember(self, memberName):
+		return memberName in self.infoByName
+
+	def hasDirectory(self, directoryName):
+		directoryName = "/".join(part for part in directoryName.split("/") if part not in ["", "."]) + "/"
+		return directoryName in self.directories
+
+	def dataOffset(self, info):
+		#the local header can carry a different extra field than the central directory -> read its lengths
+		archiveFile = open(self.archivePath, "rb")
+		try:
+			archiveFile.seek(info.header_offset)
+			header = archiveFile.read(zipfile.sizeFileHeader)
+		finally:
+			archiveFile.close()
+		fields = struct.unpack(zipfile.structFileHeader, header)
+		return info.header_offset + zipfile.sizeFileHeader + fields[zipfile._FH_FILENAME_LENGTH] + fields[zipfile._FH_EXTRA_FIELD_LENGTH]
+
+	def memberBytes(self, memberName):
+		'''-> the member's content as read only uint8 array'''
+		info = self.infoByName.get(memberName)
+		if info == None:
+			raise Exception("%s is not part of the reference archive %s" %(memberName, self.archivePath))
+		if info.file_size == 0:
+			return numpy.zeros(0, dtype=numpy.uint8)
+		if info.compress_type == zipfile.ZIP_STORED:
+			return numpy.memmap(self.archivePath, dtype=numpy.uint8, mode="r", offset=self.dataOffset(info), shape=(info.file_size,))
+		if info.file_size <= MAXIMUM_COMPRESSED_MEMBER_BYTES:
+			return numpy.frombuffer(self.archive.read(memberName), dtype=numpy.uint8)
+		#large compressed members (from archives not created by this script) are inflated chunk by chunk
+		#into an anonymous temporary file, which is memory mapped like a stored member
+		member = self.archive.open(memberName)
+		temporaryFile = tempfile.TemporaryFile()
+		try:
+			shutil.copyfileobj(member, temporaryFile, COPY_BUFFER_BYTES)
+			temporaryFile.flush()
+			return numpy.memmap(temporaryFile, dtype=numpy.uint8, mode="r", shape=(info.file_size,))
+		finally:
+			temporaryFile.close()
+			member.close()
+
+openStoresByPath = {}
+
+def openStore(archivePath):
+	#the central directory is read once per process, no matter how many members are compared
+	key = os.path.abspath(archivePath)
+	status = os.stat(archivePath)
+	cached = openStoresByPath.get(key)
+	if cached != None and cached[0] == (status.st_size, status.st_mtime):
+		return cached[1]
+	store = ReferenceStore(archivePath)
+	openStoresByPath[key] = ((status.st_size, status.st_mtime), store)
+	return store
+
+def isReferenceFile(path):
+	archivePath, memberName = splitArchivePath(path)
+	if archivePath == None:
+		return os.path.isfile(path)
+	return openStore(archivePath).hasMember(memberName)
+
+def isReferenceDirectory(path):
+	archivePath, memberName = splitArchivePath(path)
+	if archivePath == None:
+		return os.path.exists(path)
+	return openStore(archivePath).hasDirectory(memberName)
+
+def referenceBytes(path):
+	'''-> content of an archive member as uint8 array, None for paths outside of reference archives'''
+	archivePath, memberName = splitArchivePath(path)
+	if archivePath == None:
+		return None
+	return openStore(archivePath).memberBytes(memberName)
+
+def compressionType(content):
+	if len(content) == 0 or len(content) > MAXIMUM_COMPRESSED_MEMBER_BYTES:
+		return zipfile.ZIP_STORED
+	if any(content.startswith(magicNumber) for magicNumber in NETCDF_MAGIC_NUMBERS):
+		return zipfile.ZIP_STORED
+	compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+	compressedLength = len(compressor.compress(content)) + len(compressor.flush())
+	if compressedLength < MAXIMUM_COMPRESSION_RATIO * len(content):
+		return zipfile.ZIP_DEFLATED
+	return zipfile.ZIP_STORED
+
+def addMember(archive, memberName, sourcePath):
+	#layout indices are tied to the mtime of a file on disk, for archive members they are useless
+	if memberName.endswith(LAYOUT_INDEX_SUFFIX):
+		return
+	sourceFile = open(sourcePath, "rb")
+	try:
+		#one byte more than a compressed member may have - enough to decide
+		content = sourceFile.read(MAXIMUM_COMPRESSED_MEMBER_BYTES + 1)
+	finally:
+		sourceFile.close()
+	archive.write(sourcePath, memberName, compressionType(content))
+
+def memberName(path):
+	return "/".join(part for part in path.split("/") if part not in ["", "."])
+
+def addTarArchive(archive, tarPath):
+	tarArchive = tarfile.open(tarPath, "r:*")
+	try:
+		for tarInfo in tarArchive:
+			if not tarInfo.isfile():
+				continue
+			#one member at a time is unpacked to a temporary file, the zip is written from there
+			temporaryFile = tempfile.NamedTemporaryFile(delete=False)
+			try:
+				try:
+					shutil.copyfileobj(tarArchive.extractfile(tarInfo), temporaryFile, COPY_BUFFER_BYTES)
+				finally:
+					temporaryFile.close()
+				addMember(archive, memberName(tarInfo.name), temporaryFile.name)
+			finally:
+				os.remove(temporaryFile.name)
+	finally:
+		tarArchive.close()
+
+def addDirectory(archive, directoryPath):
+	parentPath = os.path.dirname(os.path.normpath(directoryPath))
+	for dirPath, dirNames, fileNames in os.walk(directoryPath):
+		dirNames.sort()
+		for fileName in sorted(fileNames):
+			path = os.path.join(dirPath, fileName)
+			addMember(archive, memberName(os.path.relpath(path, parentPath or ".")), path)
+
+def createStore(archivePath, sourcePaths):
+	temporaryPath = archivePath + ".temp"
+	archive = zipfile.ZipFile(temporaryPath, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+	try:
+		try:
+			for sourcePath in sourcePaths:
+				if os.path.isdir(sourcePath):
+					addDirectory(archive, sourcePath)
+				elif tarfile.is_tarfile(sourcePath):
+					addTarArchive(archive, sourcePath)
+				else:
+					raise Exception("%s is neither a reference directory nor a tar archive" %(sourcePath))
+		finally:
+			archive.close()
+		os.rename(temporaryPath, archivePath)
+	except Exception:
+		if os.path.exists(temporaryPath):
+			os.remove(temporaryPath)
+		raise
+
+##################### MAIN ##############################
+if __name__ == "__main__":
+	parser = OptionParser(usage="usage: %prog --create ARCHIVE SOURCE... | --list ARCHIVE | --contains ARCHIVE DIRECTORY")
+	parser.add_option("-c", "--create", dest="create", metavar="ARCHIVE",
+	                  help="create ARCHIVE from the given reference tar archives (e.g. ref.tar.gz) or reference directories")
+	parser.add_option("-l", "--list", dest="list", metavar="ARCHIVE",
+	                  help="list the members of ARCHIVE with their size and compression")
+	parser.add_option("--contains", dest="contains", metavar="ARCHIVE",
+	                  help="exit with 0 if the reference directory given as argument is part of ARCHIVE, otherwise with 1")
+	(options, args) = parser.parse_args()
+	try:
+		if options.create:
+			if len(args) == 0:
+				parser.error("reference sources expected")
+			createStore(options.create, args)
+		elif options.list:
+			for info in openStore(options.list).archive.infolist():
+				sys.stdout.write("%s %i %i %s\n" %(
+					info.filename,
+					info.file_size,
+					info.compress_size,
+					"deflated" if info.compress_type == zipfile.ZIP_DEFLATED else "stored"
+				))
+		elif options.contains:
+			if len(args) != 1:
+				parser.error("reference directory expected")
+			sys.exit(0 if openStore(options.contains).hasDirectory(args[0]) else 1)
+		else:
+			parser.error("one of --create, --list or --contains expected")
+	except Exception as e:
+		sys.stderr.write("Error in reference store: %s\n" %(str(e)))
+		sys.exit(2)
@@ -0,0 +1,639 @@
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+# Runs the tests of several executables for one configuration, by default "validation". This is the only
+# implementation of the test flow - runTest.sh and runTests.sh call it. All parameter sets run concurrently,
+# each one in its own working directory inside the test directory: the entries of the test directory (the
+# executable, its inputs and the reference data) are symlinked there, the output directories are its own.
+# Output and logs are written in the order of the executables and their parameter sets, as if the runs had
+# happened one after another, and the output files of the last reported run are moved to the test directory.
+# Every run occupies a number of CPU slots and gets as many OpenMP threads.
+
+from optparse import OptionParser
+import os, sys, glob, time, heapq, fnmatch, shutil, signal, tarfile, tempfile, threading, subprocess, multiprocessing
+from referenceStore import isReferenceDirectory
+from performanceDatabase import recordRunIn
+
+DEFAULT_CONFIGURATION_NAME = "validation"
+NUMBER_OF_TAIL_LINES = 30
+WORKING_DIR_PREFIX = ".hf_run_"
+LOG_FILE_NAMES = ["log.txt", "log_lastRun.txt"]
+SECONDS_TO_WAIT_FOR_ABORTED_RUNS = 10
+
+#executables sharing a test directory must not extract their reference archives at the same time
+extractionLock = threading.Lock()
+
+def parameterSets(configurationName, testDir):
+	'''-> (list of (argument string, reference postfix), message about the config file)'''
+	configFile = "./testConfig_%s.txt" %(configurationName)
+	configFileParams = "./testConfigParams_%s.txt" %(configurationName)
+	if os.path.exists(os.path.join(testDir, configFileParams)):
+		paramsFile = open(os.path.join(testDir, configFileParams), "r")
+		try:
+			lines = paramsFile.read().split("\n")
+		finally:
+			paramsFile.close()
+		if lines[-1] == "":
+			lines = lines[:-1]
+		return [(line, "_" + "_".join(line.split())) for line in lines], "paramater config file %s found\n" %(configFileParams)
+	if os.path.exists(os.path.join(testDir, configFile)):
+		#each line holds pairs of argument name and value
+		configFileHandle = open(os.path.join(testDir, configFile), "r")
+		try:
+			lines = configFileHandle.read().splitlines()
+		finally:
+			configFileHandle.close()
+		sets = []
+		for line in lines:
+			words = line.split()
+			if len(words) % 2 != 0:
+				raise Exception("Error reading %s: arguments without value." %(configFile))
+			pairs = zip(words[0::2], words[1::2])
+			sets.append((
+				"".join(" -%s %s" %(name, value) for name, value in pairs),
+				"".join("_%s%s" %(name, value) for name, value in pairs)
+			))
+		return sets, "config file %s found\n" %(configFile)
+	return [("", "")], "no config file found (%s or %s) - starting executable without command line parameters\n" %(configFileParams, configFile)
+
+def numberOfRuns(executables, configurationName):
+	result = 0
+	for executable in executables:
+		try:
+			result += len(parameterSets(configurationName, os.path.dirname(executable) or ".")[0])
+		except Exception:
+			#reported when the tests of this executable are started
+			result += 1
+	return result
+
+def tail(path, numberOfLines):
+	logFile = open(path, "r")
+	try:
+		lines = logFile.readlines()
+	finally:
+		logFile.close()
+	return "".join(lines[-numberOfLines:])
+
+def appendFile(sourcePath, targetPath):
+	sourceFile = open(sourcePath, "r")
+	targetFile = open(targetPath, "a")
+	try:
+		shutil.copyfileobj(sourceFile, targetFile)
+	finally:
+		targetFile.close()
+		sourceFile.close()
+
+def writeOutput(output):
+	for stream, text in output:
+		stream.write(text)
+		stream.flush()
+
+class SlotBudget(object):
+	'''Slots are handed out in the order of the runs' priorities, such that the runs reported first also finish first.'''
+	def __init__(self, numberOfSlots):
+		self.available = numberOfSlots
+		self.waitingPriorities = []
+		self.condition = threading.Condition()
+
+	def acquire(self, numberOfSlots, priority):
+		self.condition.acquire()
+		try:
+			heapq.heappush(self.waitingPriorities, priority)
+			while self.available < numberOfSlots or self.waitingPriorities[0] != priority:
+				self.condition.wait()
+			heapq.heappop(self.waitingPriorities)
+			self.available -= numberOfSlots
+			self.condition.notifyAll()
+		finally:
+			self.condition.release()
+
+	def release(self, numberOfSlots):
+		self.condition.acquire()
+		try:
+			self.available += numberOfSlots
+			self.condition.notifyAll()
+		finally:
+			self.condition.release()
+
+class ParameterSetRun(object):
+	'''One parameter set of an executable, run in its own thread and working directory.'''
+	def __init__(self, tests, index, argumentString, refPath):
+		self.tests = tests
+		self.index = index
+		self.argumentString = argumentString
+		self.refPath = refPath
+		self.workingDir = None
+		self.output = []
+		self.returnCode = None
+		self.appendsLog = False
+		self.timingRecord = None
+		self.aborted = False
+		self.process = None
+		self.processLock = threading.Lock()
+		self.slotsAcquired = threading.Event()
+		self.done = threading.Event()
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+
+	def write(self, stream, text):
+		self.output.append((stream, text))
+
+	def path(self, relativePath):
+		return os.path.join(self.workingDir, relativePath)
+
+	def acquireSlots(self):
+		#queues up only after the preceding parameter set, the slot budget then keeps the order
+		if self.index > 0:
+			self.tests.runs[self.index - 1].slotsAcquired.wait()
+		try:
+			self.tests.slotBudget.acquire(self.tests.threadsPerRun, (self.tests.index, self.index))
+		finally:
+			self.slotsAcquired.set()
+
+	def start(self):
+		self.thread.start()
+
+	def run(self):
+		try:
+			self.createWorkingDir()
+			self.returnCode = self.runInWorkingDir()
+		except Exception as e:
+			self.write(sys.stderr, "%s\n" %(str(e)))
+			self.returnCode = 1
+		finally:
+			if self.returnCode != 0:
+				#the runs after a failed one are not reported
+				self.tests.abortRunsAfter(self.index)
+			self.slotsAcquired.set()
+			self.done.set()
+
+	def abort(self):
+		with self.processLock:
+			self.aborted = True
+			if self.process != None and self.process.poll() == None:
+				#the process group includes the children, e.g. the python pool started by allAccuracy.sh
+				try:
+					os.killpg(self.process.pid, signal.SIGTERM)
+				except OSError:
+					pass
+
+	def call(self, commandLine, stdout, stderr, environment):
+		with self.processLock:
+			if self.aborted:
+				raise Exception("test run of %s aborted" %(self.tests.executableName))
+			self.process = subprocess.Popen(
+				commandLine,
+				cwd=self.workingDir,
+				stdout=stdout,
+				stderr=stderr,
+				env=environment,
+				preexec_fn=os.setpgrp
+			)
+		#waits for the process to exit - no fixed delays
+		output, _ = self.process.communicate()
+		return output, self.process.returncode
+
+	def createWorkingDir(self):
+		testDir = os.path.abspath(self.tests.testDir)
+		self.workingDir = tempfile.mkdtemp(
+			prefix="%s%s_%i_" %(WORKING_DIR_PREFIX, self.tests.executableName, self.index),
+			dir=testDir
+		)
+		for entry in os.listdir(testDir):
+			if entry.startswith(WORKING_DIR_PREFIX) or entry in LOG_FILE_NAMES or self.tests.isOutputEntry(entry):
+				continue
+			os.symlink(os.path.join(testDir, entry), self.path(entry))
+		for outputDir in self.tests.outputDirs():
+			if not os.path.isdir(self.path(outputDir)):
+				os.makedirs(self.path(outputDir))
+
+	def runInWorkingDir(self):
+		tests = self.tests
+		argString = "%s %s" %(tests.architecture, self.argumentString)
+		lastRunPath = self.path("log_lastRun.txt")
+		self.acquireSlots()
+		try:
+			if tests.configurationName == "valgrind" and tests.isBinaryExecutable():
+				return self.runValgrind(argString, lastRunPath)
+			self.write(sys.stdout, "calling %s in %s ( with parameters %s ) for %s ," %(
+				tests.executableName, tests.workingDir(), argString, tests.configurationName
+			))
+			if os.environ.get("HF_RUN_OVER_SSH"):
+				commandLine = ["ssh", os.environ["HF_RUN_OVER_SSH"], "cd %s && OMP_NUM_THREADS=%i ./%s" %(
+					self.workingDir, tests.threadsPerRun, tests.executableName
+				)] + argString.split()
+			else:
+				commandLine = ["./%s" %(tests.executableName)] + argString.split()
+			lastRunLog = open(lastRunPath, "w")
+			try:
+				timingResult, returnCode = self.call(commandLine, subprocess.PIPE, lastRunLog, tests.environment)
+			finally:
+				lastRunLog.close()
+			timingResult = timingResult.rstrip("\n")
+			if returnCode != 0:
+				self.write(sys.stdout, "fail\n")
+				self.write(sys.stdout, "Profiled program has returned error code %i. The error output of the last failed run have been logged in 'log_lastRun.txt' in the %s test directory.\n" %(
+					returnCode, tests.executableName
+				))
+				self.writeFailedRun(timingResult, lastRunPath)
+				return returnCode
+			fatalErrors = [line for line in open(lastRunPath, "r").readlines() if "fatal error" in line.lower()]
+			if len(fatalErrors) > 0:
+				self.write(sys.stdout, "".join(fatalErrors))
+				self.write(sys.stdout, "fail\n")
+				self.write(sys.stdout, "Profiled program has logged a fatal error. The error output of the last failed run have been logged in 'log_lastRun.txt' in the %s test directory.\n" %(
+					tests.executableName
+				))
+				self.writeFailedRun(timingResult, lastRunPath)
+				return 102
+			self.appendsLog = True
+			if tests.configurationName != "validation" or not isReferenceDirectory(self.path(self.refPath)):
+				self.write(sys.stdout, "%s\n" %(timingResult))
+				self.timingRecord = (self.argumentString, timingResult, None)
+				return 0
+			accuracyScript = "%s/hf_bin/allAccuracy.sh" %(os.environ.get("HF_DIR", ""))
+			lastRunLog = open(lastRunPath, "a")
+			try:
+				lastRunLog.write("running %s \"%s\" \"%s\" \"%s\" \"%s\" \"%s\"\n" %(
+					accuracyScript, self.refPath, tests.outputFilePattern, tests.sourceBefore, tests.sourceAfter, tests.formatParam
+				))
+				lastRunLog.flush()
+				_, returnCode = self.call(
+					[accuracyScript, self.refPath, tests.outputFilePattern, tests.sourceBefore, tests.sourceAfter, tests.formatParam],
+					lastRunLog,
+					subprocess.STDOUT,
+					tests.environment
+				)
+			finally:
+				lastRunLog.close()
+		finally:
+			tests.slotBudget.release(tests.threadsPerRun)
+		self.write(sys.stdout, "%s,%s\n" %(timingResult, "pass" if returnCode == 0 else "fail"))
+		self.timingRecord = (self.argumentString, timingResult, returnCode == 0)
+		if returnCode != 0:
+			self.write(sys.stdout, "fail\n")
+			self.write(sys.stdout, "The output of the last failed validation has been logged in 'log_lastRun.txt' in the %s test directory.\n" %(
+				tests.executableName
+			))
+			self.writeTail(lastRunPath)
+			return 1
+		return 0
+
+	def runValgrind(self, argString, lastRunPath):
+		self.write(sys.stdout, "valgrind with parameters%s," %(argString))
+		devNull = open(os.devnull, "w")
+		try:
+			self.call(
+				[
+					"valgrind",
+					"--log-file=./log_lastRun.txt",
+					"--suppressions=%s/hf_config/valgrind_errors.supp" %(os.environ.get("HF_DIR", "")),
+					"./%s" %(self.tests.executableName)
+				] + argString.split(),
+				devNull,
+				devNull,
+				self.tests.environment
+			)
+		finally:
+			devNull.close()
+		if not os.path.exists(lastRunPath):
+			open(lastRunPath, "w").close()
+		logLines = open(lastRunPath, "r").readlines()
+		if any("Unrecognised instruction" in line for line in logLines):
+			self.write(sys.stdout, "fail\n")
+			self.write(sys.stdout, "Error trying to execute valgrind: Program code not compatible. Please make sure to only apply the valgrind test to CPU code that has been compiled with debugging parameters (e.g. 'make build_cpu DEBUG=1')\n")
+			self.appendsLog = True
+			return 1
+		summaries = [line.split() for line in logLines if "ERROR SUMMARY" in line]
+		if len(summaries) > 0 and len(summaries[-1]) > 3 and summaries[-1][3] == "0":
+			self.write(sys.stdout, "pass\n")
+			return 0
+		self.write(sys.stdout, "fail\n")
+		self.write(sys.stdout, "The output of the last failed run have been logged in 'log_lastRun.txt'\n")
+		self.writeTail(lastRunPath)
+		self.appendsLog = True
+		return 1
+
+	def writeTail(self, lastRunPath):
+		self.write(sys.stdout, "--------------------- output of tail log_lastRun.txt -----------------------------\n")
+		self.write(sys.stdout, tail(lastRunPath, NUMBER_OF_TAIL_LINES))
+		self.write(sys.stdout, "----------------------------------------------------------------------------------\n")
+
+	def writeFailedRun(self, timingResult, lastRunPath):
+		self.write(sys.stdout, "stdout: %s\n" %(timingResult))
+		self.writeTail(lastRunPath)
+		self.appendsLog = True
+
+	def removeWorkingDir(self):
+		if self.workingDir != None:
+			shutil.rmtree(self.workingDir, ignore_errors=True)
+
+class ExecutableTests(object):
+	'''All parameter sets of one executable. Prepared in its own thread, finished by the main thread.'''
+	def __init__(self, index, executable, arguments, slotBudget, threadsPerRun, abortEvent):
+		self.index = index
+		self.testDir = os.path.dirname(executable) or "."
+		self.executableName = os.path.basename(executable)
+		self.configurationName = arguments["configurationName"]
+		self.architecture = arguments["architecture"]
+		self.outputFilePattern = arguments["outputFilePattern"] or "./out/*.dat"
+		self.sourceBefore = arguments["sourceBefore"]
+		self.sourceAfter = arguments["sourceAfter"]
+		self.formatParam = arguments["formatParam"]
+		self.slotBudget = slotBudget
+		self.threadsPerRun = threadsPerRun
+		self.abortEvent = abortEvent
+		self.environment = dict(os.environ)
+		self.environment["OMP_NUM_THREADS"] = str(threadsPerRun)
+		#the accuracy tests of concurrent runs share the same slots
+		self.environment.setdefault("HF_ACCURACY_JOBS", str(threadsPerRun))
+		self.header = ""
+		self.output = []
+		self.runs = []
+		self.runsLock = threading.Lock()
+		self.returnCode = None
+		self.done = threading.Event()
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+
+	def write(self, stream, text):
+		self.output.append((stream, text))
+
+	def path(self, relativePath):
+		return os.path.join(self.testDir, relativePath)
+
+	def workingDir(self):
+		return os.path.abspath(self.testDir)
+
+	def outputDirs(self):
+		return sorted(set(
+			os.path.normpath(os.path.dirname(word))
+			for word in self.outputFilePattern.split()
+			if os.path.normpath(os.path.dirname(word)) != "."
+		))
+
+	def isOutputEntry(self, entry):
+		'''-> True for entries of the test directory that each run needs to have on its own'''
+		for word in self.outputFilePattern.split():
+			outputDir = os.path.normpath(os.path.dirname(word))
+			if outputDir == "." and fnmatch.fnmatch(entry, os.path.basename(word)):
+				return True
+			if outputDir != "." and outputDir.split(os.sep)[0] == entry:
+				return True
+		return False
+
+	def isBinaryExecutable(self):
+		devNull = open(os.devnull, "w")
+		try:
+			fileProcess = subprocess.Popen(["file", self.path(self.executableName)], stdout=subprocess.PIPE, stderr=devNull)
+			description, _ = fileProcess.communicate()
+		except OSError:
+			return False
+		finally:
+			devNull.close()
+		return "executable" in description.lower()
+
+	def referenceArchivePath(self, fileName):
+		#the archive in the test directory takes precedence over the one in HF_REFERENCE_OUTPUT_DIR
+		if os.path.exists(self.path(fileName)):
+			return "./%s" %(fileName)
+		archivePath = "%s/%s.%s" %(os.environ.get("HF_REFERENCE_OUTPUT_DIR", ""), self.executableName, fileName)
+		if os.path.exists(archivePath):
+			return archivePath
+		return None
+
+	def referencePath(self, refPostfix):
+		'''-> path of the reference directory as seen from the working directories; extracts ref.tar.gz if needed'''
+		refPath = "./ref%s/" %(refPostfix)
+		if self.configurationName != "validation" or os.path.exists(self.path(refPath)):
+			return refPath
+		storePath = self.referenceArchivePath("ref.zip")
+		if storePath != None:
+			#the reference files are read straight from the store, nothing is extracted
+			if not isReferenceDirectory(self.path("%s/ref%s/" %(storePath, refPostfix))):
+				raise Exception("Error with %s tests: Reference data directory ./ref%s/ not part of the reference data in %s" %(
+					self.configurationName,
+					refPostfix,
+					storePath
+				))
+			return "%s/ref%s/" %(storePath, refPostfix)
+		archivePath = self.referenceArchivePath("ref.tar.gz")
+		if archivePath == None:
+			return refPath
+		with extractionLock:
+			if not os.path.exists(self.path(refPath)):
+				self.write(sys.stdout, "extracting reference data from %s\n" %(archivePath))
+				archive = tarfile.open(self.path(archivePath), "r:gz")
+				try:
+					archive.extractall(self.testDir)
+				finally:
+					archive.close()
+		if not os.path.exists(self.path(refPath)):
+			raise Exception("Error with %s tests: Reference data directory %s not part of the reference data in ./ref.tar.gz" %(
+				self.configurationName,
+				refPath
+			))
+		return refPath
+
+	def start(self):
+		self.thread.start()
+
+	def run(self):
+		try:
+			if not self.abortEvent.is_set():
+				self.startRuns()
+			for run in list(self.runs):
+				run.thread.join()
+		except Exception as e:
+			self.write(sys.stderr, "%s\n" %(str(e)))
+			self.returnCode = 1
+		finally:
+			self.done.set()
+
+	def startRuns(self):
+		self.header = "------- testing %s for %s on %s ; %s in %s ; output pattern: %s -------\n" %(
+			self.executableName,
+			self.configurationName,
+			self.architecture,
+			time.strftime("%a %b %d %H:%M:%S %Z %Y"),
+			self.workingDir(),
+			self.outputFilePattern
+		)
+		self.write(sys.stderr, self.header)
+		sets, configMessage = parameterSets(self.configurationName, self.testDir)
+		self.write(sys.stderr, configMessage)
+		executablePath = self.path(self.executableName)
+		try:
+			os.chmod(executablePath, os.stat(executablePath).st_mode | 0111)
+		except OSError as e:
+			raise Exception("error when trying to chmod %s in %s: %s" %(self.executableName, self.workingDir(), str(e)))
+		#all reference data is in place before the working directories link to it
+		refPaths = [self.referencePath(refPostfix) for _, refPostfix in sets]
+		with self.runsLock:
+			if self.abortEvent.is_set():
+				return
+			self.runs = [
+				ParameterSetRun(self, index, argumentString, refPaths[index])
+				for index, (argumentString, _) in enumerate(sets)
+			]
+		for run in self.runs:
+			run.start()
+
+	def abortRunsAfter(self, index):
+		with self.runsLock:
+			runs = list(self.runs[index + 1:])
+		for run in runs:
+			run.abort()
+
+	def abort(self):
+		with self.runsLock:
+			runs = list(self.runs)
+		for run in runs:
+			run.abort()
+
+	def finish(self):
+		'''Called by the main thread once done: writes output and logs, moves the output files of the last reported run
+		to the test directory. -> return code'''
+		logFile = open(self.path("log.txt"), "a")
+		try:
+			logFile.write(self.header)
+		finally:
+			logFile.close()
+		writeOutput(self.output)
+		if self.returnCode != None:
+			return self.returnCode
+		lastRun = None
+		for run in self.runs:
+			writeOutput(run.output)
+			if run.appendsLog:
+				appendFile(run.path("log_lastRun.txt"), self.path("log.txt"))
+			if run.timingRecord != None:
+				self.recordTiming(*run.timingRecord)
+			lastRun = run
+			if run.returnCode != 0:
+				break
+		if lastRun == None:
+			return 0
+		self.moveOutputFiles(lastRun)
+		return lastRun.returnCode
+
+	def moveOutputFiles(self, run):
+		for word in self.outputFilePattern.split():
+			for path in glob.glob(self.path(word)):
+				if os.path.isdir(path) and not os.path.islink(path):
+					shutil.rmtree(path)
+				else:
+					os.remove(path)
+		for outputDir in self.outputDirs():
+			if not os.path.isdir(self.path(outputDir)):
+				os.makedirs(self.path(outputDir))
+		for word in self.outputFilePattern.split():
+			for path in glob.glob(run.path(word)):
+				shutil.move(path, self.path(os.path.relpath(path, run.workingDir)))
+		if os.path.exists(run.path("log_lastRun.txt")):
+			shutil.copyfile(run.path("log_lastRun.txt"), self.path("log_lastRun.txt"))
+
+	def recordTiming(self, argumentString, timingResult, passed):
+		databasePath = os.environ.get("HF_PERFORMANCE_DATABASE")
+		if not databasePath:
+			return
+		try:
+			recordRunIn(databasePath, {
+				"label": os.environ.get("HF_PERFORMANCE_LABEL", ""),
+				"example": os.path.basename(self.workingDir()),
+				"executable": self.executableName,
+				"architecture": self.architecture,
+				"configuration": self.configurationName,
+				"parameters": argumentString.strip(),
+				"threads": self.threadsPerRun,
+				"passed": passed,
+				"timingOutput": timingResult
+			})
+		except Exception as e:
+			#a broken database doesn't invalidate the test
+			sys.stderr.write("could not record the timing in %s: %s\n" %(databasePath, str(e)))
+
+	def removeWorkingDirs(self):
+		for run in self.runs:
+			run.removeWorkingDir()
+
+def runTests(executables, arguments, numberOfSlots, threadsPerRun):
+	'''-> return code of the first failed executable (in the given order), otherwise 0'''
+	abortEvent = threading.Event()
+	slotBudget = SlotBudget(numberOfSlots)
+	allTests = [
+		ExecutableTests(index, executable, arguments, slotBudget, threadsPerRun, abortEvent)
+		for index, executable in enumerate(executables)
+	]
+	for tests in allTests:
+		tests.start()
+	try:
+		for tests in allTests:
+			#Event.wait without timeout can't be interrupted by Ctrl-C in Python 2
+			while not tests.done.wait(1):
+				pass
+			returnCode = tests.finish()
+			if returnCode != 0:
+				return returnCode
+	finally:
+		abortEvent.set()
+		for tests in allTests:
+			tests.abort()
+		for tests in allTests:
+			tests.done.wait(SECONDS_TO_WAIT_FOR_ABORTED_RUNS)
+			tests.removeWorkingDirs()
+	return 0
+
+def exitOnSignal(signalNumber, frame):
+	#lets the finally blocks abort the running tests
+	sys.exit(128 + signalNumber)
+
+##################### MAIN ##############################
+if __name__ == "__main__":
+	parser = OptionParser(usage="usage: %prog [options] EXECUTABLES ARCHITECTURE [OUTPUT_FILE_PATTERN] [SOURCE_BEFORE] [SOURCE_AFTER] [FORMAT_PARAM]")
+	parser.add_option("-c", "--configuration", dest="configurationName", default=DEFAULT_CONFIGURATION_NAME,
+	                  help="postfix of the testConfig_*.txt / testConfigParams_*.txt files to use (default: %default)")
+	parser.add_option("-s", "--slots", dest="slots", type="int", default=multiprocessing.cpu_count(),
+	                  help="number of CPU slots shared by all concurrent runs (default: number of cores)")
+	parser.add_option("-t", "--threadsPerRun", dest="threadsPerRun", type="int",
+	                  help="CPU slots and OMP_NUM_THREADS of each run (default: the slots divided by the number of runs; all slots for gpu, such that only one run uses the device at a time)")
+	parser.disable_interspersed_args()
+	(options, args) = parser.parse_args()
+	if len(args) < 2:
+		parser.error("executables and architecture expected")
+	executables = args[0].split()
+	arguments = {
+		"configurationName": options.configurationName,
+		"architecture": args[1],
+		"outputFilePattern": args[2] if len(args) > 2 else "",
+		"sourceBefore": args[3] if len(args) > 3 else "",
+		"sourceAfter": args[4] if len(args) > 4 else "",
+		"formatParam": args[5] if len(args) > 5 else ""
+	}
+	numberOfSlots = max(1, options.slots)
+	threadsPerRun = options.threadsPerRun
+	if threadsPerRun == None:
+		runs = numberOfRuns(executables, options.configurationName)
+		if arguments["architecture"] == "gpu" or runs == 0:
+			threadsPerRun = numberOfSlots
+		else:
+			threadsPerRun = max(1, numberOfSlots / min(numberOfSlots, runs))
+	threadsPerRun = min(max(1, threadsPerRun), numberOfSlots)
+	signal.signal(signal.SIGTERM, exitOnSignal)
+	sys.exit(runTests(executables, arguments, numberOfSlots, threadsPerRun))
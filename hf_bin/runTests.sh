@@ -25,33 +25,13 @@ output_file_pattern=$4
 source_before=$5
 source_after=$6
 formatParam="${7}"
-currDir=`pwd`
 
-for executable in $executables; do
-	testDir=$(dirname ${executable})
-	executableName=$(basename ${executable})
-	cd ${testDir}
-	${HF_DIR}/hf_bin/runTest.sh "$executableName" "$architecture" validation "$output_file_pattern" "$source_before" "$source_after" "$formatParam" && :
-	rc=$?
-	if [[ $rc != 0 ]] && [[ "$run_mode" != "debug" ]] ; then
-		cd ${currDir}
-		printf '\a' #make the terminal bounce for OSX users
-		exit $rc
-	fi
-	validation_rc=${rc}
-	# if [[ "$run_mode" = "debug" ]] && [[ $validation_rc != 0 ]]; then
-	# 	echo "There was an error during the validation run. Since we're in debug mode, repeating the test with valgrind running. This might take a while."
-	# 	${HF_DIR}/hf_bin/runTest.sh $executableName $architecture valgrind "$output_file_pattern" $source_before $source_after && :
-	# 	rc=$?
-	# 	if [[ $rc != 0 ]] ; then
-	# 		cd ${currDir}
-	# 		exit $rc
-	# 	fi
-	# fi
-	cd ${currDir}
-	if [[ $validation_rc != 0 ]] ; then
-		printf '\a' #make the terminal bounce for OSX users
-		exit $validation_rc
-	fi
-done
+#the executables and their parameter sets are tested concurrently, see runTests.py for the CPU slot options
+PYTHONPATH= python ${HF_DIR}/hf_bin/runTests.py ${HF_TEST_SLOTS:+--slots=${HF_TEST_SLOTS}} ${HF_TEST_THREADS_PER_RUN:+--threadsPerRun=${HF_TEST_THREADS_PER_RUN}} -- \
+	"$executables" "$architecture" "$output_file_pattern" "$source_before" "$source_after" "$formatParam" && :
+rc=$?
+if [[ $rc != 0 ]] ; then
+	printf '\a' #make the terminal bounce for OSX users
+	exit $rc
+fi
 echo "All your tests have passed!"
@@ -0,0 +1,287 @@
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+# CPU scaling benchmark: builds examples with their CPU (OpenMP) implementation, runs every test executable
+# for a sweep of OMP_NUM_THREADS and for the problem sizes of its test configuration (testConfig_benchmark.txt,
+# falling back to the validation configuration), and reports wall time, throughput, speedup and parallel
+# efficiency against one thread. Writes scaling.json and - if matplotlib is available - one plot per example.
+#
+# usage: scalingBenchmark.py [options] [EXAMPLE_DIR...]     (default: the benchmark examples of this installation)
+
+from optparse import OptionParser
+import os, sys, json, time, shlex, subprocess, multiprocessing
+from runTests import parameterSets
+from performanceDatabase import hostInfo, recordRunIn
+
+HF_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_EXAMPLES = ["diffusion3d", "particle", "poisson2d_fem_iterative", "simple_weather", "5D_parallel_vector"]
+CONFIGURATION_NAMES = ["benchmark", "validation"]
+#the compiler settings of the examples assume PGI - these make arguments build them with the GNU toolchain instead
+GFORTRAN_MAKE_ARGUMENTS = [
+	"FC=gfortran",
+	"CC=gcc",
+	"LD=gfortran",
+	"FFLAGS_PRODUCTION=-O3 -fopenmp -ffree-line-length-none",
+	"LDFLAGS_PRODUCTION=-fopenmp -l${HYBRID_LIBRARY_FILENAME_POSTFIX}"
+]
+
+def defaultThreadCounts():
+	numberOfCores = multiprocessing.cpu_count()
+	counts = []
+	count = 1
+	while count < numberOfCores:
+		counts.append(count)
+		count *= 2
+	return counts + [numberOfCores]
+
+def median(values):
+	ordered = sorted(values)
+	middle = len(ordered) / 2
+	return ordered[middle] if len(ordered) % 2 == 1 else (ordered[middle - 1] + ordered[middle]) / 2.0
+
+def problemSize(argumentString):
+	'''-> product of the integer valued parameters (e.g. nx * ny * nz), 1 if there are none'''
+	size = 1
+	for word in argumentString.split():
+		if word.isdigit():
+			size *= int(word)
+	return size
+
+def callLogged(commandLine, workingDir, logFile, environment=None):
+	logFile.write("%s $ %s\n" %(workingDir, " ".join(commandLine)))
+	logFile.flush()
+	return subprocess.call(commandLine, cwd=workingDir, stdout=logFile, stderr=subprocess.STDOUT, env=environment)
+
+def buildExample(exampleDir, makeArguments, logFile):
+	'''-> list of the example's CPU test executables (absolute paths)'''
+	if os.path.exists(os.path.join(exampleDir, "configure")) and callLogged(["bash", "./configure"], exampleDir, logFile) != 0:
+		raise Exception("configure failed in %s" %(exampleDir))
+	if callLogged(["make", "install_cpu"] + makeArguments, exampleDir, logFile) != 0:
+		raise Exception("make install_cpu failed in %s, see %s" %(exampleDir, logFile.name))
+	output = subprocess.Popen(
+		["make", "-s", "print_test_targets_cpu"] + makeArguments, cwd=exampleDir, stdout=subprocess.PIPE, stderr=logFile
+	).communicate()[0]
+	executables = output.strip().split("\n")[-1].split() if output.strip() != "" else []
+	if len(executables) == 0:
+		raise Exception("no test executables defined for %s" %(exampleDir))
+	return [os.path.normpath(os.path.join(exampleDir, executable)) for executable in executables]
+
+def benchmarkParameterSets(testDir):
+	for configurationName in CONFIGURATION_NAMES:
+		sets, message = parameterSets(configurationName, testDir)
+		if not message.startswith("no config file"):
+			return configurationName, [argumentString for argumentString, _ in sets]
+	return None, [""]
+
+def runOnce(executable, argumentString, threads):
+	environment = dict(os.environ)
+	environment["OMP_NUM_THREADS"] = str(threads)
+	startTime = time.time()
+	process = subprocess.Popen(
+		["./%s" %(os.path.basename(executable)), "cpu"] + argumentString.split(),
+		cwd=os.path.dirname(executable),
+		stdout=subprocess.PIPE,
+		stderr=subprocess.PIPE,
+		env=environment
+	)
+	timingOutput, errorOutput = process.communicate()
+	wallTime = time.time() - startTime
+	if process.returncode != 0:
+		raise Exception("%s %s has returned error code %i with %i threads: %s" %(
+			executable, argumentString, process.returncode, threads, errorOutput.strip()[-500:]
+		))
+	return wallTime, timingOutput.strip()
+
+def benchmarkExecutable(executable, threadCounts, repetitions, options):
+	configurationName, argumentStrings = benchmarkParameterSets(os.path.dirname(executable))
+	results = []
+	for argumentString in argumentStrings:
+		measurements = []
+		for threads in threadCounts:
+			wallTimes = []
+			timingOutput = ""
+			for _ in range(repetitions):
+				wallTime, timingOutput = runOnce(executable, argumentString, threads)
+				wallTimes.append(wallTime)
+				if options.database:
+					recordRunIn(options.database, {
+						"label": options.label,
+						"example": os.path.basename(os.path.dirname(executable)),
+						"executable": os.path.basename(executable),
+						"architecture": "cpu",
+						"configuration": "scaling",
+						"parameters": argumentString.strip(),
+						"threads": threads,
+						"timingOutput": "%.6f, %s" %(wallTime, timingOutput)
+					})
+			measurements.append({
+				"threads": threads,
+				"wallTimes": wallTimes,
+				"medianWallTime": median(wallTimes),
+				"timingOutput": timingOutput
+			})
+		size = problemSize(argumentString)
+		singleThreadTime = [m["medianWallTime"] for m in measurements if m["threads"] == 1]
+		for measurement in measurements:
+			medianWallTime = measurement["medianWallTime"]
+			measurement["throughput"] = size / medianWallTime if medianWallTime > 0 else None
+			if len(singleThreadTime) > 0 and medianWallTime > 0:
+				measurement["speedup"] = singleThreadTime[0] / medianWallTime
+				measurement["parallelEfficiency"] = measurement["speedup"] / measurement["threads"]
+			else:
+				measurement["speedup"] = None
+				measurement["parallelEfficiency"] = None
+		results.append({
+			"executable": os.path.relpath(executable, HF_DIR) if executable.startswith(HF_DIR) else executable,
+			"configuration": configurationName,
+			"parameters": argumentString.strip(),
+			"problemSize": size,
+			"measurements": measurements
+		})
+	return results
+
+def summaryLines(resultsByExample):
+	lines = ["%-25s %-25s %8s %12s %14s %8s %10s" %("example", "parameters", "threads", "median s", "throughput/s", "speedup", "efficiency")]
+	for example, results in resultsByExample.items():
+		for result in results:
+			for measurement in result["measurements"]:
+				lines.append("%-25s %-25s %8i %12.4f %14s %8s %10s" %(
+					example,
+					result["parameters"] or "-",
+					measurement["threads"],
+					measurement["medianWallTime"],
+					"%.4e" %(measurement["throughput"]) if measurement["throughput"] != None else "-",
+					"%.2fx" %(measurement["speedup"]) if measurement["speedup"] != None else "-",
+					"%.1f%%" %(measurement["parallelEfficiency"] * 100) if measurement["parallelEfficiency"] != None else "-"
+				))
+	return lines
+
+def writePlots(resultsByExample, outputDir):
+	'''one figure per example in the style of the *_perf_comparison_*.png in results/ -> paths, None without matplotlib'''
+	try:
+		import matplotlib
+		matplotlib.use("Agg")
+		import matplotlib.pyplot as pyplot
+	except ImportError:
+		return None
+	paths = []
+	for example, results in resultsByExample.items():
+		figure, (timeAxis, speedupAxis) = pyplot.subplots(1, 2, figsize=(12, 5))
+		maximumThreads = 1
+		for result in results:
+			threads = [m["threads"] for m in result["measurements"]]
+			maximumThreads = max([maximumThreads] + threads)
+			label = result["parameters"] or "default"
+			timeAxis.plot(threads, [m["medianWallTime"] for m in result["measurements"]], marker="o", label=label)
+			speedups = [(m["threads"], m["speedup"]) for m in result["measurements"] if m["speedup"] != None]
+			if len(speedups) > 0:
+				speedupAxis.plot([t for t, _ in speedups], [s for _, s in speedups], marker="o", label=label)
+		speedupAxis.plot([1, maximumThreads], [1, maximumThreads], linestyle="--", color="grey", label="ideal")
+		timeAxis.set_xlabel("OMP_NUM_THREADS")
+		timeAxis.set_ylabel("median wall time [s]")
+		timeAxis.set_title("%s: run time" %(example))
+		speedupAxis.set_xlabel("OMP_NUM_THREADS")
+		speedupAxis.set_ylabel("speedup vs. 1 thread")
+		speedupAxis.set_title("%s: CPU scaling" %(example))
+		for axis in [timeAxis, speedupAxis]:
+			axis.grid(True)
+			axis.legend(loc="best", fontsize="small")
+		path = os.path.join(outputDir, "%s_cpu_scaling.png" %(example))
+		figure.savefig(path, dpi=100, bbox_inches="tight")
+		pyplot.close(figure)
+		paths.append(path)
+	return paths
+
+##################### MAIN ##############################
+if __name__ == "__main__":
+	parser = OptionParser(usage="usage: %prog [options] [EXAMPLE_DIR...]")
+	parser.add_option("-t", "--threads", dest="threads",
+	                  help="comma separated thread counts to sweep (default: powers of two up to the number of cores, and the number of cores)")
+	parser.add_option("-r", "--repeat", dest="repeat", type="int", default=3,
+	                  help="runs per thread count and problem size, the median wall time is reported (default: 3)")
+	parser.add_option("-o", "--outputDirectory", dest="outputDir", default="scaling_results",
+	                  help="write scaling.json, build.log and plots to DIR (default: ./scaling_results)", metavar="DIR")
+	parser.add_option("-g", "--gfortran", action="store_true", dest="gfortran",
+	                  help="build with gfortran / gcc and -fopenmp instead of the compilers in the example's config")
+	parser.add_option("-m", "--makeArguments", dest="makeArguments", default="",
+	                  help="additional arguments for make, e.g. compiler settings")
+	parser.add_option("--noBuild", action="store_true", dest="noBuild",
+	                  help="use the executables that are already installed")
+	parser.add_option("-d", "--database", dest="database", default=os.environ.get("HF_PERFORMANCE_DATABASE"),
+	                  help="also record every run in this performance database (default: $HF_PERFORMANCE_DATABASE)", metavar="FILE")
+	parser.add_option("-l", "--label", dest="label", default=os.environ.get("HF_PERFORMANCE_LABEL", ""),
+	                  help="label of the runs in the performance database (default: $HF_PERFORMANCE_LABEL)")
+	(options, args) = parser.parse_args()
+	exampleDirs = [os.path.abspath(path) for path in args] if len(args) > 0 else [
+		os.path.join(HF_DIR, "examples", example) for example in DEFAULT_EXAMPLES
+	]
+	try:
+		threadCounts = sorted(set(int(count) for count in options.threads.split(","))) if options.threads else defaultThreadCounts()
+		if options.repeat < 1 or len(threadCounts) == 0 or threadCounts[0] < 1:
+			raise Exception("at least one run and positive thread counts are required")
+		makeArguments = (GFORTRAN_MAKE_ARGUMENTS if options.gfortran else []) + shlex.split(options.makeArguments)
+		if not os.path.isdir(options.outputDir):
+			os.makedirs(options.outputDir)
+		#the example Makefiles include the build system from $HF_DIR
+		os.environ.setdefault("HF_DIR", HF_DIR)
+		resultsByExample = {}
+		failures = []
+		buildLog = open(os.path.join(options.outputDir, "build.log"), "a")
+		try:
+			for exampleDir in exampleDirs:
+				example = os.path.basename(exampleDir)
+				sys.stderr.write("benchmarking %s\n" %(example))
+				try:
+					if options.noBuild:
+						output = subprocess.Popen(["make", "-s", "print_test_targets_cpu"], cwd=exampleDir, stdout=subprocess.PIPE).communicate()[0]
+						executables = [os.path.normpath(os.path.join(exampleDir, path)) for path in output.strip().split()]
+					else:
+						executables = buildExample(exampleDir, makeArguments, buildLog)
+					resultsByExample[example] = []
+					for executable in executables:
+						resultsByExample[example] += benchmarkExecutable(executable, threadCounts, options.repeat, options)
+				except Exception as e:
+					#examples that can't be built on this machine (e.g. CUDA parts) don't stop the others
+					sys.stderr.write("skipping %s: %s\n" %(example, str(e)))
+					failures.append(example)
+		finally:
+			buildLog.close()
+		report = {
+			"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+			"host": hostInfo(),
+			"threadCounts": threadCounts,
+			"repetitions": options.repeat,
+			"makeArguments": makeArguments,
+			"skippedExamples": failures,
+			"examples": resultsByExample
+		}
+		reportFile = open(os.path.join(options.outputDir, "scaling.json"), "w")
+		try:
+			json.dump(report, reportFile, indent=2, sort_keys=True)
+		finally:
+			reportFile.close()
+		sys.stdout.write("\n".join(summaryLines(resultsByExample)) + "\n")
+		plotPaths = writePlots(resultsByExample, options.outputDir)
+		if plotPaths == None:
+			sys.stderr.write("matplotlib is not available - plots skipped\n")
+		if len(resultsByExample) == 0:
+			raise Exception("no example could be benchmarked")
+	except Exception as e:
+		sys.stderr.write("Error in scaling benchmark: %s\n" %(str(e)))
+		sys.exit(1)
@@ -0,0 +1,238 @@
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+# Reader for Fortran unformatted sequential files (records framed by 4 byte length markers).
+# The file is memory mapped, every record is returned as a NumPy view into the mapping - nothing is copied.
+# Once a file has been scanned, its layout index lets later reads seek straight to the records.
+
+import os, sys, json
+import numpy
+
+MARKER_BYTES = 4
+LAYOUT_INDEX_SUFFIX = ".layout.json"
+
+def valueType(readEndianFormat, numOfBytesPerValue):
+	return numpy.dtype('%s%s' %(readEndianFormat, 'f8' if numOfBytesPerValue == 8 else 'f4'))
+
+class UnformattedRecordFile(object):
+	def __init__(self, path, data=None):
+		#data: the content as uint8 array if it doesn't come from the file at path (e.g. a reference archive member)
+		self.path = path
+		if data is None:
+			#an empty file cannot be mapped
+			data = numpy.memmap(path, dtype=numpy.uint8, mode='r') if os.path.getsize(path) > 0 else numpy.zeros(0, dtype=numpy.uint8)
+		self.size = len(data)
+		self.data = data
+		self.position = 0
+		self.layoutKey = None
+		self.layoutByPosition = {}
+
+	def useLayout(self, layoutKey, layout):
+		self.layoutKey = layoutKey
+		self.layoutByPosition = dict((entry[0], entry) for entry in layout)
+
+	def layoutEntry(self, layoutKey):
+		if layoutKey != self.layoutKey:
+			return None
+		return self.layoutByPosition.get(self.position)
+
+	def close(self):
+		#the mapping is released once the last view into it is gone
+		self.data = None
+
+	def tell(self):
+		return self.position
+
+	def seek(self, position):
+		self.position = position
+
+	def integerAt(self, offset, readEndianFormat):
+		if offset + MARKER_BYTES > self.size:
+			#we have reached the end of the file
+			return None
+		return int(self.data[offset:offset + MARKER_BYTES].view('%si4' %(readEndianFormat))[0])
+
+	def view(self, offset, byteLength, dtype):
+		return self.data[offset:offset + byteLength].view(dtype)
+
+	def nextArray(self, readEndianFormat, numOfBytesPerValue):
+		recordByteLength = self.integerAt(self.position, readEndianFormat)
+		if recordByteLength == None:
+			return None
+		if recordByteLength < 0 or recordByteLength % numOfBytesPerValue != 0:
+			raise Exception("Odd record length: %i, modulo %i == 0 expected. Is the file endian correct?" %(recordByteLength, numOfBytesPerValue))
+		dataOffset = self.position + MARKER_BYTES
+		if dataOffset + recordByteLength > self.size:
+			raise Exception("Could not read %i bytes as expected. Only %i bytes read." %(recordByteLength, self.size - dataOffset))
+		redundantRecordLength = self.integerAt(dataOffset + recordByteLength, readEndianFormat)
+		if redundantRecordLength == None:
+			raise Exception("Could not read trailer.")
+		if recordByteLength != redundantRecordLength:
+			raise Exception("Header and trailer do not match.")
+		self.position = dataOffset + recordByteLength + MARKER_BYTES
+		return self.view(dataOffset, recordByteLength, valueType(readEndianFormat, numOfBytesPerValue))
+
+	def nextInteger(self, readEndianFormat):
+		value = self.integerAt(self.position, readEndianFormat)
+		if value == None:
+			return None
+		self.position += MARKER_BYTES
+		return numpy.array([value])
+
+def layoutKey(readEndianFormat, numOfBytesPerValue):
+	return "%s%s" %(readEndianFormat, str(numOfBytesPerValue) if numOfBytesPerValue != None else "auto")
+
+def decodeNextRecord(recordFile, readEndianFormat, numOfBytesPerValue, verbose=False):
+	'''Guesses the type of the next record -> (record, layout entry) or (None, None) at the end of the file.
+	A layout entry is [record start, data offset, byte length, dtype string, position of the next record].'''
+	def tentativeUnpack(numOfBytesPerValue):
+		currentPosition = recordFile.tell()
+		try:
+			content = recordFile.nextArray(readEndianFormat, numOfBytesPerValue)
+			if content is None:
+				return None, None
+			if verbose:
+				sys.stderr.write("This record seems to be an array of length %i\n" %(len(content)))
+			return content, [currentPosition, currentPosition + MARKER_BYTES, content.nbytes, content.dtype.str, recordFile.tell()]
+		except Exception as e:
+			if verbose:
+				sys.stderr.write("Could not unpack record as array (%s) - trying integer\n" %(str(e)))
+		#a readable header that does not frame an array of this type is taken as an integer
+		recordFile.seek(currentPosition)
+		content = recordFile.nextInteger(readEndianFormat)
+		if content is None:
+			return None, None
+		if verbose:
+			sys.stderr.write("This record seems to be an integer with value %i\n" %(content[0]))
+		return content, [currentPosition, currentPosition, MARKER_BYTES, numpy.dtype('%si4' %(readEndianFormat)).str, recordFile.tell()]
+
+	def valuesAreReasonable(unpacked):
+		return bool(numpy.all((unpacked > 1E-15) & (unpacked < 1E10)))
+
+	if numOfBytesPerValue != None:
+		return tentativeUnpack(numOfBytesPerValue)
+
+	# at this point we need to guess number of bytes.
+	# Let's find out whether the number of records is 0 or 1 with 8 bytes (usually that indicates that it is unlikely to be 8 bytes)
+	currentPosition = recordFile.tell()
+	unpacked8, entry8 = tentativeUnpack(8)
+	if unpacked8 is not None and len(unpacked8) > 1:
+		return unpacked8, entry8
+	recordFile.seek(currentPosition)
+	unpacked4, entry4 = tentativeUnpack(4)
+	if unpacked4 is None:
+		#both tentative reads start at the same header, so 8 bytes cannot have found a record either
+		return None, None
+	reasonable4 = valuesAreReasonable(unpacked4) if len(unpacked4) > 0 else False
+	if len(unpacked4) > 1 and reasonable4:
+		return unpacked4, entry4
+	if len(unpacked4) == len(unpacked8):
+		return unpacked4, entry4 #at this point an 4 byte integer is most likely
+	if len(unpacked4) == 1 and reasonable4:
+		return unpacked4, entry4
+	#the file position stays behind the 4 byte interpretation
+	return unpacked8, entry8[:4] + [recordFile.tell()]
+
+def unpackNextRecord(recordFile, readEndianFormat, numOfBytesPerValue, verbose=False):
+	entry = recordFile.layoutEntry(layoutKey(readEndianFormat, numOfBytesPerValue))
+	if entry != None:
+		_, dataOffset, byteLength, typeString, nextPosition = entry
+		recordFile.seek(nextPosition)
+		return recordFile.view(dataOffset, byteLength, numpy.dtype(str(typeString)))
+	return decodeNextRecord(recordFile, readEndianFormat, numOfBytesPerValue, verbose)[0]
+
+def scanLayout(recordFile, readEndianFormat, numOfBytesPerValue, maximumNumberOfRecords=None):
+	'''One pass over the records from the start of the file -> list of layout entries'''
+	layout = []
+	recordFile.seek(0)
+	while maximumNumberOfRecords == None or len(layout) < maximumNumberOfRecords:
+		record, entry = decodeNextRecord(recordFile, readEndianFormat, numOfBytesPerValue)
+		if record is None:
+			break
+		layout.append(entry)
+	recordFile.seek(0)
+	return layout
+
+def detectEndianFormat(recordFile, numOfBytesPerValue):
+	#a big endian file read as little endian falls apart into 100 integer (or empty) records
+	layout = scanLayout(recordFile, '<', numOfBytesPerValue, maximumNumberOfRecords=100)
+	if len(layout) == 100 and all([entry[2] <= numpy.dtype(str(entry[3])).itemsize for entry in layout]):
+		return '>'
+	return '<'
+
+class LayoutIndex(object):
+	'''Record layouts and detected endianness of one file. Stored as JSON sidecar beside the file,
+	valid as long as its size and mtime are unchanged.'''
+	def __init__(self, path):
+		self.path = path
+		self.indexPath = path + LAYOUT_INDEX_SUFFIX
+		status = os.stat(path)
+		self.size = status.st_size
+		self.mtime = status.st_mtime
+		self.layouts = {}
+		self.endianFormats = {}
+		self.isModified = False
+		if not os.path.exists(self.indexPath):
+			return
+		try:
+			indexFile = open(self.indexPath, 'r')
+			try:
+				index = json.load(indexFile)
+			finally:
+				indexFile.close()
+		except (IOError, ValueError):
+			return #unreadable or corrupt index -> rescan
+		if index.get("size") == self.size and index.get("mtime") == self.mtime:
+			self.layouts = index.get("layouts", {})
+			self.endianFormats = index.get("endianFormats", {})
+
+	def endianFormat(self, recordFile, numOfBytesPerValue):
+		key = str(numOfBytesPerValue) if numOfBytesPerValue != None else "auto"
+		if not key in self.endianFormats:
+			self.endianFormats[key] = detectEndianFormat(recordFile, numOfBytesPerValue)
+			self.isModified = True
+		return str(self.endianFormats[key])
+
+	def layout(self, recordFile, readEndianFormat, numOfBytesPerValue):
+		key = layoutKey(readEndianFormat, numOfBytesPerValue)
+		if not key in self.layouts:
+			self.layouts[key] = scanLayout(recordFile, readEndianFormat, numOfBytesPerValue)
+			self.isModified = True
+		return self.layouts[key]
+
+	def save(self):
+		if not self.isModified:
+			return
+		temporaryPath = self.indexPath + ".temp"
+		indexFile = open(temporaryPath, 'w')
+		try:
+			json.dump({
+				"size": self.size,
+				"mtime": self.mtime,
+				"layouts": self.layouts,
+				"endianFormats": self.endianFormats
+			}, indexFile)
+		finally:
+			indexFile.close()
+		try:
+			os.rename(temporaryPath, self.indexPath)
+		except OSError:
+			os.remove(temporaryPath)
+			raise
+		self.isModified = False